@@ -1,12 +1,20 @@
 import json
+import argparse
+import threading
+from datetime import datetime
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from tqdm import tqdm
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.io_helpers import save_json
+from utils.io_helpers import save_json, load_json, save_json_atomic, append_jsonl, iter_jsonl
+from utils.keyword_matcher import RelevanceFilter
 
 # Load API key from .env
 load_dotenv()
@@ -14,9 +22,21 @@ API_KEY = os.getenv("COURTLISTENER_API_KEY")
 assert API_KEY, "COURTLISTENER_API_KEY not set in .env"
 
 # Constants
-BASE_URL = "https://www.courtlistener.com/api/rest/v4/opinions/"
+BASE_URL = os.getenv("COURTLISTENER_BASE_URL", "https://www.courtlistener.com/api/rest/v4/opinions/")
 HEADERS = {"Authorization": f"Token {API_KEY}"}
-SAVE_PATH = "../data/raw/cases.json"
+SAVE_PATH = "data/raw/cases.json"
+STREAM_PATH = "data/raw/cases.jsonl"
+CHECKPOINT_PATH = "data/raw/checkpoints/{court}.json"  # Case IDs written so far go next to it, in {court}.seen.jsonl
+# Opinion records carry date_created (when CourtListener added them), not their cluster's date_filed.
+# Re-ask from the newest one ingested (seen IDs skip what we have) so opinions added in the same instant
+# aren't missed, oldest first so a `limit`-capped run never skips older ones
+COURT_PARAM = "cluster__docket__court"  # /opinions/ silently ignores a plain `court`
+SINCE_PARAM = "date_created__gte"
+ORDER_BY = "date_created"
+MAX_WORKERS = 4  # Courts fetched at once
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+_append_lock = threading.Lock()  # Courts share one JSONL stream
 
 INCLUDE_KEYWORDS = [
     "personal injury", "negligence", "medical malpractice", "wrongful death",
@@ -30,73 +50,296 @@ EXCLUDE_KEYWORDS = [
     "labor", "overtime", "minimum wage", "retaliation", "discrimination"
 ]
 
+PI_KEYWORDS = [
+    "personal injury", "negligence", "medical malpractice", "slip and fall",
+    "wrongful death", "pain and suffering", "bodily harm", "trauma",
+    "injury", "accident", "damages"
+]
+PI_EXCLUSION_KEYWORDS = [
+    "sexual assault", "criminal", "child custody", "termination of parental rights",
+    "unpaid wages", "overtime", "foreclosure", "arbitration",
+    "disciplinary", "custody", "appeal denied", "drug trafficking", "head shop"
+]
+
+pi_text_filter = RelevanceFilter(PI_KEYWORDS, PI_EXCLUSION_KEYWORDS, min_hits=2)
+case_name_filter = RelevanceFilter(INCLUDE_KEYWORDS, EXCLUDE_KEYWORDS, min_hits=1)
+
 def is_likely_personal_injury(text):
-    if not text:
-        return False
-    text = text.lower()
-    pi_keywords = [
-        "personal injury", "negligence", "medical malpractice", "slip and fall",
-        "wrongful death", "pain and suffering", "bodily harm", "trauma",
-        "injury", "accident", "damages"
-    ]
-    exclusion_keywords = [
-        "sexual assault", "criminal", "child custody", "termination of parental rights",
-        "unpaid wages", "overtime", "foreclosure", "arbitration",
-        "disciplinary", "custody", "appeal denied", "drug trafficking", "head shop"
-    ]
-    return sum(kw in text for kw in pi_keywords) >= 2 and not any(kw in text for kw in exclusion_keywords)
+    return pi_text_filter(text)
 
 def is_likely_case_name(name):
-    if not name:
-        return False
-    name = name.lower()
-    return any(good in name for good in INCLUDE_KEYWORDS) and not any(bad in name for bad in EXCLUDE_KEYWORDS)
+    return case_name_filter(name)
+
+def to_case(result, court=None):
+    # Opinion records don't name their court; it is the one the query filtered on
+    return {
+        "case_id": result.get("id"),
+        "case_name": result.get("caseName", "") or "",
+        "jurisdiction": result.get("court") or court or "",
+        "date_filed": result.get("date_filed"),
+        "date_created": result.get("date_created"),
+        "source_url": result.get("absolute_url", ""),
+        "full_text": (result.get("plain_text", "") or "").strip()
+    }
+
+def filter_page(page_results, court=None):
+    """Yield the personal-injury cases on one page of `court`'s API results."""
+    for result in tqdm(page_results, desc="🔎 Filtering PI cases"):
+        case_text = result.get("plain_text", "") or ""
+        case_name = result.get("caseName", "") or ""
+
+        if not case_text.strip():
+            print(f"⚠️ Empty plain_text for case ID: {result.get('id')} — skipping.")
+            continue
+
+        if is_likely_personal_injury(case_text) or is_likely_case_name(case_name):
+            yield to_case(result, court)
 
-def fetch_opinions(limit=30, court="ca9"):
+def make_session(pool_size=MAX_WORKERS * 2):
+    """Keep-alive session with a connection pool and backoff on 429/5xx."""
+    retry = Retry(
+        total=5,
+        backoff_factor=1.0,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def get_page(session, url, params=None):
+    response = session.get(url, params=params, timeout=60)
+    response.raise_for_status()
+    return response.url, response.json()
+
+def iter_pages(session, url, params=None, prefetch=True):
+    """Yield (page_url, data) pages, fetching page N+1 while the caller filters page N.
+
+    Closing the generator early (as `closing()` does when the caller stops)
+    cancels the pending page, or leaves it to finish in the background
+    instead of waiting through its retries.
+    """
+    if not prefetch:
+        while url:
+            page_url, data = get_page(session, url, params)
+            params = None
+            url = data.get("next")
+            yield page_url, data
+        return
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(get_page, session, url, params)
+    try:
+        while future:
+            page_url, data = future.result()
+            next_url = data.get("next")
+            future = pool.submit(get_page, session, next_url) if next_url else None
+            yield page_url, data
+    finally:
+        if future:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def fetch_opinions(limit=30, court="ca9", session=None, prefetch=True):
     print(f"🔍 Fetching {court.upper()} cases (limit: {limit})...")
-    page_size = min(limit, 100)
-    params = {"court": court, "page_size": page_size}
+    session = session or make_session()
+    params = {COURT_PARAM: court, "page_size": min(limit, 100)}
     results = []
-    next_url = BASE_URL
 
-    while next_url and len(results) < limit:
-        try:
-            response = requests.get(next_url, headers=HEADERS, params=params)
-            if response.status_code != 200:
-                print(f"❌ Error fetching data: {response.status_code}")
-                break
-
-            data = response.json()
-            for result in tqdm(data["results"], desc="🔎 Filtering PI cases"):
+    try:
+        with closing(iter_pages(session, BASE_URL, params, prefetch)) as pages:
+            for _, data in pages:
+                for case in filter_page(data["results"], court):
+                    if len(results) >= limit:
+                        break
+                    results.append(case)
                 if len(results) >= limit:
                     break
-                case_text = result.get("plain_text", "") or ""
-                case_name = result.get("caseName", "") or ""
+    except Exception as e:
+        print(f"❌ Exception occurred: {e}")
 
-                if not case_text.strip():
-                    print(f"⚠️ Empty plain_text for case ID: {result.get('id')} — skipping.")
+    return results
+
+def load_checkpoint(path):
+    state = {"next_url": None, "last_date_created": None, "stream_offset": None}
+    if path and os.path.exists(path):
+        state.update(load_json(path))
+    # Older checkpoints tracked date_filed, which opinion records don't have
+    state.pop("last_date_filed", None)
+    return state
+
+def created_at(value):
+    """Aware datetime of a date_created string, or None; offsets differ across DST, so strings don't sort."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def load_seen_ids(state, seen_path, stream_path):
+    """Case IDs this court already wrote: the seen log, plus any written after the last checkpoint.
+
+    Cases reach the stream before their IDs reach the log and the checkpoint,
+    so a crash in between is recovered from the stream past `stream_offset`.
+    """
+    # Older checkpoints kept the IDs inline, rewritten on every page
+    inline = state.pop("seen_ids", None)
+    if inline and not os.path.exists(seen_path):
+        append_jsonl(sorted(inline), seen_path)
+    seen_ids = set(iter_jsonl(seen_path)) if os.path.exists(seen_path) else set()
+    offset = state.get("stream_offset")
+    if offset is None or not os.path.exists(stream_path) or os.path.getsize(stream_path) <= offset:
+        return seen_ids
+
+    recovered = set()
+    if stream_path.endswith((".gz", ".zst")):
+        # No seeking into a compressed stream
+        recovered.update(case.get("case_id") for case in iter_jsonl(stream_path))
+    else:
+        with open(stream_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    recovered.add(json.loads(line).get("case_id"))
+                except ValueError:
                     continue
+    recovered -= seen_ids | {None}
+    if recovered:
+        # Logged now, since the next checkpoint moves stream_offset past them
+        append_jsonl(sorted(recovered, key=str), seen_path)
+    return seen_ids | recovered
 
-                if is_likely_personal_injury(case_text) or is_likely_case_name(case_name):
-                    results.append({
-                        "case_id": result.get("id"),
-                        "case_name": case_name,
-                        "jurisdiction": result.get("court", ""),
-                        "date_filed": result.get("date_filed"),
-                        "source_url": result.get("absolute_url", ""),
-                        "full_text": case_text.strip()
-                    })
+def written_case_ids(checkpoint_dir=None):
+    """Case IDs any court's seen log says are already in the stream."""
+    checkpoint_dir = checkpoint_dir or os.path.dirname(CHECKPOINT_PATH)
+    written = set()
+    if os.path.isdir(checkpoint_dir):
+        for name in sorted(os.listdir(checkpoint_dir)):
+            if name.endswith(".seen.jsonl"):
+                written.update(iter_jsonl(os.path.join(checkpoint_dir, name)))
+    return written
 
-            next_url = data.get("next")
-            params = {}  # Clear after first request
+def ingest_opinions(limit=1000, court="ca9", since_last_run=False, fresh=False,
+                    stream_path=STREAM_PATH, checkpoint_path=None, session=None, prefetch=True, written_ids=None):
+    """Stream filtered cases to JSONL page by page, checkpointing the cursor as we go.
 
-        except Exception as e:
-            print(f"❌ Exception occurred: {e}")
-            break
+    A crash loses at most the page in flight: rerunning resumes from the saved
+    `next` cursor and skips case IDs already written. `written_ids`, shared by
+    the courts writing one stream, also skips cases another court wrote. With
+    `since_last_run`, the crawl restarts from page one but only asks for
+    opinions CourtListener added on or after the newest `date_created`
+    ingested so far.
+    """
+    checkpoint_path = checkpoint_path or CHECKPOINT_PATH.format(court=court)
+    seen_path = os.path.splitext(checkpoint_path)[0] + ".seen.jsonl"
+    session = session or make_session()
+    state = load_checkpoint(None if fresh else checkpoint_path)
+    if fresh and os.path.exists(seen_path):
+        os.remove(seen_path)
+    seen_ids = load_seen_ids(state, seen_path, stream_path)
+    if written_ids is not None:
+        with _append_lock:
+            written_ids.update(seen_ids)
+    last_date_created = state["last_date_created"]
 
-    return results
+    params = {COURT_PARAM: court, "page_size": min(limit, 100), "order_by": ORDER_BY}
+    next_url = state["next_url"]
+    if since_last_run:
+        next_url = None
+        if last_date_created:
+            params[SINCE_PARAM] = last_date_created
+            print(f"🕒 Only fetching {court.upper()} opinions added on or after {last_date_created}")
+    if next_url:
+        print(f"⏯️ Resuming {court.upper()} ingestion from checkpoint ({len(seen_ids)} cases seen)")
+        params = None
+    else:
+        next_url = BASE_URL
+
+    saved = 0
+    try:
+        with closing(iter_pages(session, next_url, params, prefetch)) as pages:
+            for page_url, data in pages:
+                page_cases = []
+                truncated = False
+                for case in filter_page(data["results"], court):
+                    if saved + len(page_cases) >= limit:
+                        truncated = True
+                        break
+                    if case["case_id"] in seen_ids:
+                        continue
+                    seen_ids.add(case["case_id"])
+                    page_cases.append(case)
+                    created, newest = created_at(case["date_created"]), created_at(last_date_created)
+                    if created and (newest is None or created > newest):
+                        last_date_created = case["date_created"]
+
+                with _append_lock:
+                    if written_ids is not None:
+                        page_cases = [case for case in page_cases if case["case_id"] not in written_ids]
+                        written_ids.update(case["case_id"] for case in page_cases)
+                    append_jsonl(page_cases, stream_path)
+                    stream_offset = os.path.getsize(stream_path)
+                append_jsonl([case["case_id"] for case in page_cases], seen_path)
+                saved += len(page_cases)
+
+                # Stopping mid-page keeps the cursor on this page; seen IDs skip what we already wrote
+                save_json_atomic({
+                    "next_url": page_url if truncated else data.get("next"),
+                    "last_date_created": last_date_created,
+                    "stream_offset": stream_offset,
+                }, checkpoint_path)
+                if truncated or saved >= limit:
+                    break
+    except Exception as e:
+        print(f"❌ Exception occurred while fetching {court.upper()}: {e}")
+
+    return saved
+
+def fetch_courts(courts, limit=30, incremental=False, max_workers=MAX_WORKERS, prefetch=True, **ingest_kwargs):
+    """Fetch several courts at once over one pooled session.
+
+    Returns the list of cases in one-shot mode, or the number of cases
+    appended to the stream in incremental mode. Either way a case is kept
+    once, whichever court returned it first.
+    """
+    session = make_session(pool_size=max(2, 2 * max_workers))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        if incremental:
+            written_ids = written_case_ids()
+            futures = [pool.submit(ingest_opinions, limit, court, session=session, prefetch=prefetch,
+                                   written_ids=written_ids, **ingest_kwargs)
+                       for court in courts]
+            return sum(f.result() for f in futures)
+
+        futures = [pool.submit(fetch_opinions, limit, court, session, prefetch) for court in courts]
+        cases = {}
+        for f in futures:
+            for case in f.result():
+                cases.setdefault(case["case_id"], case)
+        return list(cases.values())
 
 if __name__ == "__main__":
-    cases = fetch_opinions(limit=30, court="ca9")
-    save_json(cases, SAVE_PATH)
-    print(f"✅ Saved {len(cases)} cases to ../{SAVE_PATH}")
+    parser = argparse.ArgumentParser(description="Fetch personal-injury opinions from CourtListener.")
+    parser.add_argument("--limit", type=int, default=30, help="Maximum cases per court")
+    parser.add_argument("--court", nargs="+", default=["ca9"], help="One or more CourtListener court IDs")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Courts fetched at once")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Stream to {STREAM_PATH} with a resumable checkpoint")
+    parser.add_argument("--since-last-run", action="store_true",
+                        help="With --incremental, only fetch opinions added since the last ingested date_created")
+    parser.add_argument("--fresh", action="store_true", help="With --incremental, ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    if args.incremental:
+        count = fetch_courts(args.court, limit=args.limit, incremental=True, max_workers=args.workers,
+                             since_last_run=args.since_last_run, fresh=args.fresh)
+        print(f"✅ Appended {count} cases to {STREAM_PATH}")
+    else:
+        cases = fetch_courts(args.court, limit=args.limit, max_workers=args.workers)
+        save_json(cases, SAVE_PATH)
+        print(f"✅ Saved {len(cases)} cases to {SAVE_PATH}")
@@ -1,10 +1,17 @@
 import os
 import json
-import time
+import argparse
 from tqdm import tqdm
 from dotenv import load_dotenv
-from openai import OpenAI
 import re
+import sys
+import hashlib
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.llm_engine import make_client, make_limiter, chat_completion, map_ordered
+from utils.llm_cache import open_default_cache
+from utils.keyword_matcher import RelevanceFilter
+from utils.io_helpers import iter_cases, write_cases, existing_path
 
 def extract_valid_json(text):
     text = re.sub(r"^```json|```$", "", text.strip(), flags=re.MULTILINE)
@@ -20,15 +27,19 @@ def extract_valid_json(text):
     return None
 
 load_dotenv()
-API_KEY = os.getenv("GROQ_API_KEY")
 
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=API_KEY
-)
+# Shared by every labeling worker so the whole pool stays inside the provider's budget
+client = make_client()
+limiter = make_limiter()
+cache = open_default_cache()
 
-INPUT_PATH = "../data/raw/cases.json"
-OUTPUT_PATH = "../data/processed/cases.json"
+INPUT_PATH = "data/raw/cases.jsonl"  # Stream written by data_agent.py --incremental
+LEGACY_INPUT_PATH = "data/raw/cases.json"
+FILTERED_PATH = "data/interim/relevant_cases.jsonl"  # Written by filter_cases for the pipeline
+OUTPUT_PATH = "data/processed/cases.jsonl"
+MODEL_NAME = "llama3-70b-8192"
+TEMPERATURE = 0.7
+CONCURRENCY = int(os.getenv("LABEL_CONCURRENCY", 8))
 
 PROMPT_TEMPLATE = """
 You are a legal-medical assistant. Given the following case text, extract and generate the following details as JSON:
@@ -55,40 +66,60 @@ IRRELEVANT_KEYWORDS = [
     "fraud", "custody", "disciplinary", "wage", "discrimination"
 ]
 
+relevance_filter = RelevanceFilter(RELEVANT_KEYWORDS, IRRELEVANT_KEYWORDS, min_hits=2)
+
 def is_relevant_text(text):
-    text = text.lower()
-    pos = sum(kw in text for kw in RELEVANT_KEYWORDS)
-    neg = any(kw in text for kw in IRRELEVANT_KEYWORDS)
-    return pos >= 2 and not neg
+    return relevance_filter(text)
+
+def label_text(case):
+    return case.get("full_text", "").strip()[:3000]
+
+def label_key(case):
+    """Changes whenever the prompt, model or text a case's labels came from changes."""
+    payload = json.dumps([MODEL_NAME, TEMPERATURE, PROMPT_TEMPLATE, label_text(case)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def parse_label_reply(reply):
+    """Label dict from an LLM reply, or None when it holds no JSON object."""
+    if "```" in reply:
+        lines = reply.splitlines()
+        inside_code = False
+        cleaned = []
+        for line in lines:
+            if line.strip().startswith("```"):
+                inside_code = not inside_code
+                continue
+            if inside_code:
+                cleaned.append(line)
+        reply = "\n".join(cleaned).strip()
+
+    parsed = extract_valid_json(reply)
+    if not isinstance(parsed, dict):
+        return None
+
+    if "injury_types" in parsed and "injuries" not in parsed:
+        parsed["injuries"] = parsed.pop("injury_types")
+    if isinstance(parsed.get("injuries"), str):
+        # The case store types injuries as a list of strings
+        parsed["injuries"] = [parsed["injuries"]]
+
+    return parsed
 
 def label_case(case_text):
-    prompt = PROMPT_TEMPLATE.format(case_text=case_text[:3000])
+    truncated = case_text[:3000]
+    prompt = PROMPT_TEMPLATE.format(case_text=truncated)
+    key = cache.make_key(MODEL_NAME, PROMPT_TEMPLATE, truncated, TEMPERATURE)
+    reply = ""
 
     try:
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+        # Unparseable replies aren't cached, so the case is asked about again on the next run
+        reply = cache.get_or_compute(
+            key, lambda: chat_completion(client, limiter, prompt, model=MODEL_NAME, temperature=TEMPERATURE),
+            validate=lambda reply: parse_label_reply(reply) is not None
         )
-        reply = response.choices[0].message.content.strip()
-
-        if "```" in reply:
-            lines = reply.splitlines()
-            inside_code = False
-            cleaned = []
-            for line in lines:
-                if line.strip().startswith("```"):
-                    inside_code = not inside_code
-                    continue
-                if inside_code:
-                    cleaned.append(line)
-            reply = "\n".join(cleaned).strip()
-
-        parsed = extract_valid_json(reply)
-
-        if "injury_types" in parsed and "injuries" not in parsed:
-            parsed["injuries"] = parsed.pop("injury_types")
-
+        parsed = parse_label_reply(reply)
+        if parsed is None:
+            raise ValueError("no JSON object in the reply")
         return parsed
 
     except Exception as e:
@@ -96,21 +127,8 @@ def label_case(case_text):
         print("🔁 Raw reply:", reply)
         return {}
 
-def load_cases(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_cases(cases, path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(cases, f, indent=2)
-
-def enrich_cases():
-    raw_cases = load_cases(INPUT_PATH)
-    enriched = []
-
-    print(f"✨ Labeling {len(raw_cases)} cases using LLM...")
-    for case in tqdm(raw_cases):
+def relevant_cases(cases):
+    for case in cases:
         text = case.get("full_text", "").strip()
 
         if len(text) < 100:
@@ -122,13 +140,65 @@ def enrich_cases():
             print(f"⏩ Skipping irrelevant case: {fallback_name}...")
             continue
 
-        labels = label_case(text)
-        enriched_case = {**case, **labels}
-        enriched.append(enriched_case)
-        time.sleep(1)
-
-    save_cases(enriched, OUTPUT_PATH)
-    print(f"✅ Saved enriched cases to {OUTPUT_PATH}")
+        yield case
+
+def filter_cases(input_path=None, output_path=FILTERED_PATH):
+    """Write the relevant cases of the raw stream to their own file; returns the count."""
+    input_path = input_path or existing_path(INPUT_PATH, LEGACY_INPUT_PATH)
+    count = write_cases(relevant_cases(iter_cases(input_path)), output_path)
+    print(f"✅ Kept {count} relevant cases in {output_path}")
+    return count
+
+def label_one(case):
+    return label_case(case.get("full_text", "").strip())
+
+def previous_labels(path):
+    """case_id -> labeled record (minus its text) for every case in an earlier output that got labels."""
+    previous = {}
+    if not os.path.exists(path):
+        return previous
+    for case in iter_cases(path):
+        if case.get("label_key") and case.get("case_id") is not None:
+            case.pop("full_text", None)
+            previous[case["case_id"]] = case
+    return previous
+
+def enrich_cases(concurrency=CONCURRENCY, input_path=None, output_path=OUTPUT_PATH, incremental=True):
+    """Label the relevant input cases into `output_path`, rewriting it in input order.
+
+    With `incremental`, cases whose text, prompt and model match the labels
+    already in the output keep them, so only new or changed cases reach the LLM.
+    """
+    input_path = input_path or existing_path(INPUT_PATH, LEGACY_INPUT_PATH)
+    previous = previous_labels(output_path) if incremental else {}
+    fresh = []
+
+    def label_or_reuse(case):
+        key = label_key(case)
+        old = previous.get(case.get("case_id"))
+        if old is not None and old["label_key"] == key:
+            return {k: v for k, v in old.items() if k not in case}
+        fresh.append(case.get("case_id"))
+        labels = label_one(case)
+        # Failed labels carry no key, so the next run retries them
+        return {**labels, "label_key": key} if labels else labels
+
+    print(f"✨ Labeling cases from {input_path} using LLM ({concurrency} in flight)...")
+    if previous:
+        print(f"⏯️ Reusing labels for unchanged cases ({len(previous)} labeled before)")
+    # Cases stream from input to output; results come back in input order no matter which request finishes first
+    labeled = map_ordered(label_or_reuse, relevant_cases(iter_cases(input_path)), concurrency)
+    count = write_cases(tqdm({**case, **labels} for case, labels in labeled), output_path)
+
+    print(f"✅ Saved {count} enriched cases to {output_path} ({len(fresh)} sent to the LLM)")
+    print(cache.summary())
+    return len(fresh)
 
 if __name__ == "__main__":
-    enrich_cases()
+    parser = argparse.ArgumentParser(description="Label raw cases with an LLM.")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Requests kept in flight")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached replies and call the LLM again")
+    parser.add_argument("--full", action="store_true", help="Relabel every case instead of reusing unchanged labels")
+    args = parser.parse_args()
+    cache.bypass = cache.bypass or args.no_cache
+    enrich_cases(concurrency=args.concurrency, incremental=not args.full)
@@ -1,11 +1,124 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import joblib
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError
+from datetime import date
+from typing import Optional
+import json
+import os
+import secrets
+import threading
+import time
 import numpy as np
+from ml.feature_spec import FEATURE_COLUMNS, row_features
+from ml.model_registry import ModelRegistry
+from app.batching import PREDICT_BATCHING, MicroBatcher
+from app.prediction_cache import PredictionCache
+from app.similar import (
+    MAX_SIMILAR_K, SIMILAR_INDEX_PATH, SIMILAR_MAX_BATCH, SIMILAR_MAX_WAIT_US, SIMILAR_RELOAD_SECONDS,
+    SimilarCaseIndex, case_filter, index_stamp
+)
 
 app = FastAPI()
 
-model = joblib.load("ml/model/settlement_model.pkl")
+# Versioned models under ml/model/registry (or the single legacy model), hot-swapped when ACTIVE/SHADOW change.
+# MODEL_BACKEND picks the artifact each version is served from: native booster, NumPy tree arrays or pickle.
+registry = ModelRegistry()
+registry.watch()
+
+MAX_BATCH = 100_000
+# Repeat / near-duplicate cases (same feature vector, same model version) skip the model entirely
+prediction_cache = PredictionCache()
+registry.listeners.append(lambda entries: prediction_cache.retain(entry.cache_key for entry in entries))
+# PREDICT_BATCHING=1 coalesces concurrent /predict calls into micro-batches (see app/batching.py)
+batcher = MicroBatcher() if PREDICT_BATCHING else None
+ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")  # The /models admin endpoints are disabled unless this is set
+
+# /similar keeps the passage index (memory-mapped) and the embedder resident, loaded in the background and
+# reopened whenever the index is (re)built. Concurrent queries are always micro-batched: one encoder call and
+# one FAISS search per batch.
+similar_index = None
+similar_error = None
+similar_stamp = None
+similar_lock = threading.Lock()
+similar_batcher = MicroBatcher(
+    SIMILAR_MAX_BATCH, SIMILAR_MAX_WAIT_US, run_batch=SimilarCaseIndex.search, name="similar-batch"
+)
+
+def load_similar_index():
+    """The resident SimilarCaseIndex, reopened if the index files appeared or changed since the last attempt.
+
+    A new index is swapped in only once it has fully loaded, so queries keep
+    using the previous one (whose mapped files save_index never rewrites) in
+    the meantime; if reopening fails the previous one stays in service.
+    """
+    global similar_index, similar_error, similar_stamp
+    with similar_lock:
+        stamp = index_stamp(SIMILAR_INDEX_PATH)
+        if stamp != similar_stamp:
+            try:
+                embedder = similar_index.embedder if similar_index is not None else None
+                index = SimilarCaseIndex(SIMILAR_INDEX_PATH, embedder=embedder)
+            except (FileNotFoundError, ImportError, RuntimeError) as e:
+                similar_error = str(e)
+                print(f"⚠️ /similar unavailable: {e}")
+            else:
+                similar_index, similar_error = index, None
+                print(f"🔎 Similar-case index loaded: {index.status()}")
+            similar_stamp = stamp
+    return similar_index
+
+def watch_similar_index(interval=SIMILAR_RELOAD_SECONDS):
+    load_similar_index()
+    while interval > 0:
+        time.sleep(interval)
+        try:
+            load_similar_index()
+        except Exception as e:
+            print(f"⚠️ Similar-case index reload failed: {e}")
+
+threading.Thread(target=watch_similar_index, name="similar-index-watch", daemon=True).start()
+
+class ShadowStats:
+    """Running comparison of the shadow model against the live one on real traffic."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def record(self, live_version, shadow_version, live, shadow):
+        diff = np.abs(shadow.astype(np.float64) - live.astype(np.float64))
+        with self.lock:
+            s = self.stats.setdefault(f"{shadow_version} vs {live_version}", {
+                "requests": 0, "rows": 0, "sum_abs_diff": 0.0, "max_abs_diff": 0.0
+            })
+            s["requests"] += 1
+            s["rows"] += len(diff)
+            s["sum_abs_diff"] += float(diff.sum())
+            s["max_abs_diff"] = max(s["max_abs_diff"], float(diff.max()) if len(diff) else 0.0)
+
+    def summary(self):
+        with self.lock:
+            return {
+                pair: {**s, "mean_abs_diff": s["sum_abs_diff"] / s["rows"] if s["rows"] else 0.0}
+                for pair, s in self.stats.items()
+            }
+
+shadow_stats = ShadowStats()
+
+def select_model(request):
+    """Model entries for this request: pinned via ?model_version= or X-Model-Version, else active + shadow."""
+    version = request.query_params.get("model_version") or request.headers.get("x-model-version")
+    try:
+        return registry.get(version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+
+def score_shadow(entry, shadow, X, live_predictions):
+    """Score the same rows on the shadow model after the response is sent; its output is never returned."""
+    try:
+        shadow_stats.record(entry.version, shadow.version, live_predictions, np.asarray(shadow.model.predict(X)))
+    except Exception as e:
+        print(f"⚠️ Shadow model {shadow.version} failed: {e}")
 
 class CaseInput(BaseModel):
     summary: str
@@ -15,25 +128,245 @@ class CaseInput(BaseModel):
     age: int
     gender: str
 
+class SimilarInput(BaseModel):
+    text: str
+    k: int = Field(5, ge=1, le=MAX_SIMILAR_K)
+    jurisdiction: Optional[str] = None
+    filed_after: Optional[date] = None
+    filed_before: Optional[date] = None
+
+def features_matrix(cases):
+    """One contiguous float32 row per case, in FEATURE_COLUMNS order."""
+    X = np.empty((len(cases), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for i, case in enumerate(cases):
+        # Pydantic keeps validated fields in __dict__, so no per-request dict is built
+        X[i] = row_features(case.__dict__)
+    return X
+
+def batch_features(body, ndjson):
+    """Feature matrix of the cases in a batch body: a JSON array (or {"cases": [...]}), or NDJSON lines.
+
+    Parsing and validating up to MAX_BATCH cases is CPU-bound, so this runs in the threadpool.
+    """
+    if ndjson:
+        records = [json.loads(line) for line in body]
+    else:
+        records = json.loads(body)
+        if isinstance(records, dict):
+            records = records.get("cases", [])
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array of cases or NDJSON")
+    if len(records) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH} cases)")
+    return features_matrix([CaseInput(**record) for record in records])
+
+async def read_batch(request):
+    """Feature matrix of a batch request's cases; 422 on invalid input, 413 past MAX_BATCH.
+
+    NDJSON is split into lines as it streams in and refused as soon as it
+    passes MAX_BATCH cases, without reading the rest of the body.
+    """
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonlines" in content_type
+    if ndjson:
+        body, tail = [], b""
+        async for chunk in request.stream():
+            *lines, tail = (tail + chunk).split(b"\n")
+            body.extend(line for line in lines if line.strip())
+            if len(body) > MAX_BATCH:
+                raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH} cases)")
+        if tail.strip():
+            body.append(tail)
+    else:
+        body = await request.body()
+    try:
+        return await run_in_threadpool(batch_features, body, ndjson)
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+async def cache_io(fn, *args):
+    """Run a prediction-cache call that may query the SQLite store off the event loop."""
+    if prediction_cache.store is None:
+        return fn(*args)
+    return await run_in_threadpool(fn, *args)
+
 @app.get("/")
 def read_root():
     return {"message": "LegalClaimGPT Settlement Prediction API is running."}
 
 @app.post("/predict")
-def predict(case: CaseInput):
-    try:
-        features = {
-            "num_injuries": len(case.injuries),
-            "has_severe_injury": int(any(word in str(case.injuries).lower() for word in ["brain", "spinal", "burn"])),
-            "medical_bills": float(case.medical_bills),
-            "lost_wages": float(case.lost_wages),
-            "age": int(case.age),
-            "is_male": 1 if case.gender.lower() == "male" else 0,
+async def predict(case: CaseInput, request: Request, background_tasks: BackgroundTasks):
+    entry, shadow = select_model(request)
+    try:
+        X = features_matrix([case])
+        key = prediction_cache.make_key("predict", entry.cache_key, X[0])
+        cached = await cache_io(prediction_cache.get, key)
+        if cached is not None:
+            # Cache hits aren't shadow-scored: the shadow model already saw this feature vector
+            return {"predicted_settlement": cached, "model_version": entry.version}
+
+        if batcher is not None:
+            predictions = np.asarray([await batcher.predict(entry, X[0])])
+        else:
+            predictions = await run_in_threadpool(entry.model.predict, X)
+        if shadow is not None:
+            background_tasks.add_task(score_shadow, entry, shadow, X, predictions)
+        prediction = round(float(predictions[0]), 2)
+        await cache_io(prediction_cache.put, key, prediction)
+        return {"predicted_settlement": prediction, "model_version": entry.version}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request, background_tasks: BackgroundTasks):
+    """Score many cases with one model call. Send a JSON array, or NDJSON with
+    Content-Type: application/x-ndjson for very large batches."""
+    X = await read_batch(request)
+    entry, shadow = select_model(request)
+    if not len(X):
+        return {"count": 0, "predicted_settlements": [], "model_version": entry.version}
+
+    try:
+        if not prediction_cache.enabled:
+            predictions = await run_in_threadpool(entry.model.predict, X)
+            if shadow is not None:
+                background_tasks.add_task(score_shadow, entry, shadow, X, predictions)
+            settlements = np.round(predictions.astype(np.float64), 2).tolist()
+        else:
+            # Only rows the cache hasn't seen go to the model; cache I/O is batched and off the event loop
+            keys = await run_in_threadpool(prediction_cache.make_keys, "predict", entry.cache_key, X)
+            settlements = await run_in_threadpool(prediction_cache.get_many, keys)
+            missing = [i for i, value in enumerate(settlements) if value is None]
+            if missing:
+                predictions = await run_in_threadpool(entry.model.predict, X[missing])
+                if shadow is not None:
+                    background_tasks.add_task(score_shadow, entry, shadow, X[missing], predictions)
+                values = np.round(predictions.astype(np.float64), 2).tolist()
+                for i, value in zip(missing, values):
+                    settlements[i] = value
+                await run_in_threadpool(prediction_cache.put_many, [(keys[i], value) for i, value in zip(missing, values)])
+        return {
+            "count": len(X),
+            "predicted_settlements": settlements,
+            "model_version": entry.version,
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def explain_matrix(X, entry):
+    """Predictions plus per-feature SHAP values for each row of X."""
+    explainer = entry.explainer()
+    predictions = entry.model.predict(X)
+    shap_values = np.asarray(explainer.shap_values(X)).reshape(len(X), len(FEATURE_COLUMNS))
+    base_value = float(np.ravel(explainer.expected_value)[0])
+
+    return [
+        {
+            "predicted_settlement": round(float(prediction), 2),
+            "base_value": round(base_value, 2),
+            "features": dict(zip(FEATURE_COLUMNS, row.tolist())),
+            "shap_values": dict(zip(FEATURE_COLUMNS, np.round(values.astype(np.float64), 4).tolist())),
         }
+        for prediction, row, values in zip(predictions, X, shap_values)
+    ]
 
-        X = [list(features.values())]  # Wrap in list to make it 2D
-        prediction = model.predict(X)[0]
-        return {"predicted_settlement": round(float(prediction), 2)}
+@app.post("/explain")
+def explain(case: CaseInput, request: Request):
+    """Prediction and SHAP explanation for one case in a single call."""
+    entry, _ = select_model(request)
+    try:
+        X = features_matrix([case])
+        key = prediction_cache.make_key("explain", entry.cache_key, X[0])
+        explanation = prediction_cache.get(key)
+        if explanation is None:
+            explanation = explain_matrix(X, entry)[0]
+            prediction_cache.put(key, explanation)
+        return {**explanation, "model_version": entry.version}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/explain/batch")
+async def explain_batch(request: Request):
+    """Same input formats as /predict/batch; returns one explanation per case."""
+    X = await read_batch(request)
+    entry, _ = select_model(request)
+
+    try:
+        explanations = await run_in_threadpool(explain_matrix, X, entry) if len(X) else []
+        return {"count": len(X), "explanations": explanations, "model_version": entry.version}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/similar")
+async def similar(query: SimilarInput):
+    """Top-k comparable precedents for a case description, optionally within one
+    jurisdiction (court id) and/or a date range, with passage distances.
+
+    Opinions without a date_filed are dated by when CourtListener added them."""
+    index = similar_index or await run_in_threadpool(load_similar_index)
+    if index is None:
+        raise HTTPException(status_code=503, detail=f"Similar-case search unavailable: {similar_error}")
+    key = case_filter(
+        query.jurisdiction,
+        query.filed_after.isoformat() if query.filed_after else None,
+        query.filed_before.isoformat() if query.filed_before else None,
+    )
+    try:
+        cases = await similar_batcher.submit(index, (query.text, query.k, key))
+        return {"count": len(cases), "cases": cases}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def check_admin(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model admin endpoints are disabled: set MODEL_ADMIN_TOKEN")
+    if not secrets.compare_digest(token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/metrics")
+def metrics():
+    """Serving counters: micro-batching queue depth and batch-size histogram, prediction cache hit rate."""
+    return {
+        "batching": batcher.summary() if batcher is not None else {"enabled": False},
+        "prediction_cache": prediction_cache.stats(),
+        "similar": {
+            "index": similar_index.status() if similar_index is not None else None,
+            "batching": similar_batcher.summary(),
+        },
+    }
+
+@app.get("/models")
+def models():
+    """Loaded versions, which one is live, the shadow candidate and how it compares so far."""
+    return {**registry.status(), "shadow_stats": shadow_stats.summary()}
+
+@app.post("/models/reload")
+def reload_models(x_admin_token: str = Header(None)):
+    """Pick up new versions / pointer changes now instead of waiting for the watcher."""
+    check_admin(x_admin_token)
+    changed = registry.refresh()
+    return {"changed": changed, **registry.status()}
+
+@app.post("/models/{version}/activate")
+def activate_model(version: str, x_admin_token: str = Header(None)):
+    check_admin(x_admin_token)
+    try:
+        registry.activate(version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return registry.status()
+
+@app.post("/models/{version}/shadow")
+def shadow_model(version: str, x_admin_token: str = Header(None)):
+    """Score live traffic on `version` too (results are only compared, never returned); "none" stops it."""
+    check_admin(x_admin_token)
+    try:
+        registry.set_shadow(None if version == "none" else version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return registry.status()
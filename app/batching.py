@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PREDICT_BATCHING = os.getenv("PREDICT_BATCHING", "0") == "1"  # Opt-in micro-batching for /predict
+MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", 64))
+MAX_WAIT_US = int(os.getenv("PREDICT_MAX_WAIT_US", 2000))  # How long the first request may wait for company
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+class BatchStats:
+    """Queue depth and batch-size histogram, read by GET /metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.batch_sizes = dict.fromkeys(HISTOGRAM_BUCKETS, 0)
+
+    def record(self, size, waits):
+        bucket = next((b for b in HISTOGRAM_BUCKETS if size <= b), HISTOGRAM_BUCKETS[-1])
+        with self.lock:
+            self.requests += size
+            self.batches += 1
+            self.total_wait += sum(waits)
+            self.batch_sizes[bucket] += 1
+
+    def observe_depth(self, depth):
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def summary(self, queue_depth):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "mean_queue_wait_ms": self.total_wait / self.requests * 1000 if self.requests else 0.0,
+                "queue_depth": queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "batch_size_histogram": {f"<={b}": n for b, n in self.batch_sizes.items()},
+            }
+
+def predict_rows(entry, rows):
+    return entry.model.predict(np.stack(rows))
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one vectorized predict call.
+
+    Requests queue on the event loop; one collector task takes the first row,
+    keeps gathering until `max_batch` rows or `max_wait_us` have passed, then
+    runs predict on a dedicated worker thread and resolves every request's
+    future. Rows are grouped by model entry, so pinned versions and hot swaps
+    never mix models within a call.
+
+    `run_batch(target, items)` swaps in another batched call (e.g. embedding
+    and searching many queries at once); it returns one result per item.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait_us=MAX_WAIT_US, run_batch=predict_rows, name="predict-batch"):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_us / 1e6
+        self.run_batch = run_batch
+        self.stats = BatchStats()
+        self.queue = None
+        self.worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._collector = None
+        self._loop = None
+
+    async def predict(self, entry, row):
+        """Prediction for one feature row (1-D float32) on `entry`'s model."""
+        return await self.submit(entry, row)
+
+    async def submit(self, target, item):
+        """`run_batch`'s result for `item`, computed together with whatever else is queued for `target`."""
+        loop = asyncio.get_running_loop()
+        # The collector lives on the serving loop; start it on first use (or if the loop changed)
+        if self._collector is None or self._collector.done() or self._loop is not loop:
+            self._loop = loop
+            self.queue = asyncio.Queue()
+            self._collector = loop.create_task(self._collect())
+        future = loop.create_future()
+        self.queue.put_nowait((target, item, future, time.perf_counter()))
+        self.stats.observe_depth(self.queue.qsize())
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            self.stats.record(len(batch), [started - queued for *_, queued in batch])
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            for items in groups.values():
+                await self._run(items)
+
+    async def _run(self, items):
+        target = items[0][0]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.worker, self.run_batch, target, [item for _, item, _, _ in items]
+            )
+        except Exception as e:
+            for _, _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future, _), result in zip(items, results):
+            if not future.done():  # The client may have gone away
+                future.set_result(result)
+
+    def summary(self):
+        return {
+            "enabled": True,
+            "max_batch": self.max_batch,
+            "max_wait_us": int(self.max_wait * 1e6),
+            **self.stats.summary(self.queue.qsize() if self.queue is not None else 0),
+        }
@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 100_000))  # Entries kept in memory; 0 disables
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", 3600))  # Seconds
+# Optional SQLite file shared by every worker process on the host, e.g. data/cache/predictions.sqlite
+PREDICTION_CACHE_STORE = os.getenv("PREDICTION_CACHE_STORE", "")
+# Lookups/inserts of more rows than this (large /predict/batch calls) skip the in-memory LRU, so one
+# bulk request can't evict the entries single predictions keep hitting; they still use the shared store
+PREDICTION_CACHE_BATCH_ROWS = int(os.getenv("PREDICTION_CACHE_BATCH_ROWS", 1000))
+PREDICTION_CACHE_STORE_ROWS = int(os.getenv("PREDICTION_CACHE_STORE_ROWS", 1_000_000))  # Rows kept in the store
+PREDICTION_CACHE_PURGE_SECONDS = float(os.getenv("PREDICTION_CACHE_PURGE_SECONDS", 60))  # Between store purges
+STORE_QUERY_ROWS = 500  # Keys per SELECT ... IN (...), under SQLite's bound-parameter limit
+
+class PredictionCache:
+    """LRU + TTL cache of model outputs keyed by (kind, model, feature vector).
+
+    The key is the float32 feature row the model actually sees, so requests that
+    differ only in fields the model ignores (the summary text, 42000 vs 42000.0)
+    share one entry. The model's cache key (version + artifact hash) is part of
+    the key, so a hot swap or retrain can never serve a stale result; `retain`
+    drops entries of models no longer loaded. The in-memory entries and the
+    SQLite connection have separate locks, so store I/O never blocks lookups
+    that hit memory. At most every `purge_seconds`, a write also deletes
+    expired store rows and the soonest-expiring ones past `store_rows`.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL, store_path=PREDICTION_CACHE_STORE,
+                 batch_rows=PREDICTION_CACHE_BATCH_ROWS, store_rows=PREDICTION_CACHE_STORE_ROWS,
+                 purge_seconds=PREDICTION_CACHE_PURGE_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.batch_rows = batch_rows
+        self.store_rows = store_rows
+        self.purge_seconds = purge_seconds
+        self.next_purge = time.monotonic() + purge_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.store_lock = threading.Lock()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.store = None
+        if store_path:
+            os.makedirs(os.path.dirname(store_path) or ".", exist_ok=True)
+            self.store = sqlite3.connect(store_path, check_same_thread=False)
+            self.store.execute("PRAGMA journal_mode=WAL")
+            self.store.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                " key BLOB PRIMARY KEY, model TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self.store.execute("CREATE INDEX IF NOT EXISTS predictions_expires ON predictions(expires)")
+            self.store.commit()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(kind, model_key, row):
+        return (kind, model_key, np.asarray(row, dtype=np.float32).tobytes())
+
+    @staticmethod
+    def make_keys(kind, model_key, X):
+        return [(kind, model_key, row.tobytes()) for row in np.asarray(X, dtype=np.float32)]
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def get_many(self, keys):
+        """Cached value (or None) for each key: memory first, then one query per STORE_QUERY_ROWS keys to the store."""
+        if not self.enabled:
+            return [None] * len(keys)
+        remember = len(keys) <= self.batch_rows
+        now = time.monotonic()
+        values = [None] * len(keys)
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                item = self.entries.get(key)
+                if item is not None:
+                    expires, value = item
+                    if expires > now:
+                        self.entries.move_to_end(key)
+                        values[i] = value
+                        continue
+                    del self.entries[key]
+                missing.append(i)
+            self.hits += len(keys) - len(missing)
+            if self.store is None:
+                self.misses += len(missing)
+                return values
+
+        found = {}
+        with self.store_lock:
+            for start in range(0, len(missing), STORE_QUERY_ROWS):
+                store_keys = [self._store_key(keys[i]) for i in missing[start:start + STORE_QUERY_ROWS]]
+                found.update(self.store.execute(
+                    f"SELECT key, value FROM predictions WHERE expires > ? AND key IN ({','.join('?' * len(store_keys))})",
+                    (time.time(), *store_keys)
+                ).fetchall())
+        with self.lock:
+            for i in missing:
+                row = found.get(self._store_key(keys[i]))
+                if row is not None:
+                    values[i] = json.loads(row)
+                    if remember:
+                        self._remember(keys[i], values[i], now)
+            self.store_hits += sum(values[i] is not None for i in missing)
+            self.misses += sum(values[i] is None for i in missing)
+        return values
+
+    def put_many(self, items):
+        """Cache (key, value) pairs; the store gets them in one transaction."""
+        if not self.enabled or not items:
+            return
+        if len(items) <= self.batch_rows:
+            with self.lock:
+                now = time.monotonic()
+                for key, value in items:
+                    self._remember(key, value, now)
+        if self.store is not None:
+            expires = time.time() + self.ttl
+            rows = [(self._store_key(key), key[1], json.dumps(value), expires) for key, value in items]
+            with self.store_lock:
+                self.store.executemany(
+                    "INSERT OR REPLACE INTO predictions (key, model, value, expires) VALUES (?, ?, ?, ?)", rows
+                )
+                if time.monotonic() >= self.next_purge:
+                    self._purge_store()
+                self.store.commit()
+
+    def _purge_store(self):
+        """Delete expired rows, then the soonest-expiring ones past `store_rows`; caller holds store_lock."""
+        self.next_purge = time.monotonic() + self.purge_seconds
+        self.store.execute("DELETE FROM predictions WHERE expires <= ?", (time.time(),))
+        excess = self.store.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.store_rows
+        if excess > 0:
+            self.store.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY expires LIMIT ?)", (excess,)
+            )
+
+    def _remember(self, key, value, now):
+        self.entries[key] = (now + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _store_key(key):
+        kind, model_key, row = key
+        return f"{kind}\0{model_key}\0".encode("utf-8") + row
+
+    def retain(self, model_keys):
+        """Forget every entry whose model is not in `model_keys` (called after a model swap)."""
+        model_keys = set(model_keys)
+        with self.lock:
+            for key in [key for key in self.entries if key[1] not in model_keys]:
+                del self.entries[key]
+        if self.store is not None:
+            with self.store_lock:
+                placeholders = ",".join("?" * len(model_keys))
+                self.store.execute(f"DELETE FROM predictions WHERE model NOT IN ({placeholders})", tuple(model_keys))
+                self.store.execute("DELETE FROM predictions WHERE expires <= ?", (time.time(),))
+                self.store.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.store is not None:
+            with self.store_lock:
+                self.store.execute("DELETE FROM predictions")
+                self.store.commit()
+
+    def stats(self):
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+            "shared_store": self.store is not None,
+        }
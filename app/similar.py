@@ -0,0 +1,140 @@
+import os
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from llm import retriever
+from llm.embedding_store import MANIFEST_FILE
+
+SIMILAR_INDEX_PATH = os.getenv("SIMILAR_INDEX_PATH", retriever.INDEX_PATH)
+SIMILAR_MAX_BATCH = int(os.getenv("SIMILAR_MAX_BATCH", 32))
+SIMILAR_MAX_WAIT_US = int(os.getenv("SIMILAR_MAX_WAIT_US", 1000))
+SIMILAR_RELOAD_SECONDS = float(os.getenv("SIMILAR_RELOAD_SECONDS", 5))  # Poll interval for a rebuilt index; 0 disables
+MAX_SIMILAR_K = 50
+PASSAGES_PER_CASE = 3
+SELECTOR_CACHE_SIZE = 256  # Distinct jurisdiction/date filters whose ID bitmaps are kept
+
+def case_filter(jurisdiction=None, filed_after=None, filed_before=None):
+    """Hashable filter key for SimilarCaseIndex.search, or None when nothing is filtered.
+
+    Dates are ISO strings (YYYY-MM-DD), compared inclusively against each passage's
+    `date_filed` (retriever.case_date: the filing date, else the day the opinion was added).
+    """
+    if not (jurisdiction or filed_after or filed_before):
+        return None
+    return ((jurisdiction or "").lower() or None, filed_after, filed_before)
+
+def index_stamp(path=SIMILAR_INDEX_PATH):
+    """(inode, size, mtime) of each file save_index replaces, None where missing; changes on every rebuild."""
+    stamp = []
+    for name in ("index.faiss", "index.pkl", os.path.join(retriever.STORE_DIR, MANIFEST_FILE)):
+        try:
+            stat = os.stat(os.path.join(path, name))
+            stamp.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+class SimilarCaseIndex:
+    """The passage index, its metadata and the query embedder, kept resident for /similar.
+
+    The index file and the store's passage table are memory-mapped read-only,
+    so startup is fast and API workers on one host share their pages. Queries
+    are embedded in one encoder call per batch and searched in one FAISS call
+    per distinct filter; filters become an ID bitmap the search itself
+    honours, so a narrow jurisdiction still returns k cases.
+    """
+
+    def __init__(self, path=SIMILAR_INDEX_PATH, embedder=None, mmap=True):
+        # open_index maps the index and the store's passage table; load_index reads both into memory
+        loaded = retriever.open_index(path) if mmap else retriever.load_index(path)
+        if loaded is None:
+            raise FileNotFoundError(f"❌ No passage index in {path} — run llm/retriever.py first")
+        self.index, self.metadata = loaded
+        self.embedder = embedder or retriever.load_embedder()
+        self._selectors = OrderedDict()
+
+        # The two filterable fields as Arrow columns, one slot per passage
+        passages = self.metadata["passages"]
+        if isinstance(passages, dict):
+            self.passage_ids = np.fromiter(passages.keys(), dtype=np.int64, count=len(passages))
+            jurisdictions = pa.array([chunk.get("jurisdiction") for chunk in passages.values()], type=pa.string())
+            dates = pa.array([chunk.get("date_filed") for chunk in passages.values()], type=pa.string())
+        else:
+            self.passage_ids = passages.ids
+            jurisdictions = passages.column("jurisdiction").cast(pa.string())
+            dates = passages.column("date_filed").cast(pa.string())
+        self.jurisdictions = pc.utf8_lower(pc.fill_null(jurisdictions, ""))
+        self.dates = pc.utf8_slice_codeunits(pc.fill_null(dates, ""), 0, 10)
+        self.id_bound = int(self.passage_ids.max()) + 1 if len(self.passage_ids) else 0
+
+    def embed(self, texts):
+        return np.asarray(
+            self.embedder.encode(texts, batch_size=len(texts), convert_to_numpy=True), dtype="float32"
+        )
+
+    def _selector(self, key):
+        """(IDSelector, matching passage count) for a filter key; the bitmap is kept alive alongside it."""
+        cached = self._selectors.get(key)
+        if cached is not None:
+            self._selectors.move_to_end(key)
+            return cached[0], cached[2]
+
+        jurisdiction, filed_after, filed_before = key
+        mask = np.ones(len(self.passage_ids), dtype=bool)
+        if jurisdiction:
+            mask &= pc.equal(self.jurisdictions, jurisdiction).to_numpy(zero_copy_only=False)
+        if filed_after or filed_before:
+            mask &= pc.not_equal(self.dates, "").to_numpy(zero_copy_only=False)
+        if filed_after:
+            mask &= pc.greater_equal(self.dates, filed_after).to_numpy(zero_copy_only=False)
+        if filed_before:
+            mask &= pc.less_equal(self.dates, filed_before).to_numpy(zero_copy_only=False)
+
+        bits = np.zeros(self.id_bound, dtype=bool)
+        bits[self.passage_ids[mask]] = True
+        bitmap = np.packbits(bits, bitorder="little")
+        selector = faiss.IDSelectorBitmap(self.id_bound, faiss.swig_ptr(bitmap))
+        count = int(mask.sum())
+        self._selectors[key] = (selector, bitmap, count)
+        if len(self._selectors) > SELECTOR_CACHE_SIZE:
+            self._selectors.popitem(last=False)
+        return selector, count
+
+    def search(self, queries):
+        """Top cases for each (text, k, filter key) query, in order; see retriever.group_hits_batch for the shape."""
+        results = [[] for _ in queries]
+        if not queries or self.index.ntotal == 0:
+            return results
+        embeddings = self.embed([text for text, _, _ in queries])
+
+        groups = {}
+        for i, (_, _, key) in enumerate(queries):
+            groups.setdefault(key, []).append(i)
+        for key, members in groups.items():
+            params, candidates = None, self.index.ntotal
+            if key is not None:
+                selector, candidates = self._selector(key)
+                if candidates == 0:
+                    continue
+                params = retriever.search_params(self.index, selector)
+            k = max(queries[i][1] for i in members)
+            # Several passages of one opinion can crowd the top hits, so over-fetch before grouping
+            fetch = min(candidates, k * PASSAGES_PER_CASE * 4)
+            distances, ids = self.index.search(embeddings[members], fetch, params=params)
+            hits = retriever.group_hits_batch(
+                self.metadata, distances, ids, [queries[i][1] for i in members], PASSAGES_PER_CASE
+            )
+            for i, cases in zip(members, hits):
+                results[i] = cases
+        return results
+
+    def status(self):
+        return {
+            "passages": int(self.index.ntotal),
+            "index_kind": self.metadata.get("index_kind"),
+            "metadata": "pickle" if isinstance(self.metadata["passages"], dict) else "store",
+        }
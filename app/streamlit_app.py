@@ -2,10 +2,6 @@
 
 import streamlit as st
 import requests
-import shap
-import joblib
-import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import spacy
@@ -13,16 +9,24 @@ import re
 
 st.set_page_config(page_title="LegalClaimGPT", layout="centered")
 
-API_URL = "http://127.0.0.1:8000/predict"
-MODEL_PATH = "ml/model/settlement_model.pkl"
+EXPLAIN_URL = "http://127.0.0.1:8000/explain"  # Prediction + SHAP values in one call
 
 @st.cache_resource
-def load_model():
-    return joblib.load(MODEL_PATH)
-
-model = load_model()
-explainer = shap.Explainer(model)
-nlp = spacy.load("en_core_web_sm")
+def load_nlp():
+    return spacy.load("en_core_web_sm")
+
+nlp = load_nlp()
+
+def plot_shap_values(shap_values):
+    """Horizontal bar chart of the per-feature SHAP values returned by the API."""
+    items = sorted(shap_values.items(), key=lambda kv: abs(kv[1]))
+    fig, ax = plt.subplots()
+    ax.barh([name for name, _ in items], [value for _, value in items],
+            color=["#ff0051" if value > 0 else "#008bfb" for _, value in items])
+    ax.axvline(0, color="#999999", linewidth=0.8)
+    ax.set_xlabel("SHAP value (impact on predicted settlement)")
+    fig.tight_layout()
+    return fig
 
 st.title("💼 LegalClaimGPT Settlement Estimator")
 st.markdown("Estimate personal injury settlements using AI + case features.")
@@ -94,30 +98,16 @@ if st.button("Predict Settlement 💰"):
     }
 
     try:
-        response = requests.post(API_URL, json=payload)
+        response = requests.post(EXPLAIN_URL, json=payload)
         response.raise_for_status()
         result = response.json()
         prediction = result["predicted_settlement"]
 
         st.success(f"💰 Estimated Settlement: **${prediction:,.2f}**")
 
-        features = {
-            "num_injuries": len(payload["injuries"]),
-            "has_severe_injury": int(any(severe in injury.lower() for injury in payload["injuries"] for severe in ["brain", "spinal", "burn"])),
-            "medical_bills": float(medical_bills),
-            "lost_wages": float(lost_wages),
-            "age": int(age),
-            "is_male": 1 if gender.lower() == "male" else 0,
-        }
-
-        X_input = pd.DataFrame([features])
-        shap_values = explainer(X_input)
-
         st.subheader("🔍 Feature Impact")
         st.markdown("SHAP values show how each input influenced the prediction.")
-        fig, ax = plt.subplots()
-        shap.plots.bar(shap_values[0], show=False)
-        st.pyplot(fig)
+        st.pyplot(plot_shap_values(result["shap_values"]))
 
         lower = prediction * 0.9
         upper = prediction * 1.1
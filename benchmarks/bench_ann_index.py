@@ -0,0 +1,71 @@
+"""Compare FAISS index layouts: build time, size on disk, query latency and recall@k.
+
+Uses clustered synthetic vectors shaped like all-MiniLM-L6-v2 passage
+embeddings (384-d), or a saved .npy matrix via --vectors. Recall is
+measured against exact search with the flat index.
+
+    python benchmarks/bench_ann_index.py --n 100000 --queries 1000 --k 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "llm"))
+import retriever
+
+def synthetic_vectors(n, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index layouts.")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--vectors", help="Optional .npy matrix of real passage embeddings")
+    parser.add_argument("--kinds", nargs="+", default=list(retriever.INDEX_KINDS))
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.vectors:
+        data = np.load(args.vectors).astype("float32")
+    else:
+        data = synthetic_vectors(args.n + args.queries, args.dim, clusters=200, rng=rng)
+    queries, base = data[:args.queries], data[args.queries:]
+    ids = np.arange(len(base), dtype="int64")
+    print(f"🏁 {len(base)} vectors x {base.shape[1]}d, {len(queries)} queries, recall@{args.k} vs flat")
+
+    truth = None
+    print(f"{'index':>9} {'build s':>8} {'size MB':>8} {'p50 ms':>7} {'p99 ms':>7} {'recall':>7}")
+    for kind in ["flat"] + [k for k in args.kinds if k != "flat"]:
+        start = time.perf_counter()
+        index = retriever.make_index(kind, base)
+        index.add_with_ids(base, ids)
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        latencies = []
+        found = np.empty((len(queries), args.k), dtype="int64")
+        for i, query in enumerate(queries):
+            t0 = time.perf_counter()
+            _, found[i] = index.search(query.reshape(1, -1), args.k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        if truth is None:
+            truth = found.copy()
+        recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{kind:>9} {build_s:>8.1f} {size_mb:>8.1f} {p50:>7.3f} {p99:>7.3f} {recall:>7.3f}")
+
+if __name__ == "__main__":
+    main()
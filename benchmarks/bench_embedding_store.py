@@ -0,0 +1,146 @@
+"""Embedding store: size, open time, shared memory and recall per quantization level.
+
+Writes a store for `--n` clustered 384-d vectors (or a saved .npy matrix via
+--vectors) with synthetic passage metadata, then for each dtype reports the
+matrix size, time to open the store, exact-search latency and recall@k against
+float32 exact search. Metadata loading compares the pickle the index builder
+keeps with the store's memory-mapped Arrow passage table. `--workers`
+processes then map the same float32 matrix and touch every page; the
+proportional set size (PSS) of that mapping shows the kernel sharing it.
+
+    python benchmarks/bench_embedding_store.py --n 100000 --queries 200 --k 10 --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(__file__))
+from bench_ann_index import synthetic_vectors
+from llm.embedding_store import STORE_DTYPES, STORE_VARIANTS, EmbeddingSpool, EmbeddingStore, embeddings_file, write_store
+
+def synthetic_metadata(n, passages_per_case=4):
+    metadata = {"passages": {}, "cases": {}, "next_id": n, "index_kind": "flat", "tombstones": 0}
+    for passage_id in range(n):
+        case_id = passage_id // passages_per_case
+        metadata["passages"][passage_id] = {
+            "case_id": case_id, "case_name": f"Case {case_id}", "source_url": f"https://example.org/{case_id}",
+            "jurisdiction": ("cal", "ny", "tex")[case_id % 3], "date_filed": "2015-06-01",
+            "chunk_id": passage_id % passages_per_case, "start": 0, "end": 1200,
+        }
+        metadata["cases"].setdefault(case_id, {"hash": f"{case_id:016x}", "ids": []})["ids"].append(passage_id)
+    return metadata
+
+def mapping_memory(path):
+    """(RSS, PSS) in MB of this process's mappings of `path`, from /proc/self/smaps."""
+    rss = pss = 0
+    in_mapping = False
+    with open("/proc/self/smaps", "r", encoding="utf-8") as f:
+        for line in f:
+            name = line.split(":")[0]
+            if "-" in line.split()[0] and not name.isalpha():
+                in_mapping = line.rstrip().endswith(path)
+            elif in_mapping and name in ("Rss", "Pss"):
+                value = int(line.split()[1]) / 1024
+                rss, pss = (rss + value, pss) if name == "Rss" else (rss, pss + value)
+    return rss, pss
+
+def worker_memory(path, dtype, barrier, results):
+    """Map the matrix, touch every page, report RSS and PSS of that mapping."""
+    store = EmbeddingStore(path, dtype)
+    checksum = 0.0
+    for start in range(0, len(store), 65_536):
+        checksum += float(np.asarray(store.vectors[start:start + 65_536], dtype=np.float32).sum())
+    # Measure only once every worker has mapped the pages, then stay alive until all have measured
+    barrier.wait()
+    results.put(mapping_memory(os.path.join(path, embeddings_file(dtype))))
+    barrier.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the embedding store.")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--vectors", help="Optional .npy matrix of real passage embeddings")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.vectors:
+        data = np.load(args.vectors).astype("float32")
+    else:
+        data = synthetic_vectors(args.n + args.queries, args.dim, clusters=200, rng=rng)
+    queries, base = data[:args.queries], data[args.queries:]
+    metadata = synthetic_metadata(len(base))
+
+    workdir = tempfile.mkdtemp(prefix="bench_store_")
+    try:
+        path = os.path.join(workdir, "store")
+        spool = EmbeddingSpool(workdir)
+        spool.append(np.arange(len(base)), base)
+        start = time.perf_counter()
+        write_store(path, metadata, spool, len(base), variants=STORE_VARIANTS)
+        spool.discard()
+        print(f"🏁 {len(base)} vectors x {base.shape[1]}d, {len(queries)} queries, recall@{args.k} vs float32")
+        print(f"   store written in {time.perf_counter() - start:.1f}s")
+
+        pickle_path = os.path.join(workdir, "index.pkl")
+        with open(pickle_path, "wb") as f:
+            pickle.dump(metadata, f)
+        start = time.perf_counter()
+        with open(pickle_path, "rb") as f:
+            pickle.load(f)
+        pickle_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        store = EmbeddingStore(path)
+        open_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        store.passages.get_many(rng.integers(0, len(base), 60))
+        lookup_ms = (time.perf_counter() - start) * 1000
+        print(f"   metadata: pickle load {pickle_ms:.0f} ms ({os.path.getsize(pickle_path) / 1e6:.1f} MB) | "
+              f"store open {open_ms:.1f} ms, 60-row lookup {lookup_ms:.2f} ms")
+
+        truth = None
+        print(f"{'dtype':>8} {'matrix MB':>10} {'open ms':>8} {'search ms/q':>12} {'recall':>7}")
+        for dtype in STORE_DTYPES:
+            start = time.perf_counter()
+            store = EmbeddingStore(path, dtype)
+            open_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            _, found = store.search(queries, args.k)
+            search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            if truth is None:
+                truth = found
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, truth)])
+            size_mb = os.path.getsize(os.path.join(path, embeddings_file(dtype))) / 1e6
+            print(f"{dtype:>8} {size_mb:>10.1f} {open_ms:>8.1f} {search_ms:>12.2f} {recall:>7.4f}")
+
+        if args.workers and os.path.exists("/proc/self/smaps"):
+            results = multiprocessing.Queue()
+            barrier = multiprocessing.Barrier(args.workers)
+            workers = [multiprocessing.Process(target=worker_memory, args=(path, "float32", barrier, results))
+                       for _ in range(args.workers)]
+            for worker in workers:
+                worker.start()
+            measured = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            rss = sum(r for r, _ in measured)
+            pss = sum(p for _, p in measured)
+            print(f"   {args.workers} workers mapping the float32 matrix: RSS {rss:.0f} MB summed, "
+                  f"PSS {pss:.0f} MB summed (shared pages are counted once across processes)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""SHAP explanation job: full vs. cached/incremental runs, plotting from the cache.
+
+Writes a synthetic `--rows` feature frame, then times with the current model:
+the legacy single shap.Explainer call over every row, a cold run of the
+chunked job for each `--workers` count, a rerun after changing `--changed` of
+the rows (only those are recomputed), and plotting from cached values alone.
+
+    python benchmarks/bench_explain.py --rows 200000 --workers 1 2 4 --changed 0.01
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+from ml import explain
+from ml.feature_spec import FEATURE_COLUMNS, TARGET_COLUMN
+from ml.model_artifact import load_model, explainable_model
+
+def synthetic_features(rows, rng):
+    df = pd.DataFrame({
+        "num_injuries": rng.integers(0, 4, rows),
+        "has_severe_injury": rng.integers(0, 2, rows),
+        "medical_bills": rng.lognormal(10, 1, rows).round(),
+        "lost_wages": rng.lognormal(9.5, 1, rows).round(),
+        "age": rng.integers(20, 71, rows),
+        "is_male": rng.integers(0, 2, rows),
+    })[list(FEATURE_COLUMNS)]
+    df[TARGET_COLUMN] = 3 * df["medical_bills"] + 2 * df["lost_wages"] + rng.normal(0, 5_000, rows)
+    return df
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SHAP explanation job.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--changed", type=float, default=0.01, help="Share of rows changed before the rerun")
+    parser.add_argument("--legacy", action="store_true", help="Also time one shap.Explainer call over every row")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = synthetic_features(args.rows, rng)
+    X = df[list(FEATURE_COLUMNS)].to_numpy(dtype=np.float32)
+    print(f"🏁 {args.rows} rows, {os.cpu_count()} cores, model {explain.model_tag()}")
+
+    if args.legacy:
+        model = explainable_model(load_model())
+        print(f"   legacy shap.Explainer over all rows: {timed(lambda: shap_legacy(model, X)):.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        values_path = os.path.join(tmp, "shap_values.parquet")
+        for workers in args.workers:
+            if os.path.exists(values_path):
+                os.remove(values_path)
+            seconds = timed(lambda: explain.shap_values_for(X, values_path, workers))
+            print(f"   cold, {workers} worker(s): {seconds:.1f}s ({args.rows / seconds:,.0f} rows/s)")
+
+        changed = rng.choice(args.rows, int(args.rows * args.changed), replace=False)
+        X[changed, list(FEATURE_COLUMNS).index("medical_bills")] += 1
+        seconds = timed(lambda: explain.shap_values_for(X, values_path, args.workers[-1]))
+        print(f"   rerun with {len(changed)} changed rows: {seconds:.2f}s")
+        seconds = timed(lambda: explain.shap_values_for(X, values_path, compute=False))
+        print(f"   cached values only: {seconds:.2f}s, "
+              f"cache file {os.path.getsize(values_path) / 1e6:.1f} MB")
+
+        rows, values, base_value = explain.shap_values_for(X, values_path, compute=False)
+        y = df[TARGET_COLUMN].to_numpy()
+        plots = os.path.join(tmp, "plots")
+        for sample in (explain.BEESWARM_SAMPLE, 0):
+            seconds = timed(lambda: explain.plot_shap(values, base_value, X, y, sample, plots))
+            print(f"   plots from cache, beeswarm of {sample or args.rows} rows: {seconds:.1f}s")
+
+def shap_legacy(model, X):
+    import shap
+    return shap.Explainer(model)(X)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Feature-building cost.
+
+Single-request path (row_features) vs. the pandas frame path:
+
+    python benchmarks/bench_features.py --repeat 20000
+
+Corpus scale, legacy per-row loop vs. the vectorized extract_features, from an
+in-memory list and from a JSONL/Parquet file (time and peak Python + Arrow memory):
+
+    python benchmarks/bench_features.py --rows 10000 100000 1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from ml.feature_spec import frame_features, row_features, row_matrix
+from ml.features import extract_features
+
+CASE = {
+    "summary": "Plaintiff suffered a spinal cord injury due to a slip and fall.",
+    "injuries": ["spinal cord injury", "fracture"],
+    "medical_bills": 42000,
+    "lost_wages": 18000,
+    "age": 46,
+    "gender": "Female",
+}
+
+INJURIES = ["spinal cord injury", "fracture", "whiplash", "traumatic brain injury",
+            "second-degree burns", "concussion", "torn ligament"]
+
+def legacy_extract_features(cases):
+    """The original per-row loop, kept here as the baseline."""
+    records = []
+    for case in cases:
+        injuries = case.get("injuries", [])
+        medical_bills = case.get("medical_bills", 0)
+        lost_wages = case.get("lost_wages", 0)
+        age = case.get("age", 0)
+        gender = case.get("gender", "Unknown")
+        settlement = case.get("settlement_amount", None)
+
+        records.append({
+            "num_injuries": len(injuries),
+            "has_severe_injury": int(any(word in str(injuries).lower() for word in ["brain", "spinal", "burn"])),
+            "medical_bills": float(medical_bills) if medical_bills is not None else 0.0,
+            "lost_wages": float(lost_wages) if lost_wages is not None else 0.0,
+            "age": int(age) if age else 0,
+            "is_male": 1 if gender.lower() == "male" else 0,
+            "settlement_amount": float(settlement) if settlement is not None else 0.0,
+        })
+    return pd.DataFrame(records)
+
+def synthetic_cases(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        "case_id": str(i),
+        "summary": "Plaintiff was injured in a collision and sought damages.",
+        "injuries": rng.sample(INJURIES, rng.randint(0, 3)),
+        "medical_bills": rng.choice([None, rng.randint(0, 500_000)]),
+        "lost_wages": rng.randint(0, 200_000),
+        "age": rng.randint(18, 90),
+        "gender": rng.choice(["Male", "Female", "Unknown"]),
+        "settlement_amount": rng.randint(1_000, 2_000_000),
+    } for i in range(n)]
+
+def measure(fn):
+    """(seconds, peak traced Python bytes, peak Arrow pool bytes, result bytes) for one call."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = fn()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, pa.default_memory_pool().max_memory(), df.memory_usage(index=False).sum()
+
+def bench_single(repeat):
+    print(f"{'path':>28} {'µs/case':>9}")
+    for name, fn, n in [
+        ("row_features (tuple)", lambda: row_features(CASE), repeat),
+        ("row_matrix (1x6 float32)", lambda: row_matrix([CASE]), repeat),
+        ("frame_features (DataFrame)", lambda: frame_features([CASE]), max(1, repeat // 100)),
+    ]:
+        seconds = min(timeit.repeat(fn, number=n, repeat=3))
+        print(f"{name:>28} {seconds / n * 1e6:>9.2f}")
+
+def bench_rows(sizes):
+    print(f"{'rows':>9} {'path':>24} {'seconds':>9} {'py peak MB':>11} {'arrow MB':>9} {'frame MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            cases = synthetic_cases(n)
+            jsonl_path = os.path.join(tmp, f"cases_{n}.jsonl")
+            parquet_path = os.path.join(tmp, f"cases_{n}.parquet")
+            with open(jsonl_path, "w", encoding="utf-8") as f:
+                for case in cases:
+                    f.write(json.dumps(case) + "\n")
+            pq.write_table(pa.Table.from_pylist(cases), parquet_path)
+
+            runs = [
+                ("legacy loop (list)", lambda: legacy_extract_features(cases)),
+                ("vectorized (list)", lambda: extract_features(cases)),
+                ("legacy loop (jsonl)", lambda: legacy_extract_features(
+                    [json.loads(line) for line in open(jsonl_path, encoding="utf-8")])),
+                ("vectorized (jsonl)", lambda: extract_features(jsonl_path)),
+                ("vectorized (parquet)", lambda: extract_features(parquet_path)),
+            ]
+            for name, fn in runs:
+                seconds, peak, arrow_peak, frame_bytes = measure(fn)
+                print(f"{n:>9} {name:>24} {seconds:>9.2f} {peak / 2**20:>11.1f} "
+                      f"{arrow_peak / 2**20:>9.1f} {frame_bytes / 2**20:>9.1f}")
+            del cases
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature building.")
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--rows", type=int, nargs="+", help="Corpus sizes to benchmark (e.g. 10000 100000 1000000)")
+    args = parser.parse_args()
+
+    if args.rows:
+        bench_rows(args.rows)
+    else:
+        bench_single(args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Opinion fetching throughput against the mock v4 endpoint.
+
+Compares the fetcher with and without page prefetch, across worker counts.
+
+    python benchmarks/bench_ingest.py --courts ca1 ca2 ca3 ca9 --pages 10 --latency 0.2
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "agents"))
+from benchmarks.mock_courtlistener import MockCourtListener, start_server
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CourtListener ingestion.")
+    parser.add_argument("--courts", nargs="+", default=["ca1", "ca2", "ca3", "ca9"])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    mock = MockCourtListener(args.pages, latency=args.latency, error_rate=args.error_rate)
+    server, url = start_server(mock)
+    os.environ.setdefault("COURTLISTENER_API_KEY", "benchmark")
+    os.environ["COURTLISTENER_BASE_URL"] = url
+
+    import data_agent
+    data_agent.filter_page.__globals__["tqdm"] = lambda it, **_: it  # Keep the table readable
+
+    limit = 10 ** 9  # Read every page; the fetcher asks for 100 opinions per page
+    print(f"🏁 {len(args.courts)} courts x {args.pages} pages, {args.latency}s latency, {args.error_rate:.0%} errors")
+    print(f"{'workers':>8} {'prefetch':>9} {'seconds':>9} {'pages/s':>8} {'cases':>7}")
+    for workers in args.workers:
+        for prefetch in (False, True):
+            requests_before = mock.requests
+            start = time.perf_counter()
+            cases = data_agent.fetch_courts(args.courts, limit=limit, max_workers=workers, prefetch=prefetch)
+            elapsed = time.perf_counter() - start
+            pages = mock.requests - requests_before
+            print(f"{workers:>8} {str(prefetch):>9} {elapsed:>9.2f} {pages / elapsed:>8.1f} {len(cases):>7}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Relevance-filter speed and equivalence: shared KeywordMatcher vs. the original per-list scans.
+
+Also times the single-pass trie scan behind `hit_counts` against one
+`str.count` per keyword, and a plain compiled alternation for reference. For
+yes/no checks over a few dozen keywords, repeated substring search with early
+exits stays the fastest on CPython, so the filters keep it.
+
+    python benchmarks/bench_keyword_matcher.py --sizes 20000 100000 500000
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "agents"))
+os.environ.setdefault("COURTLISTENER_API_KEY", "benchmark")
+
+import data_agent
+import label_cases
+
+# The filters exactly as they were before the shared matcher
+def legacy_personal_injury(text):
+    if not text:
+        return False
+    text = text.lower()
+    return (sum(kw in text for kw in data_agent.PI_KEYWORDS) >= 2
+            and not any(kw in text for kw in data_agent.PI_EXCLUSION_KEYWORDS))
+
+def legacy_case_name(name):
+    if not name:
+        return False
+    name = name.lower()
+    return (any(good in name for good in data_agent.INCLUDE_KEYWORDS)
+            and not any(bad in name for bad in data_agent.EXCLUDE_KEYWORDS))
+
+def legacy_relevant_text(text):
+    text = text.lower()
+    pos = sum(kw in text for kw in label_cases.RELEVANT_KEYWORDS)
+    neg = any(kw in text for kw in label_cases.IRRELEVANT_KEYWORDS)
+    return pos >= 2 and not neg
+
+def legacy_all(text):
+    return legacy_personal_injury(text), legacy_relevant_text(text)
+
+def matcher_all(text):
+    return data_agent.is_likely_personal_injury(text), label_cases.is_relevant_text(text)
+
+def alternation_filter(include, exclude, min_hits):
+    keywords = sorted(set(include) | set(exclude), key=len, reverse=True)
+    pattern = re.compile("(?=(%s))" % "|".join(map(re.escape, keywords)))
+    include, exclude = set(include), set(exclude)
+
+    def check(text):
+        found = {m.group(1) for m in pattern.finditer(text.lower())}
+        # Keywords that are prefixes of a longer hit at the same position
+        found |= {kw for kw in include | exclude for hit in list(found) if hit.startswith(kw)}
+        return len(found & include) >= min_hits and not (found & exclude)
+    return check
+
+alt_pi = alternation_filter(data_agent.PI_KEYWORDS, data_agent.PI_EXCLUSION_KEYWORDS, 2)
+alt_relevant = alternation_filter(label_cases.RELEVANT_KEYWORDS, label_cases.IRRELEVANT_KEYWORDS, 2)
+
+def alternation_all(text):
+    return alt_pi(text), alt_relevant(text)
+
+def legacy_hit_counts(text):
+    text = text.lower()
+    return {
+        name: {kw: text.count(kw) for kw in keywords if kw in text}
+        for name, keywords in (("include", label_cases.RELEVANT_KEYWORDS),
+                               ("exclude", label_cases.IRRELEVANT_KEYWORDS))
+    }
+
+def synthetic_texts(n, rng):
+    words = (data_agent.PI_KEYWORDS + data_agent.PI_EXCLUSION_KEYWORDS + data_agent.INCLUDE_KEYWORDS
+             + data_agent.EXCLUDE_KEYWORDS + label_cases.RELEVANT_KEYWORDS + label_cases.IRRELEVANT_KEYWORDS
+             + ["the", "court", "held", "appellant", "Injury", "NEGLIGENCE", "Custody"])
+    for _ in range(n):
+        yield " ".join(rng.choice(words) for _ in range(rng.randint(0, 12)))
+
+def check_equivalence(texts, names):
+    for text in texts:
+        assert legacy_all(text) == matcher_all(text) == alternation_all(text), text[:80]
+        assert legacy_hit_counts(text) == label_cases.relevance_filter.hit_counts(text), text[:80]
+    for name in names:
+        assert legacy_case_name(name) == data_agent.is_likely_case_name(name), name
+
+def time_per_call(fn, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the relevance keyword filters.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000, 500_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with open(os.path.join(ROOT, "data", "raw", "cases.json"), "r", encoding="utf-8") as f:
+        opinions = [c["full_text"] for c in json.load(f) if c.get("full_text")]
+
+    check_equivalence(opinions + list(synthetic_texts(5000, rng)), list(synthetic_texts(5000, rng)))
+    print(f"✅ Equivalent to the original filters on {len(opinions)} opinions + 10k synthetic texts")
+
+    print(f"{'chars':>9} {'original ms':>12} {'matcher ms':>11} {'speedup':>8} {'alternation ms':>15} "
+          f"{'count ms':>9} {'scan ms':>8}")
+    corpus = " ".join(opinions)
+    for size in args.sizes:
+        texts = []
+        for i in range(len(opinions)):
+            start = (i * 7919) % max(1, len(corpus) - 1)
+            text = (corpus[start:] + " " + corpus)[:size]
+            texts.append(text)
+        legacy_ms = time_per_call(legacy_all, texts, args.repeat)
+        matcher_ms = time_per_call(matcher_all, texts, args.repeat)
+        alt_ms = time_per_call(alternation_all, texts, max(1, args.repeat // 5))
+        count_ms = time_per_call(legacy_hit_counts, texts, args.repeat)
+        scan_ms = time_per_call(label_cases.relevance_filter.hit_counts, texts, args.repeat)
+        print(f"{size:>9} {legacy_ms:>12.3f} {matcher_ms:>11.3f} {legacy_ms / matcher_ms:>7.2f}x {alt_ms:>15.3f} "
+              f"{count_ms:>9.3f} {scan_ms:>8.3f}")
+
+if __name__ == "__main__":
+    main()
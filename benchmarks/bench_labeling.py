@@ -0,0 +1,53 @@
+"""Labeling throughput vs. concurrency against the local fake LLM server.
+
+Throughput should grow roughly linearly with concurrency until the limiter
+(LLM_RPM / LLM_TPM) becomes the bottleneck.
+
+    python benchmarks/bench_labeling.py --cases 200 --latency 0.3 --rpm 1200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "agents"))
+from benchmarks.fake_openai_server import FakeLLM, start_server
+
+CASE_TEXT = ("The plaintiff suffered a fracture and back injury in a motor vehicle accident "
+             "caused by the defendant's negligence and sought damages for medical treatment. ") * 30
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent LLM labeling.")
+    parser.add_argument("--cases", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--rpm", type=int, default=1200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    llm = FakeLLM(latency=args.latency, rpm=args.rpm)
+    server, url = start_server(llm)
+    os.environ["LLM_BASE_URL"] = url
+    os.environ["LLM_RPM"] = str(args.rpm)
+    os.environ["LLM_TPM"] = str(llm.tpm)
+
+    import label_cases
+
+    cases = [{"case_id": i, "full_text": CASE_TEXT} for i in range(args.cases)]
+    print(f"🏁 {args.cases} cases, {args.latency}s latency, {args.rpm} RPM budget")
+    print(f"{'concurrency':>12} {'seconds':>9} {'cases/s':>9} {'429s':>6}")
+    for concurrency in args.concurrency:
+        label_cases.limiter = label_cases.make_limiter()
+        rejected_before = llm.rejected
+        start = time.perf_counter()
+        results = list(label_cases.map_ordered(label_cases.label_one, cases, concurrency))
+        elapsed = time.perf_counter() - start
+        assert [c["case_id"] for c, _ in results] == list(range(args.cases))
+        print(f"{concurrency:>12} {elapsed:>9.2f} {args.cases / elapsed:>9.1f} {llm.rejected - rejected_before:>6}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
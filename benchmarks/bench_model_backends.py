@@ -0,0 +1,80 @@
+"""Cold start and latency of each model backend (see ml/model_artifact.py).
+
+Cold start is measured in a fresh interpreter: imports + artifact load + first
+prediction, which is what an API worker pays before serving its first request.
+
+    python benchmarks/bench_model_backends.py --runs 5 --repeat 2000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from ml.feature_spec import FEATURE_COLUMNS, row_matrix
+from ml.model_artifact import MODEL_BACKENDS, load_model
+
+CASE = {
+    "injuries": ["spinal cord injury", "fracture"],
+    "medical_bills": 42000,
+    "lost_wages": 18000,
+    "age": 46,
+    "gender": "Female",
+}
+
+COLD_START = """
+import time
+start = time.perf_counter()
+import numpy as np
+from ml.model_artifact import load_model
+model = load_model({backend!r})
+model.predict(np.zeros((1, {n_features}), dtype=np.float32))
+print(time.perf_counter() - start)
+"""
+
+def cold_start(backend, runs):
+    code = COLD_START.format(backend=backend, n_features=len(FEATURE_COLUMNS))
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(times)
+
+def random_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, 4, n), rng.integers(0, 2, n), rng.uniform(0, 300_000, n),
+        rng.uniform(0, 150_000, n), rng.integers(18, 90, n), rng.integers(0, 2, n),
+    ])
+    return X.astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model backends.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per backend for cold start")
+    parser.add_argument("--repeat", type=int, default=2000, help="Single-row predictions timed per backend")
+    parser.add_argument("--batch", type=int, default=10_000, help="Rows in the batch throughput test")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)  # Artifact paths are relative to the repo root
+    single = row_matrix([CASE])
+    batch = random_rows(args.batch)
+    reference = load_model("pickle").predict(batch)
+
+    print(f"{'backend':>8} {'cold start ms':>14} {'1-row µs':>9} {f'{args.batch}-row ms':>12} {'max |Δ| vs pickle':>18}")
+    for backend in MODEL_BACKENDS:
+        model = load_model(backend)
+        latency = min(timeit.repeat(lambda: model.predict(single), number=args.repeat, repeat=3)) / args.repeat
+        throughput = min(timeit.repeat(lambda: model.predict(batch), number=3, repeat=3)) / 3
+        diff = float(np.abs(model.predict(batch) - reference).max())
+        print(f"{backend:>8} {cold_start(backend, args.runs) * 1000:>14.0f} {latency * 1e6:>9.1f} "
+              f"{throughput * 1000:>12.1f} {diff:>18.4f}")
+
+if __name__ == "__main__":
+    main()
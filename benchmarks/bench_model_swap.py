@@ -0,0 +1,103 @@
+"""Roll model versions under load: no request may fail while versions swap.
+
+Builds a throwaway registry from the committed model (each "version" is the
+same booster, so predictions must stay identical), starts the API against it,
+hammers /predict from several threads, and meanwhile publishes new versions,
+flips ACTIVE via the admin endpoint and turns on a shadow candidate.
+
+    python benchmarks/bench_model_swap.py --threads 8 --seconds 10 --swaps 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from bench_predict_batch import random_case, start_api
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hot model swaps under load.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--swaps", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    registry_dir = tempfile.mkdtemp(prefix="model-registry-")
+    os.environ["MODEL_REGISTRY_DIR"] = registry_dir
+    os.environ["MODEL_RELOAD_SECONDS"] = "0.5"
+    from ml.model_artifact import BOOSTER_PATH, TREES_PATH, load_metadata
+    from ml.model_registry import publish_version
+
+    artifacts = {"booster": BOOSTER_PATH, "trees": TREES_PATH}
+    publish_version(artifacts, load_metadata(), version="v000", root=registry_dir)
+    server, url = start_api()
+
+    stop = threading.Event()
+    versions = Counter()
+    errors = Counter()
+    latencies = []
+    predictions = set()
+    lock = threading.Lock()
+
+    def client(seed):
+        session = requests.Session()
+        case = random_case(random.Random(0))
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{url}/predict", json=case)
+                response.raise_for_status()
+                body = response.json()
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                versions[body["model_version"]] += 1
+                predictions.add(body["predicted_settlement"])
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(args.threads)]
+    for w in workers:
+        w.start()
+
+    admin = requests.Session()
+    for i in range(1, args.swaps + 1):
+        time.sleep(args.seconds / (args.swaps + 1))
+        version = f"v{i:03d}"
+        if i % 2:
+            # Published + activated on disk: picked up by the file watcher
+            publish_version(artifacts, load_metadata(), version=version, root=registry_dir)
+        else:
+            # Published without activating, then switched via the admin endpoint
+            publish_version(artifacts, load_metadata(), version=version, root=registry_dir, activate=False)
+            admin.post(f"{url}/models/{version}/activate").raise_for_status()
+        if i == 1:
+            admin.post(f"{url}/models/v000/shadow").raise_for_status()
+    time.sleep(args.seconds / (args.swaps + 1))
+    stop.set()
+    for w in workers:
+        w.join()
+
+    status = admin.get(f"{url}/models").json()
+    server.should_exit = True
+    latencies.sort()
+    print(f"🏁 {len(latencies)} requests in {args.seconds:.0f}s from {args.threads} threads, {args.swaps} swaps")
+    print(f"   errors: {dict(errors) or 0}")
+    print(f"   p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"   served by version: {dict(sorted(versions.items()))}")
+    print(f"   distinct predictions: {sorted(predictions)}")
+    print(f"   active {status['active']}, shadow {status['shadow']}, shadow stats {status['shadow_stats']}")
+
+if __name__ == "__main__":
+    main()
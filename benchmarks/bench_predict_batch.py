@@ -0,0 +1,83 @@
+"""Throughput of /predict/batch at several batch sizes vs. looping over /predict.
+
+Starts the API with uvicorn on a free local port (run from anywhere; the
+working directory is switched to the repo root so the model path resolves).
+
+    python benchmarks/bench_predict_batch.py --cases 2000 --batch-sizes 1 10 100 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+import requests
+import uvicorn
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def random_case(rng):
+    return {
+        "summary": "Plaintiff injured in a collision.",
+        "injuries": rng.sample(["spinal cord injury", "fracture", "whiplash", "burn", "concussion"], rng.randint(1, 3)),
+        "medical_bills": rng.uniform(0, 200_000),
+        "lost_wages": rng.uniform(0, 100_000),
+        "age": rng.randint(20, 70),
+        "gender": rng.choice(["Male", "Female"]),
+    }
+
+def start_api():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    config = uvicorn.Config("app.api:app", host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch vs. single-case prediction.")
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--ndjson", action="store_true", help="Send batches as NDJSON")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    server, url = start_api()
+    session = requests.Session()
+    rng = random.Random(0)
+    cases = [random_case(rng) for _ in range(args.cases)]
+
+    start = time.perf_counter()
+    for case in cases:
+        session.post(f"{url}/predict", json=case).raise_for_status()
+    baseline = args.cases / (time.perf_counter() - start)
+    print(f"🏁 {args.cases} cases")
+    print(f"{'mode':>18} {'cases/s':>10} {'speedup':>8}")
+    print(f"{'loop /predict':>18} {baseline:>10.0f} {1.0:>7.1f}x")
+
+    for size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, args.cases, size):
+            batch = cases[i:i + size]
+            if args.ndjson:
+                body = "\n".join(json.dumps(c) for c in batch)
+                response = session.post(f"{url}/predict/batch", data=body,
+                                        headers={"Content-Type": "application/x-ndjson"})
+            else:
+                response = session.post(f"{url}/predict/batch", json=batch)
+            response.raise_for_status()
+        rate = args.cases / (time.perf_counter() - start)
+        print(f"{'batch of ' + str(size):>18} {rate:>10.0f} {rate / baseline:>7.1f}x")
+
+    server.should_exit = True
+
+if __name__ == "__main__":
+    main()
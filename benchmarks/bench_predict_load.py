@@ -0,0 +1,145 @@
+"""Load test for /predict with and without micro-batching (PREDICT_BATCHING).
+
+Runs the API in a uvicorn subprocess per mode and drives it with `--concurrency`
+simultaneous clients for `--seconds`, reporting RPS and p50/p99 latency plus the
+batcher's own metrics. `--in-process` skips HTTP and calls the batcher (or the
+threadpool predict the handler uses) directly, isolating the model-call overhead
+batching removes from the request parsing a small machine spends most time on.
+
+    python benchmarks/bench_predict_load.py --concurrency 64 --seconds 10 --max-wait-us 2000
+    python benchmarks/bench_predict_load.py --in-process
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+from bench_predict_batch import random_case
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_api(batching, max_batch, max_wait_us):
+    port = free_port()
+    env = {**os.environ, "PREDICT_BATCHING": "1" if batching else "0", "PREDICT_MAX_BATCH": str(max_batch),
+           "PREDICT_MAX_WAIT_US": str(max_wait_us), "MODEL_RELOAD_SECONDS": "0", "PYTHONWARNINGS": "ignore"}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(600):
+        try:
+            httpx.get(url, timeout=1).raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("❌ API did not start")
+
+async def drive(url, concurrency, seconds):
+    cases = [random_case(random.Random(i)) for i in range(256)]
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def worker(i):
+            nonlocal errors
+            n = i
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/predict", json=cases[n % len(cases)])
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+                n += concurrency
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get("/metrics")).json()["batching"]
+    return latencies, errors, elapsed, metrics
+
+async def drive_in_process(entry, batcher, concurrency, seconds):
+    from ml.feature_spec import row_matrix
+
+    rows = row_matrix([random_case(random.Random(i)) for i in range(256)])
+    latencies = []
+    loop = asyncio.get_running_loop()
+    deadline = time.perf_counter() + seconds
+
+    async def worker(i):
+        n = i
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if batcher is not None:
+                await batcher.predict(entry, rows[n % len(rows)])
+            else:
+                await loop.run_in_executor(None, entry.model.predict, rows[n % len(rows)][None])
+            latencies.append(time.perf_counter() - start)
+            n += concurrency
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, 0, time.perf_counter() - start, batcher.summary() if batcher else {"enabled": False}
+
+def run_in_process(batching, args):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from app.batching import MicroBatcher
+    from ml.model_registry import ModelRegistry
+
+    entry, _ = ModelRegistry().get()
+    batcher = MicroBatcher(args.max_batch, args.max_wait_us) if batching else None
+    return asyncio.run(drive_in_process(entry, batcher, args.concurrency, args.seconds))
+
+def run_http(batching, args):
+    process, url = start_api(batching, args.max_batch, args.max_wait_us)
+    try:
+        return asyncio.run(drive(url, args.concurrency, args.seconds))
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /predict with and without micro-batching.")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-us", type=int, default=2000)
+    parser.add_argument("--in-process", action="store_true", help="Call the batcher directly instead of over HTTP")
+    args = parser.parse_args()
+
+    where = "in-process callers" if args.in_process else "concurrent HTTP clients"
+    print(f"🏁 {args.concurrency} {where} for {args.seconds:.0f}s")
+    print(f"{'mode':>10} {'RPS':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'mean batch':>11}")
+    for batching in (False, True):
+        run = run_in_process if args.in_process else run_http
+        latencies, errors, elapsed, metrics = run(batching, args)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        mean_batch = f"{metrics['mean_batch_size']:.1f}" if metrics["enabled"] else "-"
+        print(f"{'batched' if batching else 'unbatched':>10} {len(latencies) / elapsed:>8.0f} "
+              f"{p50:>8.1f} {p99:>8.1f} {errors:>7} {mean_batch:>11}")
+        if batching:
+            print(f"   batch sizes: {metrics['batch_size_histogram']}, max queue depth {metrics['max_queue_depth']}")
+
+if __name__ == "__main__":
+    main()
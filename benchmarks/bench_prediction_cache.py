@@ -0,0 +1,62 @@
+"""Prediction cache: lookup cost vs. model call, and repeat /predict + /explain latency.
+
+    python benchmarks/bench_prediction_cache.py --requests 500
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+CASE = {
+    "summary": "Plaintiff suffered a spinal cord injury due to a slip and fall.",
+    "injuries": ["spinal cord injury", "fracture"],
+    "medical_bills": 42000,
+    "lost_wages": 18000,
+    "age": 46,
+    "gender": "Female",
+}
+
+def request_ms(client, path, n, vary):
+    start = time.perf_counter()
+    for i in range(n):
+        # vary=True changes a model feature every time, so nothing can be served from cache
+        case = {**CASE, "medical_bills": CASE["medical_bills"] + i} if vary else CASE
+        client.post(path, json=case).raise_for_status()
+    return (time.perf_counter() - start) / n * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the prediction cache.")
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    os.environ["MODEL_RELOAD_SECONDS"] = "0"
+    from fastapi.testclient import TestClient
+    import app.api as api
+
+    entry, _ = api.registry.get()
+    cache = api.prediction_cache
+    X = api.features_matrix([api.CaseInput(**CASE)])
+    key = cache.make_key("predict", entry.cache_key, X[0])
+    cache.put(key, 0.0)
+    lookup = min(timeit.repeat(lambda: cache.get(cache.make_key("predict", entry.cache_key, X[0])),
+                               number=10_000, repeat=3)) / 10_000
+    predict = min(timeit.repeat(lambda: entry.model.predict(X), number=500, repeat=3)) / 500
+    print(f"🔑 cache hit {lookup * 1e6:.1f} µs vs model.predict {predict * 1e6:.1f} µs ({entry.version})")
+
+    client = TestClient(api.app)
+    print(f"{'endpoint':>9} {'uncached ms':>12} {'repeat ms':>10}")
+    for path in ("/predict", "/explain"):
+        client.post(path, json=CASE)  # Warm up (SHAP explainer, cache entry)
+        uncached = request_ms(client, path, args.requests if path == "/predict" else args.requests // 5, vary=True)
+        repeat = request_ms(client, path, args.requests, vary=False)
+        print(f"{path:>9} {uncached:>12.2f} {repeat:>10.2f}")
+    print(f"📈 {cache.stats()}")
+
+if __name__ == "__main__":
+    main()
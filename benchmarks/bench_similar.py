@@ -0,0 +1,150 @@
+"""Load test for /similar on a synthetic passage index.
+
+Builds a `--n`-vector index per layout (clustered 384-d vectors shaped like
+all-MiniLM-L6-v2 embeddings, `--passages` passages per case, random
+jurisdictions and filing dates), then reports cold-load time with and without
+memory-mapping and drives /similar in-process through the ASGI app with
+`--concurrency` simultaneous clients, a `--filter-rate` share of them filtering
+by jurisdiction or date. Query embedding uses all-MiniLM-L6-v2 when
+sentence-transformers is installed (`--embedder minilm`), otherwise a stand-in
+that looks up precomputed query vectors, so only search + serving is timed.
+`--direct` skips HTTP and submits straight to the /similar micro-batcher, which
+isolates embedding + search from request handling (the load generator shares
+the CPU with the app either way).
+
+    python benchmarks/bench_similar.py --n 100000 --kinds flat hnsw --concurrency 1 16 64
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(__file__))
+from bench_ann_index import synthetic_vectors
+from llm import retriever
+from app import api
+from app.similar import SimilarCaseIndex, case_filter, index_stamp
+
+JURISDICTIONS = ("cal", "ny", "tex", "fla", "ill", "pa", "ohio", "mich")
+
+class LookupEmbedder:
+    """Stand-in encoder: query text "q<i>" maps to precomputed vector i."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        return self.vectors[[int(text[1:]) for text in texts]]
+
+def build_fixture(path, kind, base, passages_per_case, rng):
+    n_cases = len(base) // passages_per_case
+    metadata = retriever.empty_metadata(kind)
+    years = rng.integers(1990, 2025, n_cases)
+    for case in range(n_cases):
+        case_id = f"case-{case}"
+        ids = list(range(case * passages_per_case, (case + 1) * passages_per_case))
+        metadata["cases"][case_id] = {"hash": "", "ids": ids}
+        for chunk_id, passage_id in enumerate(ids):
+            metadata["passages"][passage_id] = {
+                "case_id": case_id, "case_name": f"Case {case}", "source_url": "",
+                "jurisdiction": JURISDICTIONS[case % len(JURISDICTIONS)],
+                "date_filed": f"{years[case]}-06-01", "chunk_id": chunk_id, "start": 0, "end": 180,
+            }
+    metadata["next_id"] = n_cases * passages_per_case
+    vectors = base[:metadata["next_id"]]
+    index = retriever.make_index(kind, vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    retriever.save_index(index, metadata, path)
+
+def random_query(n_queries, filter_rate, k):
+    body = {"text": f"q{random.randrange(n_queries)}", "k": k}
+    if random.random() < filter_rate:
+        if random.random() < 0.5:
+            body["jurisdiction"] = random.choice(JURISDICTIONS)
+        else:
+            year = random.randint(1990, 2020)
+            body["filed_after"], body["filed_before"] = f"{year}-01-01", f"{year + 4}-12-31"
+    return body
+
+async def drive(concurrency, seconds, n_queries, filter_rate, k, direct=False):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                body = random_query(n_queries, filter_rate, k)
+                start = time.perf_counter()
+                if direct:
+                    key = case_filter(body.get("jurisdiction"), body.get("filed_after"), body.get("filed_before"))
+                    await api.similar_batcher.submit(api.similar_index, (body["text"], k, key))
+                else:
+                    response = await client.post("/similar", json=body)
+                    response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies = np.array(latencies) * 1000
+    return len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /similar.")
+    parser.add_argument("--n", type=int, default=100_000, help="Passage vectors in the index")
+    parser.add_argument("--passages", type=int, default=4, help="Passages per case")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--kinds", nargs="+", default=["flat", "hnsw"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--filter-rate", type=float, default=0.3)
+    parser.add_argument("--embedder", choices=["lookup", "minilm"], default="lookup")
+    parser.add_argument("--direct", action="store_true", help="Submit to the batcher without HTTP")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = synthetic_vectors(args.n + args.queries, 384, clusters=200, rng=rng)
+    queries, base = data[:args.queries], data[args.queries:]
+    embedder = retriever.load_embedder() if args.embedder == "minilm" else LookupEmbedder(queries)
+
+    workdir = tempfile.mkdtemp(prefix="bench_similar_")
+    try:
+        for kind in args.kinds:
+            path = os.path.join(workdir, kind)
+            build_fixture(path, kind, base, args.passages, rng)
+            size_mb = os.path.getsize(os.path.join(path, "index.faiss")) / 1e6
+            print(f"\n🏁 {kind}: {args.n} passages, {size_mb:.0f} MB index, embedder={args.embedder}, "
+                  f"{args.filter_rate:.0%} filtered queries, k={args.k}" + (", direct" if args.direct else ", via ASGI"))
+            for mmap in (False, True):
+                start = time.perf_counter()
+                service = SimilarCaseIndex(path, embedder=embedder, mmap=mmap)
+                print(f"   load {'mmap' if mmap else 'read'}: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+            # Pin the API to this fixture so its index watcher doesn't swap in another one
+            with api.similar_lock:
+                api.SIMILAR_INDEX_PATH, api.similar_stamp = path, index_stamp(path)
+                api.similar_index = service
+            print(f"{'clients':>8} {'RPS':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11}")
+            for concurrency in args.concurrency:
+                api.similar_batcher.stats = type(api.similar_batcher.stats)()
+                rps, p50, p99 = asyncio.run(
+                    drive(concurrency, args.seconds, args.queries, args.filter_rate, args.k, args.direct)
+                )
+                batch = api.similar_batcher.summary()["mean_batch_size"]
+                print(f"{concurrency:>8} {rps:>8.0f} {p50:>8.2f} {p99:>8.2f} {batch:>11.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Cross-validated hyperparameter search: DMatrix reuse and scaling with workers.
+
+On a synthetic `--rows` x FEATURE_COLUMNS regression problem, reports what
+quantizing the CV folds costs next to one trial (the cost every trial would pay
+without the per-worker cache), then runs the same `--trials`-trial search with
+each `--workers` count (threads per trial = cores // workers) and reports wall
+time and mean seconds per trial.
+
+    python benchmarks/bench_train_search.py --rows 200000 --trials 16 --folds 5 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from ml import train_model
+from ml.feature_spec import FEATURE_COLUMNS
+
+def synthetic_problem(rows, rng):
+    X = rng.normal(size=(rows, len(FEATURE_COLUMNS))).astype(np.float32)
+    y = 50_000 + 20_000 * X[:, 0] + 10_000 * np.abs(X[:, 1]) * (X[:, 2] > 0) + rng.normal(0, 5_000, rows)
+    return X, y.astype(np.float32)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CV hyperparameter search.")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--trials", type=int, default=8)
+    parser.add_argument("--folds", type=int, default=train_model.CV_FOLDS)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    X, y = synthetic_problem(args.rows, np.random.default_rng(0))
+    splits = train_model.cv_splits(len(X), args.folds, 42)
+    print(f"🏁 {args.rows} rows x {X.shape[1]} features, {args.trials} trials x {len(splits)}-fold CV, {cores} cores")
+
+    start = time.perf_counter()
+    train_model.build_folds(X, y, splits, cores)
+    build_s = time.perf_counter() - start
+    params = train_model.sample_params(np.random.default_rng(1))
+    trial = train_model.run_trial(0, params, cores)
+    print(f"   quantizing {len(splits)} folds: {build_s:.2f}s once per worker | "
+          f"one trial: {trial['seconds']:.2f}s ({trial['rounds']} rounds)")
+
+    print(f"{'workers':>8} {'threads':>8} {'wall s':>8} {'s/trial':>8} {'best MAE':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            start = time.perf_counter()
+            results = train_model.search(X, y, args.trials, args.folds, workers,
+                                         leaderboard_path=os.path.join(tmp, f"leaderboard.{workers}.jsonl"))
+            wall = time.perf_counter() - start
+            per_trial = np.mean([r["seconds"] for r in results])
+            print(f"{workers:>8} {results[0]['nthread']:>8} {wall:>8.1f} {per_trial:>8.2f} {results[0]['cv_mae']:>10,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Replies after a fixed latency, advertises its budget through `x-ratelimit-*`
+headers and answers 429 once that budget is exceeded, which is enough to
+exercise the labeling/summarization engines without a network.
+
+    python benchmarks/fake_openai_server.py --port 8765 --latency 0.5 --rpm 600
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = json.dumps({
+    "injuries": ["fracture", "back injury"],
+    "medical_bills": 42000,
+    "lost_wages": 18000,
+    "settlement_amount": 175000,
+    "age": 46,
+    "gender": "Female"
+})
+
+class FakeLLM:
+    def __init__(self, latency=0.5, rpm=600, tpm=1_000_000, reply=DEFAULT_REPLY):
+        self.latency = latency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.reply = reply
+        self.calls = 0
+        self.rejected = 0
+        self.window = deque()  # (timestamp, tokens) of accepted requests in the last minute
+        self.lock = threading.Lock()
+
+    def admit(self, tokens):
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0][0] > 60:
+                self.window.popleft()
+            used_tokens = sum(t for _, t in self.window)
+            if len(self.window) >= self.rpm or used_tokens + tokens > self.tpm:
+                self.rejected += 1
+                return False, 0, 0
+            self.window.append((now, tokens))
+            self.calls += 1
+            return True, self.rpm - len(self.window), self.tpm - used_tokens - tokens
+
+def make_handler(llm):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+            tokens = len(prompt) // 4 + 1
+            ok, remaining_requests, remaining_tokens = llm.admit(tokens)
+
+            headers = {
+                "x-ratelimit-limit-requests": str(llm.rpm),
+                "x-ratelimit-limit-tokens": str(llm.tpm),
+                "x-ratelimit-remaining-requests": str(remaining_requests),
+                "x-ratelimit-remaining-tokens": str(remaining_tokens),
+            }
+            if not ok:
+                headers["retry-after"] = "1"
+                self._send(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}}, headers)
+                return
+
+            time.sleep(llm.latency)
+            self._send(200, {
+                "id": f"chatcmpl-{llm.calls}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": llm.reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": tokens, "completion_tokens": 60, "total_tokens": tokens + 60}
+            }, headers)
+
+        def _send(self, status, payload, headers):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def start_server(llm, port=0):
+    """Serve `llm` on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(llm))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    server, url = start_server(FakeLLM(args.latency, args.rpm, args.tpm), args.port)
+    print(f"🤖 Fake OpenAI-compatible API listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
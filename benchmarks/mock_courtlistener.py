@@ -0,0 +1,128 @@
+"""Local mock of the CourtListener v4 opinions endpoint.
+
+Serves deterministic synthetic opinions with cursor pagination, a fixed
+per-request latency and optional injected 429/503 responses.
+
+    python benchmarks/mock_courtlistener.py --port 8766 --latency 0.2 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+PI_TEXT = ("The plaintiff brought a personal injury action alleging negligence after a motor vehicle "
+           "accident caused a spinal fracture, and sought damages for pain and suffering. ")
+OTHER_TEXT = ("The appellant challenges the district court's ruling on a contract dispute concerning "
+              "the interpretation of a commercial lease and related arbitration clauses. ")
+
+class MockCourtListener:
+    def __init__(self, pages=20, page_size=20, latency=0.2, error_rate=0.0, text_repeat=150, seed=0):
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.text_repeat = text_repeat
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def page(self, court, cursor, page_size, base_url, since=None):
+        """One page shaped like a real v4 /opinions/ response: no case name, court or date_filed on the record."""
+        results = []
+        for i in range(page_size):
+            n = cursor * page_size + i
+            date_created = f"2024-{1 + (n // 28) % 12:02d}-{1 + n % 28:02d}T08:00:00.000000-08:00"
+            if since and date_created < since:
+                continue
+            # Stable across processes, unlike hash(), so restarts serve the same IDs
+            opinion_id = zlib.crc32(f"{court}:{n}".encode("utf-8")) & 0x7FFFFFFF
+            results.append({
+                "resource_uri": f"{base_url}{opinion_id}/",
+                "id": opinion_id,
+                "absolute_url": f"/opinion/{n}/{court}-case-{n}/",
+                "cluster_id": n,
+                "cluster": f"{base_url.replace('/opinions/', '/clusters/')}{n}/",
+                "date_created": date_created,
+                "date_modified": date_created,
+                "type": "010combined",
+                "plain_text": (PI_TEXT if n % 3 else OTHER_TEXT) * self.text_repeat,
+            })
+        next_url = None
+        if cursor + 1 < self.pages:
+            query = {"cluster__docket__court": court, "page_size": page_size, "cursor": cursor + 1}
+            if since:
+                query["date_created__gte"] = since
+            next_url = f"{base_url}?{urlencode(query)}"
+        return {"count": self.pages * page_size, "next": next_url, "previous": None, "results": results}
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so pooled sessions actually reuse sockets
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with mock.lock:
+                mock.requests += 1
+                fail = mock.random.random() < mock.error_rate
+                if fail:
+                    mock.errors += 1
+            time.sleep(mock.latency)
+
+            if fail:
+                status = 429 if mock.errors % 2 else 503
+                self._send(status, {"detail": "try again"}, {"Retry-After": "0"})
+                return
+
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            base_url = f"http://{self.headers['Host']}{url.path}"
+            data = mock.page(
+                court=query.get("cluster__docket__court", ["ca9"])[0],
+                cursor=int(query.get("cursor", ["0"])[0]),
+                page_size=int(query.get("page_size", [mock.page_size])[0]),
+                base_url=base_url,
+                since=query.get("date_created__gte", [None])[0]
+            )
+            self._send(200, data)
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+def start_server(mock, port=0):
+    """Serve `mock` on a background thread; returns (server, opinions_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/rest/v4/opinions/"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_server(MockCourtListener(args.pages, latency=args.latency, error_rate=args.error_rate), args.port)
+    print(f"⚖️ Mock CourtListener listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,424 @@
+# llm/embedding_store.py
+
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+
+import numpy as np
+import pyarrow as pa
+
+# <index dir>/store/: store.json, ids.npy, embeddings.float32.npy, passages.arrow, and any quantized variants
+# (embeddings.<dtype>.npy, embeddings.int8.scale.npy). Serving quantizes inside the FAISS index instead
+# (retriever.INDEX_DTYPE), so the index build keeps only the float32 matrix it re-indexes from.
+STORE_DIR = "store"
+MANIFEST_FILE = "store.json"
+IDS_FILE = "ids.npy"
+PASSAGES_FILE = "passages.arrow"
+STORE_DTYPES = ("float32", "float16", "int8")
+STORE_VARIANTS = ("float16", "int8")  # Optional variants derived from the float32 matrix
+CHUNK_ROWS = 65_536  # Rows converted / scanned at a time
+MAX_DEAD_FRACTION = 0.25  # Share of rows an appended store may keep for replaced / deleted passages
+PASSAGE_FIELDS = ("case_id", "case_name", "source_url", "jurisdiction", "date_filed", "chunk_id", "start", "end")
+
+def embeddings_file(dtype):
+    return f"embeddings.{dtype}.npy"
+
+class EmbeddingSpool:
+    """Float32 embeddings and their passage IDs appended to temp files as they're produced.
+
+    A streaming build never holds the whole matrix in memory; `write_store`
+    reads the spool back through a memory map when the index is saved.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = tempfile.mkdtemp(prefix="embedding_spool_", dir=directory)
+        self._vectors = open(os.path.join(self.directory, "vectors.f32"), "wb")
+        self._ids = open(os.path.join(self.directory, "ids.i64"), "wb")
+        self.dim = None
+        self.count = 0
+
+    def append(self, ids, embeddings):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        self._vectors.write(embeddings.tobytes())
+        self._ids.write(np.asarray(ids, dtype=np.int64).tobytes())
+        self.count += len(embeddings)
+
+    def extend_from(self, store, chunk_rows=CHUNK_ROWS):
+        """Carry over the live rows of an existing store (rows deleted since are dropped by write_store)."""
+        for ids, vectors in store.live_rows(chunk_rows):
+            self.append(ids, vectors)
+
+    def arrays(self):
+        """(ids, vectors) as read-only memory maps of everything appended so far."""
+        self._vectors.flush()
+        self._ids.flush()
+        if not self.count:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim or 0), dtype=np.float32)
+        ids = np.memmap(os.path.join(self.directory, "ids.i64"), dtype=np.int64, mode="r", shape=(self.count,))
+        vectors = np.memmap(
+            os.path.join(self.directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+        )
+        return ids, vectors
+
+    def discard(self):
+        self._vectors.close()
+        self._ids.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def passage_table(metadata, ids):
+    """Arrow table of passage metadata for `ids` (sorted), plus each passage's case hash."""
+    chunks = [metadata["passages"][passage_id] for passage_id in ids.tolist()]
+    columns = {"passage_id": pa.array(ids, type=pa.int64())}
+    for field in PASSAGE_FIELDS:
+        columns[field] = pa.array([chunk.get(field) for chunk in chunks])
+    columns["case_hash"] = pa.array([metadata["cases"][chunk["case_id"]]["hash"] for chunk in chunks], type=pa.string())
+    return pa.table(columns)
+
+def write_store(path, metadata, spool=None, index_ntotal=None, variants=(), chunk_rows=CHUNK_ROWS, index_file=None):
+    """Write the columnar store for an index: passage metadata, and embeddings if `spool` covers every passage.
+
+    The float32 matrix is written as .npy (np.load(..., mmap_mode="r") maps it),
+    then each of `variants` is derived from it chunk by chunk: float16, and int8
+    with one symmetric scale per dimension. `index_file` (size and mtime of
+    the index it belongs to) goes into the manifest. Built next to `path` and
+    swapped in.
+    """
+    ids = np.sort(np.fromiter(metadata["passages"].keys(), dtype=np.int64, count=len(metadata["passages"])))
+    tmp = f"{path}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    table = passage_table(metadata, ids)
+    with pa.OSFile(os.path.join(tmp, PASSAGES_FILE), "wb") as sink:
+        # Uncompressed IPC, so readers can use the columns straight from the mapped file
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    np.save(os.path.join(tmp, IDS_FILE), ids)
+
+    manifest = {
+        "count": len(ids),
+        "dim": None,
+        "dtypes": [],
+        "index_kind": metadata.get("index_kind"),
+        "index_dtype": metadata.get("index_dtype", "float32"),
+        "next_id": metadata["next_id"],
+        "index_ntotal": index_ntotal,
+        "index_file": index_file,
+        "bytes": {},
+    }
+    rows = _spool_rows(spool, ids)
+    if rows is not None:
+        spool_vectors = spool.arrays()[1]
+        manifest["dim"] = spool.dim or 0
+        shape = (len(ids), manifest["dim"])
+        matrix = np.lib.format.open_memmap(os.path.join(tmp, embeddings_file("float32")), "w+", np.float32, shape)
+        absmax = np.zeros(shape[1], dtype=np.float32)
+        for start in range(0, len(ids), chunk_rows):
+            chunk = spool_vectors[rows[start:start + chunk_rows]]
+            matrix[start:start + len(chunk)] = chunk
+            np.maximum(absmax, np.abs(chunk).max(axis=0), out=absmax)
+        matrix.flush()
+        manifest["dtypes"].append("float32")
+
+        for dtype in variants:
+            out = np.lib.format.open_memmap(os.path.join(tmp, embeddings_file(dtype)), "w+", dtype, shape)
+            scale = np.where(absmax > 0, absmax / 127, 1).astype(np.float32)
+            for start in range(0, len(ids), chunk_rows):
+                chunk = matrix[start:start + chunk_rows]
+                out[start:start + len(chunk)] = (
+                    np.clip(np.rint(chunk / scale), -127, 127) if dtype == "int8" else chunk
+                ).astype(dtype)
+            out.flush()
+            if dtype == "int8":
+                np.save(os.path.join(tmp, "embeddings.int8.scale.npy"), scale)
+            manifest["dtypes"].append(dtype)
+        del matrix
+    elif spool is not None and len(ids):
+        print("⚠️ Embedding spool doesn't cover every passage — saving metadata only. Run with --rebuild to store embeddings.")
+
+    for name in os.listdir(tmp):
+        manifest["bytes"][name] = os.path.getsize(os.path.join(tmp, name))
+    with open(os.path.join(tmp, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    # Rename the old store aside rather than deleting it under readers that have it mapped
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+def append_store(path, metadata, spool, index_ntotal=None, index_file=None, chunk_rows=CHUNK_ROWS,
+                 max_dead_fraction=MAX_DEAD_FRACTION):
+    """Bring the float32 store at `path` up to date by appending only the passages added since it was written.
+
+    Passage IDs only grow, so new rows go at the end and rows stay sorted by ID.
+    Rows of replaced or deleted passages stay in the matrix (the passage table
+    drops them) until they make up `max_dead_fraction` of it. The matrix is
+    extended in place, never truncated below what readers have mapped; the
+    small files and the manifest are replaced. Returns the manifest, or None
+    when the store has to be rewritten with write_store: none yet, quantized
+    variants, too many dead rows, or new passages missing from `spool`.
+    """
+    manifest = read_manifest(path)
+    if manifest is None or manifest["dtypes"] != ["float32"]:
+        return None
+    count, dim = manifest["count"], manifest["dim"]
+    old_ids = np.load(os.path.join(path, IDS_FILE))[:count]
+    ids = np.sort(np.fromiter(metadata["passages"].keys(), dtype=np.int64, count=len(metadata["passages"])))
+    kept, new_ids = ids[ids < manifest["next_id"]], ids[ids >= manifest["next_id"]]
+    positions = np.minimum(np.searchsorted(old_ids, kept), max(count - 1, 0))
+    if len(kept) and (not count or not np.array_equal(old_ids[positions], kept)):
+        return None
+    total = count + len(new_ids)
+    if total - len(ids) > max_dead_fraction * total:
+        return None
+    rows = _spool_rows(spool, new_ids) if len(new_ids) else np.empty(0, dtype=np.int64)
+    if rows is None or (len(rows) and spool.dim != dim):
+        return None
+    if not _append_npy_rows(os.path.join(path, embeddings_file("float32")), count, dim,
+                            spool.arrays()[1] if len(rows) else None, rows, chunk_rows):
+        return None
+
+    _replace_file(os.path.join(path, IDS_FILE), lambda f: np.save(f, np.concatenate([old_ids, new_ids])))
+    table = passage_table(metadata, ids)
+
+    def write_passages(f):
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+
+    _replace_file(os.path.join(path, PASSAGES_FILE), write_passages)
+    manifest.update({
+        "count": total,
+        "index_kind": metadata.get("index_kind"),
+        "index_dtype": metadata.get("index_dtype", "float32"),
+        "next_id": metadata["next_id"],
+        "index_ntotal": index_ntotal,
+        "index_file": index_file,
+    })
+    for name in manifest["bytes"]:
+        manifest["bytes"][name] = os.path.getsize(os.path.join(path, name))
+    _replace_file(os.path.join(path, MANIFEST_FILE), lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+    return manifest
+
+def _append_npy_rows(path, count, dim, vectors, rows, chunk_rows):
+    """Grow the float32 .npy matrix at `path` from `count` rows by vectors[rows], in place; False if it can't."""
+    with open(path, "r+b") as f:
+        if np.lib.format.read_magic(f) != (1, 0):
+            return False
+        np.lib.format.read_array_header_1_0(f)
+        header_bytes = f.tell()
+        # Rows past `count` are left over from a save that died before its manifest
+        f.truncate(header_bytes + count * dim * 4)
+        f.seek(0, os.SEEK_END)
+        for start in range(0, len(rows), chunk_rows):
+            f.write(np.ascontiguousarray(vectors[rows[start:start + chunk_rows]], dtype=np.float32).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        # NumPy pads the header so the first dimension can grow without moving the data
+        f.seek(0)
+        np.lib.format.write_array_header_1_0(f, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)), "fortran_order": False,
+            "shape": (count + len(rows), dim),
+        })
+        if f.tell() != header_bytes:
+            raise RuntimeError(f"❌ {path} header changed size while appending rows")
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+def _replace_file(path, write):
+    with open(f"{path}.tmp", "wb") as f:
+        write(f)
+    os.replace(f"{path}.tmp", path)
+
+def _spool_rows(spool, ids):
+    """Spool row holding each of `ids`, or None if some passage was never spooled."""
+    if spool is None or not spool.count or not len(ids):
+        return None
+    spool_ids = np.asarray(spool.arrays()[0])
+    order = np.argsort(spool_ids, kind="stable")
+    positions = np.searchsorted(spool_ids[order], ids)
+    positions = np.minimum(positions, len(order) - 1)
+    if not np.array_equal(spool_ids[order[positions]], ids):
+        return None
+    return order[positions]
+
+def read_manifest(path):
+    manifest_file = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class PassageTable:
+    """Passage metadata in a memory-mapped Arrow file, looked up by passage ID.
+
+    Nothing is deserialized up front: columns are views into the mapped file
+    and rows become dicts only when `get` / `get_many` ask for them. Rows are
+    sorted by passage ID, so lookups are a binary search.
+    """
+
+    def __init__(self, path):
+        self.table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        self.ids = self.table.column("passage_id").to_numpy()
+        self._case_ids = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, passage_id):
+        return self._rows([passage_id])[0] >= 0
+
+    def _rows(self, passage_ids):
+        passage_ids = np.asarray(passage_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, passage_ids), max(len(self.ids) - 1, 0))
+        found = (self.ids[rows] == passage_ids) if len(self.ids) else np.zeros(len(passage_ids), dtype=bool)
+        return np.where(found, rows, -1)
+
+    def get_many(self, passage_ids):
+        """Chunk dict (or None) for each ID, with one Arrow take for the whole list."""
+        rows = self._rows(passage_ids)
+        hits = rows[rows >= 0]
+        taken = iter(self.table.select(PASSAGE_FIELDS).take(pa.array(hits)).to_pylist())
+        return [next(taken) if row >= 0 else None for row in rows]
+
+    def case_ids(self, passage_ids):
+        """case_id (or None) for each ID, from a NumPy copy of that one column made on first use."""
+        if self._case_ids is None:
+            self._case_ids = self.table.column("case_id").to_numpy(zero_copy_only=False)
+        rows = self._rows(passage_ids)
+        return [self._case_ids[row] if row >= 0 else None for row in rows.tolist()]
+
+    def get(self, passage_id, default=None):
+        chunk = self.get_many([passage_id])[0]
+        return default if chunk is None else chunk
+
+    def column(self, name):
+        return self.table.column(name).combine_chunks()
+
+class CaseTable(Mapping):
+    """case_id -> {"hash", "ids"} view of a PassageTable, grouped on first access."""
+
+    def __init__(self, passages):
+        self.passages = passages
+        self._cases = None
+
+    def _grouped(self):
+        if self._cases is None:
+            cases = {}
+            table = self.passages.table
+            for case_id, case_hash, passage_id in zip(
+                    table.column("case_id").to_pylist(), table.column("case_hash").to_pylist(), self.passages.ids.tolist()):
+                cases.setdefault(case_id, {"hash": case_hash, "ids": []})["ids"].append(passage_id)
+            self._cases = cases
+        return self._cases
+
+    def __getitem__(self, case_id):
+        return self._grouped()[case_id]
+
+    def __iter__(self):
+        return iter(self._grouped())
+
+    def __len__(self):
+        return len(self._grouped())
+
+class EmbeddingStore:
+    """Memory-mapped passage embeddings (one dtype variant) with their lazy passage table.
+
+    Opening maps the files and reads the manifest, nothing more, so it takes
+    milliseconds and every process on the host shares the same page cache.
+    An appended store may also hold rows of replaced or deleted passages:
+    `len()`, `live_rows` and `search` only see the passages in the table.
+    """
+
+    def __init__(self, path, dtype="float32"):
+        self.path = path
+        self.manifest = read_manifest(path)
+        if self.manifest is None:
+            raise FileNotFoundError(f"❌ No embedding store in {path}")
+        self.dtype = dtype
+        # Files can run past the manifest while an append is being saved
+        count = self.manifest["count"]
+        self.ids = np.load(os.path.join(path, IDS_FILE), mmap_mode="r")[:count]
+        self.passages = PassageTable(os.path.join(path, PASSAGES_FILE))
+        self.vectors = None
+        self.scale = None
+        self._live = None
+        if dtype in self.manifest["dtypes"]:
+            self.vectors = np.load(os.path.join(path, embeddings_file(dtype)), mmap_mode="r")[:count]
+            if dtype == "int8":
+                self.scale = np.load(os.path.join(path, "embeddings.int8.scale.npy"))
+
+    def __len__(self):
+        return len(self.passages)
+
+    def live_positions(self):
+        """Row of each passage in the table, in ID order."""
+        if self._live is None:
+            if len(self.passages) == len(self.ids):
+                self._live = np.arange(len(self.ids))
+            else:
+                self._live = np.searchsorted(self.ids, self.passages.ids)
+        return self._live
+
+    def live_rows(self, chunk_rows=CHUNK_ROWS):
+        """(passage ids, float32 vectors) of every live row, `chunk_rows` at a time."""
+        positions = self.live_positions()
+        dense = len(positions) == len(self.ids)
+        for start in range(0, len(positions), chunk_rows):
+            stop = min(start + chunk_rows, len(positions))
+            if dense:
+                yield np.asarray(self.ids[start:stop]), self.rows(start, stop)
+            else:
+                rows = positions[start:stop]
+                chunk = np.asarray(self.vectors[rows], dtype=np.float32)
+                yield np.asarray(self.ids[rows]), chunk * self.scale if self.scale is not None else chunk
+
+    @property
+    def has_embeddings(self):
+        return self.vectors is not None
+
+    def metadata(self):
+        """Read-only stand-in for the pickled index metadata, for search_cases and friends."""
+        return {
+            "passages": self.passages,
+            "cases": CaseTable(self.passages),
+            "next_id": self.manifest["next_id"],
+            "index_kind": self.manifest["index_kind"],
+            "index_dtype": self.manifest.get("index_dtype", "float32"),
+            "tombstones": 0,
+        }
+
+    def rows(self, start, stop):
+        """float32 copy of rows [start, stop), dequantized if needed."""
+        chunk = np.asarray(self.vectors[start:stop], dtype=np.float32)
+        return chunk * self.scale if self.scale is not None else chunk
+
+    def search(self, queries, k=10, chunk_rows=CHUNK_ROWS):
+        """Exact L2 search over the stored matrix: (distances, passage ids), like faiss's index.search."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        best_d = np.full((len(queries), k), np.inf, dtype=np.float32)
+        best_i = np.full((len(queries), k), -1, dtype=np.int64)
+        query_norms = (queries ** 2).sum(axis=1, keepdims=True)
+        dead = None
+        if len(self) != len(self.ids):
+            dead = np.ones(len(self.ids), dtype=bool)
+            dead[self.live_positions()] = False
+        for start in range(0, len(self.ids), chunk_rows):
+            chunk = self.rows(start, min(start + chunk_rows, len(self.ids)))
+            distances = query_norms - 2 * queries @ chunk.T + (chunk ** 2).sum(axis=1)
+            if dead is not None:
+                distances[:, dead[start:start + len(chunk)]] = np.inf
+            d = np.concatenate([best_d, distances], axis=1)
+            i = np.concatenate([best_i, np.broadcast_to(self.ids[start:start + len(chunk)], distances.shape)], axis=1)
+            top = np.argpartition(d, k - 1, axis=1)[:, :k]
+            best_d, best_i = np.take_along_axis(d, top, axis=1), np.take_along_axis(i, top, axis=1)
+        order = np.argsort(best_d, axis=1)
+        return np.maximum(np.take_along_axis(best_d, order, axis=1), 0), np.take_along_axis(best_i, order, axis=1)
@@ -1,65 +1,600 @@
 import json
+import re
+import time
+import hashlib
+import argparse
+import numpy as np
 from dotenv import load_dotenv
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
 import faiss
 import pickle
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.io_helpers import save_json
-from utils.io_helpers import save_json
+from utils.io_helpers import save_json, iter_cases, existing_path, batched
+from llm.embedding_store import STORE_DIR, EmbeddingSpool, EmbeddingStore, read_manifest, write_store, append_store
 
 load_dotenv()
 
-INPUT_PATH = "data/processed/cases.json"
+INPUT_PATH = "data/processed/cases.jsonl"
+LEGACY_INPUT_PATH = "data/processed/cases.json"
 INDEX_PATH = "data/embeddings/faiss_index"
 MODEL_NAME = "all-MiniLM-L6-v2"  # Fast + compact
 EMBED_FIELD = "full_text"  # Can switch to "summary" later
+# all-MiniLM-L6-v2 truncates at 256 word pieces; ~180 words keeps each passage under that
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 40
+BATCH_SIZE = 64
+
+# Index layout: "flat" (exact), "ivf_flat", "ivf_pq" (trained) or "hnsw" (graph, no true deletes)
+INDEX_KIND = os.getenv("INDEX_KIND", "flat")
+INDEX_KINDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# How the index stores vectors: "float32", or scalar-quantized "float16" / "int8" (1/2 and 1/4 of the memory).
+# IVF-PQ codes are already compressed and ignore it.
+INDEX_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+INDEX_DTYPES = ("float32", "float16", "int8")
+SQ_CODES = {"float16": "SQfp16", "int8": "SQ8"}
+IVF_NLIST = None  # None = about 4 * sqrt(passages)
+IVF_NPROBE = 16
+PQ_M = 48  # Sub-quantizers; must divide the embedding dimension (384)
+PQ_BITS = 8
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+TRAIN_SAMPLE_MAX = 50_000  # Vectors used to train IVF/PQ quantizers
+IVF_REGROW = 2  # Retrain IVF once the passages call for this many times the lists it has
+STREAM_BATCH_CASES = 256  # Cases chunked and embedded together while streaming the input
+
+WORD_RE = re.compile(r"\S+")
 
 def load_cases():
-    with open(INPUT_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Stream labeled cases (the JSONL from label_cases.py, else the older JSON list)."""
+    return iter_cases(existing_path(INPUT_PATH, LEGACY_INPUT_PATH))
+
+def load_embedder():
+    # Imported lazily: torch + sentence-transformers take seconds to load
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Yield (start, end) character offsets of overlapping word windows covering `text`."""
+    spans = [m.span() for m in WORD_RE.finditer(text)]
+    if not spans:
+        return
+    step = chunk_words - overlap
+    for i in range(0, max(len(spans) - overlap, 1), step):
+        window = spans[i:i + chunk_words]
+        yield window[0][0], window[-1][1]
 
-def build_index(cases, embed_model):
+def case_date(case):
+    """YYYY-MM-DD a case is filtered on: its date_filed, else the day CourtListener added the opinion."""
+    return case.get("date_filed") or (case.get("date_created") or "")[:10] or None
+
+def chunk_cases(cases):
+    """Split every case into passages; returns (passage texts, per-passage metadata)."""
     texts = []
     metadata = []
 
-    for case in tqdm(cases, desc="📚 Encoding cases"):
+    for case in cases:
         text = case.get(EMBED_FIELD)
         if not text:
             continue
-        texts.append(text)
-        metadata.append({
-            "case_id": case["case_id"],
-            "case_name": case["case_name"],
-            "source_url": case.get("source_url", "")
-        })
-
-    embeddings = embed_model.encode(texts, show_progress_bar=True)
-    dim = embeddings[0].shape[0]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
+        for chunk_id, (start, end) in enumerate(chunk_text(text)):
+            texts.append(text[start:end])
+            metadata.append({
+                "case_id": case["case_id"],
+                "case_name": case["case_name"],
+                "source_url": case.get("source_url", ""),
+                "jurisdiction": case.get("jurisdiction", ""),
+                "date_filed": case_date(case),
+                "chunk_id": chunk_id,
+                "start": start,
+                "end": end
+            })
+
+    return texts, metadata
+
+def encode_passages(texts, embed_model, batch_size=BATCH_SIZE):
+    """Embed passages in length-sorted batches so each batch pads to similar lengths.
+
+    Returns float32 embeddings in the original order.
+    """
+    dim = embed_model.get_sentence_embedding_dimension()
+    embeddings = np.empty((len(texts), dim), dtype="float32")
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+    start_time = time.perf_counter()
+    for start in tqdm(range(0, len(order), batch_size), desc="📚 Encoding passages", leave=False):
+        batch = order[start:start + batch_size]
+        embeddings[batch] = embed_model.encode(
+            [texts[i] for i in batch], batch_size=batch_size, convert_to_numpy=True
+        )
+    elapsed = time.perf_counter() - start_time
+
+    if texts:
+        print(f"⏱️ Encoded {len(texts)} passages in {elapsed:.1f}s "
+              f"({elapsed / len(texts) * 1000:.2f}s per 1k passages)")
+    return embeddings
+
+def ivf_nlist(n_vectors, n_train=None, nlist=IVF_NLIST):
+    """IVF lists for `n_vectors` passages: IVF_NLIST (or about 4 * sqrt(n)), capped by the `n_train` training vectors."""
+    nlist = nlist or int(4 * np.sqrt(n_vectors))
+    # k-means wants ~39 training points per centroid
+    return max(1, min(nlist, (n_vectors if n_train is None else n_train) // 39))
+
+def index_description(kind, n_vectors, dim, nlist=IVF_NLIST, dtype="float32", n_train=None):
+    """faiss.index_factory string for `kind` storing `dtype` vectors, sized for `n_vectors` passages.
+
+    `n_train` (default: all of them) is how many vectors the quantizers are trained on.
+    """
+    if dtype not in INDEX_DTYPES:
+        raise ValueError(f"❌ Unknown embedding dtype: {dtype} (choose from {', '.join(INDEX_DTYPES)})")
+    codes = SQ_CODES.get(dtype)
+    if kind == "flat":
+        return f"IDMap2,{codes or 'Flat'}"
+    if kind == "hnsw":
+        return f"IDMap2,HNSW{HNSW_M}" + (f"_{codes}" if codes else "")
+    if kind not in ("ivf_flat", "ivf_pq"):
+        raise ValueError(f"❌ Unknown index kind: {kind} (choose from {', '.join(INDEX_KINDS)})")
+
+    nlist = ivf_nlist(n_vectors, n_train, nlist)
+    if kind == "ivf_flat":
+        return f"IVF{nlist},{codes or 'Flat'}"
+    return f"IVF{nlist},PQ{PQ_M}x{PQ_BITS}"
+
+def needs_training(kind, dtype):
+    # SQ8 learns each dimension's range; fp16 and plain float storage don't
+    return kind in ("ivf_flat", "ivf_pq") or dtype == "int8"
+
+def built_layout(kind, dtype, n_vectors, dim=None):
+    """(kind, dtype) make_index actually builds from `n_vectors` training vectors of `dim`.
+
+    With nothing to train on, trained layouts fall back to flat float32; with too few
+    vectors for the PQ codebooks (or a dim PQ_M doesn't divide), IVF-PQ falls back to IVF-Flat.
+    """
+    if n_vectors == 0 and needs_training(kind, dtype):
+        return "flat", "float32"
+    if kind == "ivf_pq" and ((dim or 0) % PQ_M or n_vectors < 2 ** PQ_BITS * 39):
+        return "ivf_flat", dtype
+    return kind, dtype
+
+def ivf_outgrown(index, n_vectors, regrow=IVF_REGROW):
+    """True once `n_vectors` passages call for `regrow` times the IVF lists `index` was trained with."""
+    ivf = faiss.try_extract_index_ivf(index)
+    return ivf is not None and ivf_nlist(n_vectors, min(n_vectors, TRAIN_SAMPLE_MAX)) >= regrow * ivf.nlist
+
+def make_index(kind, train_vectors, dtype=INDEX_DTYPE, n_vectors=None):
+    """Create an empty index of `kind` storing `dtype` vectors, training it on `train_vectors` when needed.
+
+    IVF lists are sized for `n_vectors` passages (default: the training vectors).
+    A layout the training vectors can't support is built as built_layout's fallback
+    instead, and recorded as such, so a later run rebuilds it once there are enough passages.
+    """
+    n_train, dim = train_vectors.shape
+    built = built_layout(kind, dtype, n_train, dim)
+    if built != (kind, dtype):
+        print(f"⚠️ {n_train} passages of dim {dim} can't train {kind}/{dtype} — building {built[0]}/{built[1]} instead.")
+        kind, dtype = built
+    description = index_description(kind, max(n_vectors or 0, n_train), dim, dtype=dtype,
+                                    n_train=min(n_train, TRAIN_SAMPLE_MAX))
+    index = faiss.index_factory(dim, description, faiss.METRIC_L2)
+    if not index.is_trained:
+        if n_train > TRAIN_SAMPLE_MAX:
+            sample = np.random.default_rng(0).choice(n_train, TRAIN_SAMPLE_MAX, replace=False)
+            train_vectors = train_vectors[np.sort(sample)]
+        start_time = time.perf_counter()
+        index.train(train_vectors)
+        print(f"🏋️ Trained {description} on {len(train_vectors)} vectors in {time.perf_counter() - start_time:.1f}s")
+    tune_index(index)
+    return index
+
+def tune_index(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Apply search-time knobs (nprobe / efSearch) to whichever layout `index` uses."""
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    elif "HNSW" in type(faiss.downcast_index(getattr(index, "index", index))).__name__:
+        params.set_index_parameter(index, "efSearch", ef_search)
+
+def empty_metadata(kind=INDEX_KIND, dtype=INDEX_DTYPE):
+    # passages: passage ID -> chunk metadata; cases: case_id -> content hash + its passage IDs
+    return {"passages": {}, "cases": {}, "next_id": 0, "index_kind": kind, "index_dtype": dtype, "tombstones": 0}
+
+def case_hash(case):
+    """Changes whenever anything that ends up in the index for this case changes."""
+    payload = json.dumps([
+        MODEL_NAME, CHUNK_WORDS, CHUNK_OVERLAP,
+        case.get(EMBED_FIELD), case.get("case_name"), case.get("source_url"),
+        case.get("jurisdiction"), case_date(case)
+    ], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def diff_cases(metadata, cases):
+    """Split `cases` into ones that need (re-)embedding and indexed case_ids that lost their text."""
+    changed = {}
+    emptied = []
+    for case in cases:
+        case_id = case["case_id"]
+        if not case.get(EMBED_FIELD):
+            if case_id in metadata["cases"]:
+                emptied.append(case_id)
+            continue
+        entry = metadata["cases"].get(case_id)
+        if entry is None or entry["hash"] != case_hash(case):
+            changed[case_id] = case
+    return list(changed.values()), emptied
+
+def delete_cases(index, metadata, case_ids):
+    """Drop every passage of the given cases; returns how many passages were removed.
+
+    HNSW graphs can't delete vectors, so their passages are only forgotten in the
+    metadata (search skips them) until the next --rebuild.
+    """
+    ids = []
+    for case_id in case_ids:
+        entry = metadata["cases"].pop(case_id, None)
+        if entry is None:
+            continue
+        ids.extend(entry["ids"])
+        for passage_id in entry["ids"]:
+            metadata["passages"].pop(passage_id, None)
+    if ids:
+        try:
+            index.remove_ids(np.array(ids, dtype="int64"))
+        except RuntimeError:
+            metadata["tombstones"] = metadata.get("tombstones", 0) + len(ids)
+    return len(ids)
+
+def add_passages(index, metadata, cases, chunks, embeddings, spool=None):
+    first_id = metadata["next_id"]
+    ids = np.arange(first_id, first_id + len(chunks), dtype="int64")
+    index.add_with_ids(embeddings, ids)
+    if spool is not None:
+        spool.append(ids, embeddings)
+
+    hashes = {case["case_id"]: case_hash(case) for case in cases}
+    for passage_id, chunk in zip(ids.tolist(), chunks):
+        metadata["passages"][passage_id] = chunk
+        entry = metadata["cases"].setdefault(chunk["case_id"], {"hash": hashes[chunk["case_id"]], "ids": []})
+        entry["ids"].append(passage_id)
+    metadata["next_id"] = first_id + len(chunks)
+
+def upsert_cases(index, metadata, cases, embed_model, spool=None):
+    """Embed only `cases`, replacing any passages previously indexed for them."""
+    delete_cases(index, metadata, [case["case_id"] for case in cases])
+    texts, chunks = chunk_cases(cases)
+    if not texts:
+        return 0
+
+    add_passages(index, metadata, cases, chunks, encode_passages(texts, embed_model), spool)
+    return len(texts)
+
+def build_index(cases, embed_model, kind=INDEX_KIND, batch_cases=STREAM_BATCH_CASES, spool=None, dtype=INDEX_DTYPE):
+    """Chunk and embed any iterable of cases `batch_cases` at a time into a new index.
+
+    Trained layouts (IVF, int8) hold embeddings back until TRAIN_SAMPLE_MAX vectors are
+    buffered (or the input ends), train on them, then add everything else as it comes.
+    Embeddings also go to `spool`, if given, for the embedding store.
+    """
+    trained = needs_training(kind, dtype)
+    index = None
+    metadata = empty_metadata(kind, dtype)
+    pending = []
+    buffered = 0
+
+    for batch in tqdm(batched(cases, batch_cases), desc="📚 Indexing case batches"):
+        texts, chunks = chunk_cases(batch)
+        if not texts:
+            continue
+        embeddings = encode_passages(texts, embed_model)
+        if index is not None:
+            add_passages(index, metadata, batch, chunks, embeddings, spool)
+            continue
+        pending.append((batch, chunks, embeddings))
+        buffered += len(embeddings)
+        if not trained or buffered >= TRAIN_SAMPLE_MAX:
+            train_vectors = np.vstack([p[2] for p in pending])
+            index = make_index(kind, train_vectors, dtype)
+            metadata["index_kind"], metadata["index_dtype"] = built_layout(kind, dtype, *train_vectors.shape)
+            for args in pending:
+                add_passages(index, metadata, *args, spool)
+            pending = []
 
+    if index is None:
+        if pending:
+            train_vectors = np.vstack([p[2] for p in pending])
+        else:
+            train_vectors = np.empty((0, embed_model.get_sentence_embedding_dimension()), dtype="float32")
+        index = make_index(kind, train_vectors, dtype)
+        metadata["index_kind"], metadata["index_dtype"] = built_layout(kind, dtype, *train_vectors.shape)
+        for args in pending:
+            add_passages(index, metadata, *args, spool)
     return index, metadata
 
-def save_index(index, metadata):
-    os.makedirs(INDEX_PATH, exist_ok=True)
-    faiss.write_index(index, os.path.join(INDEX_PATH, "index.faiss"))
-    with open(os.path.join(INDEX_PATH, "index.pkl"), "wb") as f:
+def index_from_store(store, kind=INDEX_KIND, chunk_rows=STREAM_BATCH_CASES * 64, dtype=INDEX_DTYPE):
+    """New index of `kind` / `dtype` over the stored float32 embeddings, with their passage IDs: no re-encoding."""
+    sample = store.live_positions()
+    if len(sample) > TRAIN_SAMPLE_MAX:
+        sample = np.sort(np.random.default_rng(0).choice(sample, TRAIN_SAMPLE_MAX, replace=False))
+    index = make_index(kind, np.asarray(store.vectors[sample], dtype="float32"), dtype, n_vectors=len(store))
+    for ids, vectors in store.live_rows(chunk_rows):
+        index.add_with_ids(vectors, ids)
+    return index
+
+def search_cases(index, metadata, query_embedding, k=5, passages_per_case=3):
+    """Search passages and fold the hits into the top-k cases, best passage first."""
+    query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+    # Several passages of one opinion can crowd the top hits, so over-fetch before grouping
+    distances, ids = index.search(query, min(index.ntotal, k * passages_per_case * 4))
+    return group_hits(metadata, distances[0], ids[0], k, passages_per_case)
+
+def group_hits(metadata, distances, ids, k=5, passages_per_case=3):
+    """Fold one query's passage hits (best first) into at most k cases."""
+    return group_hits_batch(metadata, np.atleast_2d(distances), np.atleast_2d(ids), [k], passages_per_case)[0]
+
+def group_hits_batch(metadata, distances, ids, ks, passages_per_case=3):
+    """group_hits for every row of a batched search, looking the passages up once for all rows."""
+    passages = metadata["passages"]
+    flat_ids = np.asarray(ids).ravel()
+    width = ids.shape[1]
+    if isinstance(passages, dict):
+        chunks = [passages.get(int(passage_id)) for passage_id in flat_ids]
+        case_ids = [chunk["case_id"] if chunk is not None else None for chunk in chunks]
+    else:
+        # Store-backed: group on the case_id column, then build rows only for the passages kept
+        chunks, case_ids = None, passages.case_ids(flat_ids)
+
+    kept_rows = [
+        _keep_hits(case_ids[row * width:(row + 1) * width], k, passages_per_case, row * width)
+        for row, k in enumerate(ks)
+    ]
+    if chunks is None:
+        wanted = [position for kept in kept_rows for positions in kept.values() for position in positions]
+        chunks = [None] * len(flat_ids)
+        for position, chunk in zip(wanted, passages.get_many(flat_ids[wanted])):
+            chunks[position] = chunk
+
+    flat_distances = np.asarray(distances).ravel()
+    return [
+        [
+            {
+                "case_id": chunks[positions[0]]["case_id"],
+                "case_name": chunks[positions[0]]["case_name"],
+                "source_url": chunks[positions[0]]["source_url"],
+                "jurisdiction": chunks[positions[0]].get("jurisdiction"),
+                "date_filed": chunks[positions[0]].get("date_filed"),
+                "distance": float(flat_distances[positions[0]]),
+                "passages": [
+                    {"start": chunks[p]["start"], "end": chunks[p]["end"], "distance": float(flat_distances[p])}
+                    for p in positions
+                ]
+            }
+            for positions in kept.values()
+        ]
+        for kept in kept_rows
+    ]
+
+def _keep_hits(case_ids, k, passages_per_case, offset=0):
+    """case_id -> positions (offset into the flattened batch) of its best passages, for the first k cases."""
+    kept = {}
+    for position, case_id in enumerate(case_ids, offset):
+        if case_id is None:
+            continue
+        positions = kept.get(case_id)
+        if positions is None:
+            if len(kept) >= k:
+                continue
+            positions = kept[case_id] = []
+        if len(positions) < passages_per_case:
+            positions.append(position)
+    return kept
+
+def search_params(index, selector=None):
+    """SearchParameters restricting a search to `selector`'s IDs, keeping the index's own nprobe / efSearch."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    inner = faiss.downcast_index(getattr(index, "index", index))
+    if "HNSW" in type(inner).__name__:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def search_case_passages(index, metadata, case_id, query_embedding, k=5):
+    """Top-k passages of one case for the query, as (start, end, distance) sorted by distance."""
+    entry = metadata["cases"].get(case_id)
+    if entry is None:
+        return []
+    ids = np.array(entry["ids"], dtype="int64")
+    selector = faiss.IDSelectorBatch(ids)
+
+    # Only this case's passages are scored, so search every IVF list / widen the HNSW beam
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nlist)
+    elif metadata.get("index_kind") == "hnsw":
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(HNSW_EF_SEARCH, 4 * len(ids)))
+    else:
+        params = faiss.SearchParameters(sel=selector)
+
+    query = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+    distances, found = index.search(query, min(k, len(ids)), params=params)
+
+    passages = []
+    for distance, passage_id in zip(distances[0], found[0]):
+        chunk = metadata["passages"].get(int(passage_id))
+        if chunk is not None:
+            passages.append((chunk["start"], chunk["end"], float(distance)))
+    return passages
+
+def save_index(index, metadata, path=None, spool=None, store=None):
+    """Write the index, its pickled build metadata and the columnar store read by open_index.
+
+    `store` is the store the index was loaded with: the spool then only holds
+    passages added since, which are appended to it. If it has to be rewritten
+    instead (see append_store), its live rows are copied over first.
+    """
+    path = path or INDEX_PATH
+    os.makedirs(path, exist_ok=True)
+    # Never rewrite a file in place: a serving process may have it memory-mapped, and
+    # truncating mapped pages kills it with SIGBUS. Replacing the name leaves its inode intact.
+    index_file = os.path.join(path, "index.faiss")
+    faiss.write_index(index, f"{index_file}.tmp")
+    os.replace(f"{index_file}.tmp", index_file)
+    meta_file = os.path.join(path, "index.pkl")
+    with open(f"{meta_file}.tmp", "wb") as f:
         pickle.dump(metadata, f)
+    os.replace(f"{meta_file}.tmp", meta_file)
+    # The store names the exact index file it was written for, so open_index can tell a torn save apart
+    store_path = os.path.join(path, STORE_DIR)
+    if store is not None:
+        manifest = append_store(store_path, metadata, spool, index.ntotal, index_file=file_stamp(index_file))
+        if manifest is not None:
+            return manifest
+        if spool is not None:
+            spool.extend_from(store)
+    return write_store(store_path, metadata, spool, index.ntotal, index_file=file_stamp(index_file))
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def store_matches(index_file, recorded):
+    """True if `index_file` still has the size and mtime the store manifest recorded for it."""
+    return bool(recorded) and {key: recorded.get(key) for key in ("size", "mtime_ns")} == file_stamp(index_file)
+
+def load_index(path=None, mmap=False):
+    """Existing (index, metadata), or None if there is none or it predates passage IDs.
+
+    With `mmap`, the index file is memory-mapped read-only instead of read into
+    memory: loading is near-instant and processes serving the same file share
+    its pages. The mapped index can't be modified.
+    """
+    path = path or INDEX_PATH
+    index_file = os.path.join(path, "index.faiss")
+    meta_file = os.path.join(path, "index.pkl")
+    if not (os.path.exists(index_file) and os.path.exists(meta_file)):
+        return None
+    with open(meta_file, "rb") as f:
+        metadata = pickle.load(f)
+    if not isinstance(metadata, dict) or "passages" not in metadata:
+        print("⚠️ Existing index uses the old whole-case layout — rebuilding.")
+        return None
+    index = read_index_file(index_file, mmap)
+    tune_index(index)
+    return index, metadata
 
-def main():
+def open_store(path=None, dtype="float32"):
+    """The embedding store saved with the index at `path`, or None."""
+    store_path = os.path.join(path or INDEX_PATH, STORE_DIR)
+    return EmbeddingStore(store_path, dtype) if read_manifest(store_path) else None
+
+def open_index(path=None):
+    """Read-only (index, metadata) for serving, or None if there is no index.
+
+    The index is memory-mapped and the metadata is the store's lazily loaded
+    passage table instead of the pickle, so opening takes milliseconds and
+    worker processes share pages. Vectors are served in whatever dtype the
+    index was built with (EMBEDDING_DTYPE). Falls back to load_index for
+    indexes saved without a store, or with one written for another index file
+    (e.g. a save interrupted between the two).
+    """
+    path = path or INDEX_PATH
+    index_file = os.path.join(path, "index.faiss")
+    manifest = read_manifest(os.path.join(path, STORE_DIR))
+    if manifest is None or not os.path.exists(index_file):
+        return load_index(path, mmap=True)
+    if not store_matches(index_file, manifest.get("index_file")):
+        print(f"⚠️ Store in {path} doesn't match the index — loading the pickled metadata instead.")
+        return load_index(path, mmap=True)
+    index = read_index_file(index_file, mmap=True)
+    tune_index(index)
+    return index, EmbeddingStore(os.path.join(path, STORE_DIR)).metadata()
+
+def read_index_file(index_file, mmap=False):
+    if mmap:
+        # MMAP_IFC also maps flat code arrays (flat / HNSW storage), not only IVF lists
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(index_file, flags)
+        except RuntimeError as e:
+            print(f"⚠️ Can't memory-map {index_file} ({e}) — reading it into memory instead.")
+    return faiss.read_index(index_file)
+
+def needs_relayout(index, metadata, kind=INDEX_KIND, dtype=INDEX_DTYPE):
+    """True when the index on disk isn't what `kind` / `dtype` builds for its passages today.
+
+    That covers a different request, a fallback layout the corpus has since grown out
+    of (e.g. IVF-Flat standing in for IVF-PQ) and IVF lists sized for a much smaller corpus.
+    """
+    n_passages = len(metadata["passages"])
+    layout = (metadata.get("index_kind", "flat"), metadata.get("index_dtype", "float32"))
+    target = built_layout(kind, dtype, min(n_passages, TRAIN_SAMPLE_MAX), index.d)
+    if layout != target:
+        print(f"⚠️ Existing index is {layout[0]}/{layout[1]}, {kind}/{dtype} now builds {target[0]}/{target[1]} — re-indexing.")
+        return True
+    if ivf_outgrown(index, n_passages):
+        print(f"⚠️ {n_passages} passages have outgrown the index's {faiss.try_extract_index_ivf(index).nlist} IVF lists — re-indexing.")
+        return True
+    return False
+
+def main(rebuild=False, prune=False, delete_ids=(), kind=INDEX_KIND, dtype=INDEX_DTYPE):
     print("🔍 Loading cases...")
     cases = load_cases()
-    model = SentenceTransformer(MODEL_NAME)
 
-    print("🔧 Building FAISS index...")
-    index, metadata = build_index(cases, model)
+    existing = None if rebuild else load_index()
+    store = None if existing is None else open_store()
+    if store is not None and (not store.has_embeddings or len(store) != len(existing[1]["passages"])):
+        store = None
+    spool = EmbeddingSpool(os.path.dirname(INDEX_PATH))
+    try:
+        if existing is not None and needs_relayout(*existing, kind, dtype):
+            if store is None:
+                existing = None
+            else:
+                # Same passages in a new layout: reuse the stored embeddings instead of re-encoding
+                print(f"🔧 Re-indexing {len(store)} stored embeddings as {kind}/{dtype}...")
+                built_kind, built_dtype = built_layout(kind, dtype, len(store), existing[0].d)
+                existing = (index_from_store(store, kind, dtype=dtype),
+                            {**existing[1], "index_kind": built_kind, "index_dtype": built_dtype, "tombstones": 0})
+        if existing is None:
+            print(f"🔧 Building {kind}/{dtype} FAISS index...")
+            index, metadata = build_index(cases, load_embedder(), kind, spool=spool, dtype=dtype)
+        else:
+            index, metadata = existing
+            embed_model = None
+            seen = set()
+            removed = upserted = 0
+            # Cases stream through in batches, so only one batch of text is ever held
+            for batch in batched(cases, STREAM_BATCH_CASES):
+                seen.update(case["case_id"] for case in batch)
+                changed, emptied = diff_cases(metadata, batch)
+                removed += delete_cases(index, metadata, emptied)
+                if changed:
+                    embed_model = embed_model or load_embedder()
+                    upsert_cases(index, metadata, changed, embed_model, spool)
+                    upserted += len(changed)
+
+            to_delete = set(delete_ids)
+            if prune:
+                to_delete |= set(metadata["cases"]) - seen
+            removed += delete_cases(index, metadata, to_delete)
+            print(f"🗑️ Removed {removed} passages, 🔁 upserted {upserted} new or changed cases")
+
+        print(f"🧩 Index holds {index.ntotal} passages from {len(metadata['cases'])} cases")
 
-    print("💾 Saving index...")
-    save_index(index, metadata)
-    print(f"✅ Saved FAISS index to {INDEX_PATH}")
+        print("💾 Saving index...")
+        manifest = save_index(index, metadata, spool=spool, store=store)
+    finally:
+        spool.discard()
+    print(f"✅ Saved FAISS index to {INDEX_PATH} "
+          f"(embedding store: {', '.join(manifest['dtypes']) or 'metadata only'})")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build or incrementally update the FAISS passage index.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-embed everything instead of upserting")
+    parser.add_argument("--prune", action="store_true", help="Delete indexed cases missing from the input")
+    parser.add_argument("--delete", type=int, nargs="+", default=[], metavar="CASE_ID", help="Case IDs to remove")
+    parser.add_argument("--index-kind", choices=INDEX_KINDS, default=INDEX_KIND, help="Index layout")
+    parser.add_argument("--dtype", choices=INDEX_DTYPES, default=INDEX_DTYPE,
+                        help="How the index stores vectors (float16 / int8 scalar quantization)")
+    args = parser.parse_args()
+    main(rebuild=args.rebuild, prune=args.prune, delete_ids=args.delete, kind=args.index_kind, dtype=args.dtype)
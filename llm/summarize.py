@@ -1,29 +1,43 @@
+import argparse
+import hashlib
 import json
-import pickle
+import threading
 from dotenv import load_dotenv
-from openai import OpenAI
 from tqdm import tqdm
-import faiss
-from sentence_transformers import SentenceTransformer
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.io_helpers import save_json
+from utils.io_helpers import append_jsonl, iter_jsonl, write_case_store, write_cases, iter_cases, existing_path
+from utils.llm_engine import make_client, make_limiter, chat_completion, estimate_tokens, map_ordered
+from utils.llm_cache import open_default_cache
+from llm import retriever
+from ml.features import FEATURE_INPUT_SCHEMA
 
 load_dotenv()
 
 # Paths
-INPUT_PATH = "data/processed/cases.json"
-OUTPUT_PATH = "data/processed/summaries.json"
+INPUT_PATH = "data/processed/cases.jsonl"
+LEGACY_INPUT_PATH = "data/processed/cases.json"
+OUTPUT_PATH = "data/processed/summaries.jsonl"
+STORE_PATH = "data/processed/case_store"  # Columnar copy for training/prediction (numeric columns only)
 INDEX_PATH = "data/embeddings/faiss_index"
 MODEL_NAME = "all-MiniLM-L6-v2"
+LLM_MODEL = "llama3-70b-8192"
+TEMPERATURE = 0.5
+CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", 8))
+REQUEST_TIMEOUT = float(os.getenv("SUMMARY_TIMEOUT", 60))  # Seconds per LLM request
 
-# Load embedding + LLM clients
-embedder = SentenceTransformer(MODEL_NAME)
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=os.getenv("GROQ_API_KEY")
-)
+# RAG settings: passages pulled per case and the prompt budget they share
+RAG_TOP_K = 6
+RAG_TOKEN_BUDGET = 600
+RAG_PRECEDENTS = 0
+PRECEDENT_CHARS = 400
+RAG_QUERY = "injuries, medical treatment, damages, liability and outcome of {case_name}"
+
+# LLM client; the embedder is only loaded when RAG is enabled
+client = make_client(timeout=REQUEST_TIMEOUT)
+limiter = make_limiter()
+cache = open_default_cache()
 
 SUMMARY_PROMPT = """
 You are a legal assistant. Summarize the following legal case in 3–5 sentences using simple language.
@@ -33,49 +47,228 @@ CASE:
 \"\"\"{text}\"\"\"
 """
 
+RAG_PROMPT = """
+You are a legal assistant. Summarize the following legal case in 3–5 sentences using simple language.
+Highlight the key legal issue, type of injury, and outcome if available.
+You are given the most relevant excerpts of the opinion, in document order.
+
+CASE EXCERPTS:
+\"\"\"{text}\"\"\"
+"""
+
+PRECEDENT_BLOCK = """
+SIMILAR PRECEDENTS (for context only, do not summarize them):
+{precedents}
+"""
+
 def load_faiss_index():
-    index = faiss.read_index(os.path.join(INDEX_PATH, "index.faiss"))
-    with open(os.path.join(INDEX_PATH, "index.pkl"), "rb") as f:
-        metadata = pickle.load(f)
-    return index, metadata
+    loaded = retriever.open_index(INDEX_PATH)
+    if loaded is None:
+        raise FileNotFoundError(f"❌ No passage index in {INDEX_PATH} — run llm/retriever.py first")
+    return loaded
+
+class CaseTexts:
+    """case_id -> full_text of the input cases, read from disk when asked for.
+
+    Only each case's line offset stays in memory. Compressed or legacy JSON
+    inputs can't be seeked into cheaply, so their texts are loaded up front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.texts = None
+        if not path.endswith(".jsonl"):
+            self.texts = {case.get("case_id"): case.get("full_text", "") for case in iter_cases(path)}
+            return
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    self.offsets[json.loads(line).get("case_id")] = offset
+                offset += len(line)
+
+    def get(self, case_id, default=""):
+        if self.texts is not None:
+            return self.texts.get(case_id, default)
+        offset = self.offsets.get(case_id)
+        if offset is None:
+            return default
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline()).get("full_text") or default
+
+class RagContext:
+    """Index, metadata and embedder for retrieval-augmented prompts, loaded once per run.
+
+    Precedent excerpts come from the cases in `input_path`, read only for the hits.
+    """
 
-def summarize_case(text):
-    prompt = SUMMARY_PROMPT.format(text=text[:3000])
+    def __init__(self, input_path=None, top_k=RAG_TOP_K, token_budget=RAG_TOKEN_BUDGET, precedents=RAG_PRECEDENTS):
+        self.index, self.metadata = load_faiss_index()
+        self.embedder = retriever.load_embedder()
+        self.texts = CaseTexts(input_path) if precedents else {}
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.precedents = precedents
+        self.stale = 0
+        self.lock = threading.Lock()  # build() runs on the summarization worker threads
+
+    def build(self, case):
+        """Prompt text for `case`, or None if the case isn't in the index, changed since, or has no passages."""
+        case_id = case.get("case_id")
+        indexed = self.metadata["cases"].get(case_id)
+        if indexed is None:
+            return None
+        if indexed["hash"] != retriever.case_hash(case):
+            # Passage offsets point into the text that was indexed, not this one
+            with self.lock:
+                self.stale += 1
+            return None
+
+        text = case["full_text"]
+        query = self.embedder.encode(RAG_QUERY.format(case_name=case.get("case_name") or "the case"))
+        passages = retriever.search_case_passages(self.index, self.metadata, case_id, query, self.top_k)
+        if not passages:
+            return None
+
+        # Best passages first until the budget runs out, then back into document order
+        chosen = []
+        used = 0
+        for start, end, _ in passages:
+            cost = estimate_tokens(text[start:end])
+            if chosen and used + cost > self.token_budget:
+                break
+            chosen.append((start, end))
+            used += cost
+        context = "\n...\n".join(text[start:end] for start, end in merge_spans(chosen))
+
+        if self.precedents:
+            context += self._precedent_block(case_id, query)
+        return context
+
+    def _precedent_block(self, case_id, query):
+        hits = retriever.search_cases(self.index, self.metadata, query, k=self.precedents + 1, passages_per_case=1)
+        lines = []
+        for hit in hits:
+            if hit["case_id"] == case_id or len(lines) >= self.precedents:
+                continue
+            passage = hit["passages"][0]
+            excerpt = self.texts.get(hit["case_id"], "")[passage["start"]:passage["end"]][:PRECEDENT_CHARS]
+            lines.append(f"- {hit['case_name'] or hit['case_id']}: {excerpt}")
+        return PRECEDENT_BLOCK.format(precedents="\n".join(lines)) if lines else ""
+
+def merge_spans(spans):
+    """Sort (start, end) spans and merge overlapping ones so no text is repeated."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def summarize_case(text, template=SUMMARY_PROMPT, max_chars=3000):
+    truncated = text[:max_chars]
+    prompt = template.format(text=truncated)
+    key = cache.make_key(LLM_MODEL, template, truncated, TEMPERATURE)
 
     try:
-        response = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5
+        return cache.get_or_compute(
+            key, lambda: chat_completion(client, limiter, prompt, model=LLM_MODEL, temperature=TEMPERATURE),
+            validate=lambda reply: bool(reply and reply.strip())
         )
-        return response.choices[0].message.content.strip()
 
     except Exception as e:
         print("⚠️ Summarization failed:", e)
         return ""
 
-def main():
-    print("📂 Loading cases and FAISS index...")
-    with open(INPUT_PATH, "r", encoding="utf-8") as f:
-        cases = json.load(f)
+def summarize(case, rag=None):
+    context = rag.build(case) if rag else None
+    if context is None:
+        return summarize_case(case["full_text"])
+    return summarize_case(context, RAG_PROMPT, max_chars=None)
 
-    index, _ = load_faiss_index()
+def summary_key(case, template):
+    """Changes whenever the labeled case (text, labels, metadata), the prompt or the model changes."""
+    payload = json.dumps([LLM_MODEL, TEMPERATURE, template, case], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    summaries = []
-    print(f"🧠 Summarizing {len(cases)} cases using RAG + LLaMA-3...")
-    for case in tqdm(cases):
-        text = case.get("full_text", "")
-        if not text:
-            continue
+def completed_case_ids(path, keys):
+    """case_ids whose summary in the output stream is still current, so an interrupted run can resume.
 
-        summary = summarize_case(text)
-        summaries.append({
-            **case,
-            "summary": summary
-        })
+    `keys` maps each input case_id to its summary_key. Rows of cases that were
+    relabeled, changed or dropped from the input (and duplicates) are removed
+    from the stream first, so they can't outlive the labels they came from.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    def current(done):
+        for record in iter_jsonl(path):
+            case_id = record.get("case_id")
+            if case_id not in done and case_id in keys and record.get("summary_key") == keys[case_id]:
+                done.add(case_id)
+                yield record
+
+    done = set()
+    stale = sum(1 for _ in iter_jsonl(path)) - sum(1 for _ in current(done))
+    if stale:
+        print(f"🧹 Dropping {stale} summaries of cases that changed or left the input")
+        write_cases(current(set()), path)
+    return done
+
+def main(use_rag=False, top_k=RAG_TOP_K, token_budget=RAG_TOKEN_BUDGET, precedents=RAG_PRECEDENTS,
+         concurrency=CONCURRENCY, fresh=False, write_store=True):
+    input_path = existing_path(INPUT_PATH, LEGACY_INPUT_PATH)
+    print(f"📂 Streaming cases from {input_path}...")
+
+    if fresh and os.path.exists(OUTPUT_PATH):
+        os.remove(OUTPUT_PATH)
+    template = RAG_PROMPT if use_rag else SUMMARY_PROMPT
+    keys = {case.get("case_id"): summary_key(case, template) for case in iter_cases(input_path) if case.get("full_text")}
+    done = completed_case_ids(OUTPUT_PATH, keys)
+    pending = (case for case in iter_cases(input_path) if case.get("full_text") and case.get("case_id") not in done)
+    if done:
+        print(f"⏯️ Resuming: {len(done)} cases already summarized")
+
+    rag = None
+    if use_rag:
+        print("📚 Loading FAISS index and embedder for RAG...")
+        # Precedent excerpts can come from any case, so only that option needs a pass over the input
+        rag = RagContext(input_path, top_k, token_budget, precedents)
+
+    written = failed = 0
+    mode = "RAG + LLaMA-3" if rag else "LLaMA-3"
+    print(f"🧠 Summarizing cases using {mode} ({concurrency} in flight)...")
+    # Each summary is appended as soon as it is ready (in input order); failures stay pending for the next run
+    for case, summary in tqdm(map_ordered(lambda c: summarize(c, rag), pending, concurrency)):
+        if not summary:
+            failed += 1
+            continue
+        append_jsonl([{**case, "summary": summary, "summary_key": summary_key(case, template)}], OUTPUT_PATH)
+        written += 1
 
-    save_json(summaries, OUTPUT_PATH)
-    print(f"✅ Saved {len(summaries)} summaries to {OUTPUT_PATH}")
+    print(f"✅ Appended {written} summaries to {OUTPUT_PATH}")
+    if rag is not None and rag.stale:
+        print(f"⚠️ {rag.stale} cases changed since they were indexed and were summarized without RAG")
+    if failed:
+        print(f"⚠️ {failed} cases failed and will be retried on the next run")
+    if write_store and os.path.exists(OUTPUT_PATH):
+        write_case_store(iter_jsonl(OUTPUT_PATH), STORE_PATH, schema=FEATURE_INPUT_SCHEMA)
+    print(cache.summary())
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Summarize labeled cases with an LLM.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached replies and call the LLM again")
+    parser.add_argument("--rag", action="store_true", help="Prompt with the most relevant passages from the index")
+    parser.add_argument("--top-k", type=int, default=RAG_TOP_K, help="Passages retrieved per case")
+    parser.add_argument("--token-budget", type=int, default=RAG_TOKEN_BUDGET, help="Approx. prompt tokens for passages")
+    parser.add_argument("--precedents", type=int, default=RAG_PRECEDENTS, help="Similar cases to add as context")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Requests kept in flight")
+    parser.add_argument("--fresh", action="store_true", help="Discard existing summaries and start over")
+    parser.add_argument("--no-store", action="store_true", help="Skip rebuilding the Parquet case store")
+    args = parser.parse_args()
+    cache.bypass = cache.bypass or args.no_cache
+    main(use_rag=args.rag, top_k=args.top_k, token_budget=args.token_budget, precedents=args.precedents,
+         concurrency=args.concurrency, fresh=args.fresh, write_store=not args.no_store)
@@ -1,42 +1,189 @@
 # ml/explain.py
 
 import os
+import sys
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import shap
-import joblib
 import matplotlib.pyplot as plt
-from features import load_summaries, extract_features
 
-def explain_model():
-    print("🔍 Loading model and data...")
-    model = joblib.load("ml/model/settlement_model.pkl")
-    cases = load_summaries()
-    df = extract_features(cases)
-    
-    X = df.drop("settlement_amount", axis=1)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml.features import load_features
+from ml.feature_spec import FEATURE_COLUMNS, TARGET_COLUMN, feature_fingerprint
+from ml.model_artifact import BOOSTER_PATH, PICKLE_PATH, load_model, explainable_model
+from ml.model_registry import file_hash
 
-    print("⚙️ Computing SHAP values...")
-    explainer = shap.Explainer(model)
-    shap_values = explainer(X)
+SHAP_VALUES_PATH = "data/processed/shap_values.parquet"  # One row per distinct feature vector, tagged with the model
+PLOTS_DIR = "plots"
+CHUNK_ROWS = 20_000  # Rows per TreeSHAP task
+BEESWARM_SAMPLE = 5_000  # Rows in the beeswarm, drawn across settlement quantiles; 0 = every row
+STRATA = 10
 
-    os.makedirs("plots", exist_ok=True)
+# Worker-process explainer, built once per worker
+_explainer = None
+
+def model_tag():
+    """Short hash of the model artifact explain loads; cached values from another model are discarded."""
+    return file_hash(BOOSTER_PATH if os.path.exists(BOOSTER_PATH) else PICKLE_PATH)[:16]
+
+def row_hashes(X):
+    """64-bit hash of every feature row; identical rows share SHAP values."""
+    return pd.util.hash_pandas_object(pd.DataFrame(X), index=False).to_numpy()
+
+def _load_explainer(nthread=None):
+    global _explainer
+    _explainer = shap.TreeExplainer(explainable_model(load_model()))
+    # shap computes XGBoost values with booster.predict(pred_contribs=True), which uses every core by default
+    booster = getattr(_explainer.model, "original_model", None)
+    if nthread and hasattr(booster, "set_param"):
+        booster.set_param({"nthread": nthread})
+
+def _shap_chunk(X):
+    return np.asarray(_explainer.shap_values(X), dtype=np.float32), float(np.ravel(_explainer.expected_value)[0])
+
+def compute_shap_values(X, workers=None, chunk_rows=CHUNK_ROWS):
+    """(TreeSHAP values, base value) for X, `chunk_rows` at a time across `workers` processes.
+
+    Each worker's booster gets `cpu_count // workers` threads, so the pool never oversubscribes the cores.
+    """
+    chunks = [X[start:start + chunk_rows] for start in range(0, len(X), chunk_rows)]
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(chunks)))
+    nthread = max(1, cores // workers)
+    if workers == 1:
+        _load_explainer(nthread)
+        parts = [_shap_chunk(chunk) for chunk in chunks]
+    else:
+        # Spawned, not forked: the pipeline may call this while other stages' threads hold locks
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_load_explainer, initargs=(nthread,)) as pool:
+            parts = list(pool.map(_shap_chunk, chunks))
+    return np.concatenate([values for values, _ in parts]), parts[0][1]
+
+def read_shap_cache(path, tag):
+    """(sorted row hashes, values, base value) saved for model `tag`, or None."""
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    if (metadata.get(b"model_tag") != tag.encode()
+            or metadata.get(b"feature_fingerprint") != feature_fingerprint().encode()):
+        return None
+    values = np.column_stack([table.column(f"shap_{column}").to_numpy() for column in FEATURE_COLUMNS])
+    return table.column("row_hash").to_numpy(), values, float(metadata[b"base_value"])
+
+def write_shap_cache(path, hashes, values, base_value, tag):
+    columns = {"row_hash": pa.array(hashes, type=pa.uint64())}
+    for i, column in enumerate(FEATURE_COLUMNS):
+        columns[f"shap_{column}"] = pa.array(values[:, i])
+    table = pa.table(columns).replace_schema_metadata({
+        "model_tag": tag, "feature_fingerprint": feature_fingerprint(), "base_value": repr(base_value),
+    })
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+def shap_values_for(X, path=SHAP_VALUES_PATH, workers=None, chunk_rows=CHUNK_ROWS, compute=True):
+    """(row mask, SHAP values of those rows, base value) for X, reusing the values cached at `path`.
+
+    Only distinct feature rows missing from the cache (or all, after a model
+    change) are computed, and the cache is rewritten to hold exactly the rows
+    of X. Without `compute`, rows that aren't cached are left out (mask False).
+    """
+    tag = model_tag()
+    hashes = row_hashes(X)
+    unique, first = np.unique(hashes, return_index=True)
+    values = np.zeros((len(unique), len(FEATURE_COLUMNS)), dtype=np.float32)
+    known = np.zeros(len(unique), dtype=bool)
+    base_value = None
+
+    cached = read_shap_cache(path, tag)
+    if cached is not None:
+        cached_hashes, cached_values, base_value = cached
+        positions = np.minimum(np.searchsorted(cached_hashes, unique), max(len(cached_hashes) - 1, 0))
+        known = cached_hashes[positions] == unique if len(cached_hashes) else known
+        values[known] = cached_values[positions[known]]
+
+    missing = ~known
+    print(f"⚙️ SHAP values: {known.sum()} distinct rows cached for model {tag}, {missing.sum()} to compute")
+    if missing.any() and compute:
+        values[missing], base_value = compute_shap_values(X[first[missing]], workers, chunk_rows)
+        known[:] = True
+        write_shap_cache(path, unique, values, base_value, tag)
+    elif cached is not None and len(cached[0]) != known.sum():
+        # Drop rows whose features no longer occur
+        write_shap_cache(path, unique[known], values[known], base_value, tag)
+
+    rows = known[np.searchsorted(unique, hashes)]
+    if not rows.all():
+        print(f"⚠️ {(~rows).sum()} rows have no cached SHAP values and are left out of the plots")
+    return rows, values[np.searchsorted(unique, hashes[rows])], base_value
+
+def stratified_sample(y, size, strata=STRATA, seed=0):
+    """About `size` row indices, drawn in proportion from each quantile of `y` so every range is represented."""
+    if not size or len(y) <= size:
+        return np.arange(len(y))
+    rng = np.random.default_rng(seed)
+    ranks = pd.Series(y).rank(method="first").to_numpy() - 1
+    bins = (ranks * strata // len(y)).astype(int)
+    picked = []
+    for stratum in range(strata):
+        members = np.flatnonzero(bins == stratum)
+        take = max(1, round(size * len(members) / len(y)))
+        picked.append(rng.choice(members, size=min(take, len(members)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+def plot_shap(values, base_value, X, y, sample=BEESWARM_SAMPLE, plots_dir=PLOTS_DIR):
+    """Bar plot over every row, beeswarm over a stratified sample, from precomputed SHAP values."""
+    explanation = shap.Explanation(values=values, base_values=np.full(len(values), base_value),
+                                   data=X, feature_names=list(FEATURE_COLUMNS))
+    os.makedirs(plots_dir, exist_ok=True)
 
     print("📊 Generating bar plot...")
     plt.figure()
-    shap.plots.bar(shap_values, show=False)
+    shap.plots.bar(explanation, show=False)
     plt.title("SHAP Feature Importance (Bar)")
     plt.tight_layout()
-    plt.savefig("plots/shap_bar.png")
+    plt.savefig(os.path.join(plots_dir, "shap_bar.png"))
     plt.close()
 
-    print("📊 Generating beeswarm plot...")
+    rows = stratified_sample(y, sample)
+    print(f"📊 Generating beeswarm plot ({len(rows)} of {len(values)} rows)...")
     plt.figure()
-    shap.plots.beeswarm(shap_values, show=False)
+    shap.plots.beeswarm(explanation[rows], show=False)
     plt.title("SHAP Summary (Beeswarm)")
     plt.tight_layout()
-    plt.savefig("plots/shap_beeswarm.png")
+    plt.savefig(os.path.join(plots_dir, "shap_beeswarm.png"))
     plt.close()
 
-    print("✅ SHAP plots saved to /plots")
+    print(f"✅ SHAP plots saved to /{plots_dir}")
+
+def explain_model(features_path=None, workers=None, sample=BEESWARM_SAMPLE, values_path=SHAP_VALUES_PATH,
+                  chunk_rows=CHUNK_ROWS, compute=True):
+    print("🔍 Loading data...")
+    df = load_features(features_path)
+    X = df[list(FEATURE_COLUMNS)].to_numpy(dtype=np.float32)
+    y = df[TARGET_COLUMN].to_numpy()
+
+    rows, values, base_value = shap_values_for(X, values_path, workers, chunk_rows, compute)
+    if not rows.any():
+        raise RuntimeError(f"❌ No SHAP values cached in {values_path} for the current model — run without --plots-only")
+    plot_shap(values, base_value, X[rows], y[rows], sample)
 
 if __name__ == "__main__":
-    explain_model()
+    parser = argparse.ArgumentParser(description="Compute (incrementally) and plot SHAP values for the model.")
+    parser.add_argument("--features", help="Feature Parquet from ml.features.save_features (default: extract from summaries)")
+    parser.add_argument("--workers", type=int, help="TreeSHAP processes (default: one per core)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows per TreeSHAP task")
+    parser.add_argument("--sample", type=int, default=BEESWARM_SAMPLE,
+                        help="Rows in the beeswarm, stratified by settlement amount (0 = all)")
+    parser.add_argument("--plots-only", action="store_true", help="Plot from cached values without computing any")
+    args = parser.parse_args()
+    explain_model(features_path=args.features, workers=args.workers, sample=args.sample,
+                  chunk_rows=args.chunk_rows, compute=not args.plots_only)
@@ -0,0 +1,181 @@
+# ml/feature_spec.py
+
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Bump whenever a feature's meaning changes; the fingerprint saved next to the model changes with it
+FEATURE_SPEC_VERSION = 1
+
+FEATURE_COLUMNS = (
+    "num_injuries",
+    "has_severe_injury",
+    "medical_bills",
+    "lost_wages",
+    "age",
+    "is_male",
+)
+TARGET_COLUMN = "settlement_amount"
+INPUT_FIELDS = ("injuries", "medical_bills", "lost_wages", "age", "gender")
+# Compact dtypes for large corpora; XGBoost works in float32 internally, so nothing is lost
+FEATURE_DTYPES = {
+    "num_injuries": "int32",  # A bare injuries string counts its characters, which can run past int16
+    "has_severe_injury": "int8",
+    "medical_bills": "float32",
+    "lost_wages": "float32",
+    "age": "int16",
+    "is_male": "int8",
+}
+TARGET_DTYPE = "float32"
+SEVERE_INJURY_WORDS = ("brain", "spinal", "burn")
+_SEVERE_PATTERN = "|".join(SEVERE_INJURY_WORDS)
+
+def feature_fingerprint():
+    """Short hash of everything that defines the feature schema."""
+    spec = {
+        "version": FEATURE_SPEC_VERSION,
+        "columns": FEATURE_COLUMNS,
+        "severe_injury_words": SEVERE_INJURY_WORDS,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def row_features(case):
+    """Feature tuple for one case dict, in FEATURE_COLUMNS order.
+
+    Plain Python on purpose: no pandas, no intermediate dicts, a few
+    microseconds per call for the single-request path.
+    """
+    injuries = case.get("injuries")
+    if injuries is None:
+        injuries = []
+    medical_bills = case.get("medical_bills")
+    lost_wages = case.get("lost_wages")
+    age = case.get("age")
+    gender = case.get("gender") or "Unknown"
+    severe_text = str(injuries).lower()
+
+    return (
+        len(injuries),
+        1 if any(word in severe_text for word in SEVERE_INJURY_WORDS) else 0,
+        float(medical_bills) if medical_bills is not None else 0.0,
+        float(lost_wages) if lost_wages is not None else 0.0,
+        int(age) if age else 0,
+        1 if gender.lower() == "male" else 0,
+    )
+
+def row_matrix(cases):
+    """float32 matrix for a modest list of case dicts (API requests)."""
+    X = np.empty((len(cases), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for i, case in enumerate(cases):
+        X[i] = row_features(case)
+    return X
+
+def frame_features(cases, include_target=False):
+    """Vectorized DataFrame of FEATURE_COLUMNS (plus the target) for training and batch scoring.
+
+    `cases` is a list of case dicts or a pyarrow Table holding the input fields.
+    Each field is pulled into one Arrow/NumPy array and every feature is computed
+    column-wise; values pyarrow can't type (e.g. numbers stored as strings) take
+    a slower path with the same semantics as row_features.
+    """
+    fields = INPUT_FIELDS + ((TARGET_COLUMN,) if include_target else ())
+    if isinstance(cases, pa.Table):
+        n = cases.num_rows
+        columns = {
+            field: cases.column(field).combine_chunks() if field in cases.column_names else pa.nulls(n)
+            for field in fields
+        }
+    else:
+        n = len(cases)
+        columns = {field: [case.get(field) for case in cases] for field in fields}
+
+    num_injuries, has_severe_injury = _injury_features(columns["injuries"], n)
+    df = pd.DataFrame({
+        "num_injuries": num_injuries,
+        "has_severe_injury": has_severe_injury,
+        "medical_bills": _numeric(columns["medical_bills"]),
+        "lost_wages": _numeric(columns["lost_wages"]),
+        "age": np.trunc(_numeric(columns["age"])),
+        "is_male": _is_male(columns["gender"], n),
+    }, columns=list(FEATURE_COLUMNS)).astype(FEATURE_DTYPES)
+
+    if include_target:
+        df[TARGET_COLUMN] = _numeric(columns[TARGET_COLUMN]).astype(TARGET_DTYPE)
+    return df
+
+def _to_arrow(values):
+    if isinstance(values, pa.Array):
+        return values
+    try:
+        return pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        return None
+
+def _numeric(values):
+    """float64 array with missing values as 0, like float(x) if x is not None else 0."""
+    arr = _to_arrow(values)
+    if arr is not None and (pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type)
+                            or pa.types.is_boolean(arr.type) or pa.types.is_null(arr.type)):
+        out = arr.cast(pa.float64()).to_numpy(zero_copy_only=False)
+    else:
+        raw = arr.to_pylist() if arr is not None else values
+        out = pd.to_numeric(pd.Series(raw, dtype=object)).to_numpy(dtype=np.float64)
+    return np.nan_to_num(out, nan=0.0)
+
+def _is_male(values, n):
+    arr = _to_arrow(values)
+    if arr is not None and pa.types.is_null(arr.type):
+        return np.zeros(n, dtype=np.int8)
+    if arr is not None and pa.types.is_string(arr.type):
+        return pc.equal(pc.utf8_lower(pc.fill_null(arr, "unknown")), "male").to_numpy(zero_copy_only=False)
+    raw = arr.to_pylist() if arr is not None else values
+    return np.array([1 if str(g or "Unknown").lower() == "male" else 0 for g in raw], dtype=np.int8)
+
+def _injury_features(values, n):
+    """(num_injuries, has_severe_injury) arrays, computed on the flattened injury strings."""
+    arr = _to_arrow(values)
+    if arr is not None and pa.types.is_null(arr.type):
+        return np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int8)
+
+    if arr is not None and pa.types.is_list(arr.type) and (
+            pa.types.is_string(arr.type.value_type) or pa.types.is_null(arr.type.value_type)):
+        lengths = pc.fill_null(pc.list_value_length(arr), 0).to_numpy(zero_copy_only=False)
+        severe = np.zeros(n, dtype=np.int8)
+        flat = pc.list_flatten(arr)
+        if len(flat) and pa.types.is_string(flat.type):
+            hits = pc.fill_null(pc.match_substring_regex(pc.utf8_lower(flat), _SEVERE_PATTERN), False)
+            parents = pc.list_parent_indices(arr).to_numpy(zero_copy_only=False)
+            severe[parents[hits.to_numpy(zero_copy_only=False)]] = 1
+        return lengths, severe
+
+    if arr is not None and pa.types.is_string(arr.type):
+        # A bare string behaves like row_features: its length, and a search of its text
+        lowered = pc.utf8_lower(pc.fill_null(arr, ""))
+        return (pc.utf8_length(pc.fill_null(arr, "")).to_numpy(zero_copy_only=False),
+                pc.match_substring_regex(lowered, _SEVERE_PATTERN).to_numpy(zero_copy_only=False))
+
+    raw = arr.to_pylist() if arr is not None else values
+    rows = [row_features({"injuries": injuries})[:2] for injuries in raw]
+    return (np.array([r[0] for r in rows], dtype=np.int32).reshape(n),
+            np.array([r[1] for r in rows], dtype=np.int8).reshape(n))
+
+def model_metadata(**extra):
+    """Sidecar saved next to a trained model so serving can refuse a mismatched schema."""
+    return {
+        "feature_columns": list(FEATURE_COLUMNS),
+        "feature_spec_version": FEATURE_SPEC_VERSION,
+        "feature_fingerprint": feature_fingerprint(),
+        **extra,
+    }
+
+def check_model_metadata(metadata):
+    """Raise if a model was trained on a different feature schema than this code builds."""
+    if metadata.get("feature_fingerprint") != feature_fingerprint():
+        raise RuntimeError(
+            f"❌ Model was trained with feature schema {metadata.get('feature_fingerprint')} "
+            f"(columns {metadata.get('feature_columns')}), but this code builds {feature_fingerprint()}. "
+            "Retrain the model with ml/train_model.py."
+        )
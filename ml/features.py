@@ -1,34 +1,108 @@
 # ml/features.py
 
 import json
-import numpy as np
-import pandas as pd
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.json as pa_json
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml.feature_spec import frame_features, INPUT_FIELDS, TARGET_COLUMN
+from utils.io_helpers import is_case_store, read_case_store, case_store_columns, iter_cases
+
+SUMMARIES_PATH = "data/processed/summaries.jsonl"
+LEGACY_SUMMARIES_PATH = "data/processed/summaries.json"
+CASE_STORE_PATH = "data/processed/case_store"  # Columnar copy written by llm/summarize.py
+FEATURES_PATH = "data/processed/features.parquet"  # Feature frame saved by save_features for training/SHAP
+
+# Only the fields the features need; full_text and summaries are never materialized
+FEATURE_INPUT_SCHEMA = pa.schema([
+    ("injuries", pa.list_(pa.string())),
+    ("medical_bills", pa.float64()),
+    ("lost_wages", pa.float64()),
+    ("age", pa.float64()),
+    ("gender", pa.string()),
+    (TARGET_COLUMN, pa.float64()),
+])
+
+def resolve_summaries_path(path=SUMMARIES_PATH, prefer_store=False):
+    """Concrete file for the default summaries path: the JSONL stream, else the legacy JSON.
+
+    With `prefer_store`, the Parquet case store is used when it is at least as
+    new as the JSONL it was built from.
+    """
+    if path != SUMMARIES_PATH:
+        return path
+    if prefer_store and is_case_store(CASE_STORE_PATH) and (
+            not os.path.exists(path)
+            or os.path.getmtime(os.path.join(CASE_STORE_PATH, "_store.json")) >= os.path.getmtime(path)):
+        return CASE_STORE_PATH
+    if not os.path.exists(path):
+        return LEGACY_SUMMARIES_PATH
+    return path
+
+def iter_summaries(path=SUMMARIES_PATH):
+    """Stream summaries from the JSONL written by llm/summarize.py (or the older JSON file)."""
+    return iter_cases(resolve_summaries_path(path))
+
+def load_summaries(path=SUMMARIES_PATH):
+    return list(iter_summaries(path))
+
+def load_feature_table(path):
+    """Columnar read of just the feature inputs from a case store, .parquet, .jsonl or .json file."""
+    fields = INPUT_FIELDS + (TARGET_COLUMN,)
+    if is_case_store(path):
+        present = set(case_store_columns(path))
+        return read_case_store(path, columns=[f for f in fields if f in present])
+    if path.endswith(".parquet"):
+        present = set(pq.read_schema(path).names)
+        return pq.read_table(path, columns=[f for f in fields if f in present])
+
+    if path.endswith(".jsonl"):
+        try:
+            return pa_json.read_json(path, parse_options=pa_json.ParseOptions(
+                explicit_schema=FEATURE_INPUT_SCHEMA, unexpected_field_behavior="ignore"
+            ))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass  # e.g. a number stored as a string: fall back to frame_features' slow path
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    case = json.loads(line)
+                    rows.append({field: case.get(field) for field in fields})
+        return rows
 
-def load_summaries(path="data/processed/summaries.json"):
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return [{field: case.get(field) for field in fields} for case in json.load(f)]
 
 def extract_features(cases):
-    records = []
-    for case in cases:
-        summary = case.get("summary", "")
-        injuries = case.get("injuries", [])
-        medical_bills = case.get("medical_bills", 0)
-        lost_wages = case.get("lost_wages", 0)
-        age = case.get("age", 0)
-        gender = case.get("gender", "Unknown")
-        settlement = case.get("settlement_amount", None)
-
-        records.append({
-            "num_injuries": len(injuries),
-            "has_severe_injury": int(any(word in str(injuries).lower() for word in ["brain", "spinal", "burn"])),
-            "medical_bills": float(medical_bills) if medical_bills is not None else 0.0,
-            "lost_wages": float(lost_wages) if lost_wages is not None else 0.0,
-            "age": int(age) if age else 0,
-            "is_male": 1 if gender.lower() == "male" else 0,
-            "settlement_amount": float(settlement) if settlement is not None else 0.0,
-        })
-
-    df = pd.DataFrame(records)
-    df = df.dropna(subset=["settlement_amount"])  # ✅ Drop cases without settlement amount
+    """Training/batch feature frame (FEATURE_COLUMNS + settlement_amount) from the shared spec.
+
+    `cases` is a list of case dicts, a pyarrow Table, or a path to a case store
+    or summaries file (.jsonl, .json or .parquet) that is read column-wise.
+    """
+    if isinstance(cases, str):
+        cases = load_feature_table(resolve_summaries_path(cases, prefer_store=True))
+    df = frame_features(cases, include_target=True)
+    df = df.dropna(subset=[TARGET_COLUMN])  # ✅ Drop cases without settlement amount
     return df
+
+def save_features(source=SUMMARIES_PATH, path=FEATURES_PATH):
+    """Write the training feature frame for `source` to Parquet (via a temp file); returns the row count."""
+    df = extract_features(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    print(f"✅ Saved {len(df)} feature rows to {path}")
+    return len(df)
+
+def load_features(path=None):
+    """Feature frame saved by save_features, or extracted from the summaries when no path is given."""
+    if path is None:
+        return extract_features(SUMMARIES_PATH)
+    import pandas as pd
+    return pd.read_parquet(path)
@@ -0,0 +1,160 @@
+# ml/model_artifact.py
+
+import json
+import os
+import numpy as np
+
+PICKLE_PATH = "ml/model/settlement_model.pkl"
+BOOSTER_PATH = "ml/model/settlement_model.ubj"  # XGBoost's native UBJSON format
+TREES_PATH = "ml/model/settlement_model.trees.npz"  # Flattened trees for the NumPy evaluator
+METADATA_PATH = "ml/model/settlement_model.meta.json"
+
+# "xgboost": native booster; "numpy": TreeArrayModel, no xgboost import; "pickle": the legacy joblib file
+MODEL_BACKENDS = ("xgboost", "numpy", "pickle")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "xgboost")
+
+class BoosterModel:
+    """Native XGBoost booster behind the `predict(X)` interface the app uses."""
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    @classmethod
+    def load(cls, path=BOOSTER_PATH):
+        import xgboost as xgb
+        booster = xgb.Booster()
+        booster.load_model(path)
+        return cls(booster)
+
+    def predict(self, X):
+        return self.booster.inplace_predict(np.asarray(X, dtype=np.float32))
+
+class TreeArrayModel:
+    """Gradient-boosted regression trees flattened into NumPy arrays.
+
+    Every tree's nodes live in one set of arrays indexed by global node id, and
+    leaves point back at themselves, so one vectorized step per tree level moves
+    all rows through all trees at once. Only identity-link objectives
+    (reg:squarederror and friends) with numerical splits are supported.
+    """
+
+    FIELDS = ("feature", "threshold", "left", "right", "default_left", "leaf_value", "roots")
+
+    def __init__(self, feature, threshold, left, right, default_left, leaf_value, roots, base_score, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_booster_json(cls, model_json):
+        """Build from the dict in XGBoost's JSON model dump (`booster.save_raw("json")`)."""
+        learner = model_json["learner"]
+        objective = learner["objective"]["name"]
+        if not objective.startswith("reg:") or objective in ("reg:logistic", "reg:gamma", "reg:tweedie"):
+            raise ValueError(f"❌ TreeArrayModel only supports identity-link objectives, not {objective}")
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        features, thresholds, lefts, rights, defaults, leaf_values, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            if any(tree.get("split_type", [])):
+                raise ValueError("❌ TreeArrayModel does not support categorical splits")
+            left = np.asarray(tree["left_children"], dtype=np.int32)
+            right = np.asarray(tree["right_children"], dtype=np.int32)
+            n_nodes = len(left)
+            node_ids = np.arange(n_nodes, dtype=np.int32)
+            is_leaf = left == -1
+
+            features.append(np.where(is_leaf, 0, tree["split_indices"]).astype(np.int32))
+            # For leaves, split_conditions holds the leaf weight
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            thresholds.append(np.where(is_leaf, np.float32(np.inf), conditions))
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            defaults.append(np.asarray(tree["default_left"], dtype=bool))
+            leaf_values.append(np.where(is_leaf, conditions, np.float32(0)))
+            roots.append(offset)
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += n_nodes
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts).astype(np.int32),
+            np.concatenate(rights).astype(np.int32), np.concatenate(defaults), np.concatenate(leaf_values),
+            np.asarray(roots, dtype=np.int32), base_score, max_depth,
+        )
+
+    def save(self, path=TREES_PATH):
+        arrays = {name: getattr(self, name) for name in self.FIELDS}
+        np.savez(path, base_score=self.base_score, max_depth=self.max_depth, **arrays)
+
+    @classmethod
+    def load(cls, path=TREES_PATH):
+        with np.load(path) as data:
+            return cls(*(data[name] for name in cls.FIELDS), data["base_score"], data["max_depth"])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.leaf_value[nodes].sum(axis=1, dtype=np.float32) + np.float32(self.base_score)
+
+def _tree_depth(left, right):
+    depth = 0
+    level = [0]
+    while level:
+        level = [child for node in level for child in (left[node], right[node]) if child != -1]
+        depth += 1 if level else 0
+    return depth
+
+def export_model(booster, booster_path=BOOSTER_PATH, trees_path=TREES_PATH):
+    """Write the native UBJSON booster and the flattened tree arrays next to each other."""
+    os.makedirs(os.path.dirname(booster_path), exist_ok=True)
+    booster.save_model(booster_path)
+    TreeArrayModel.from_booster_json(json.loads(booster.save_raw("json"))).save(trees_path)
+    return {"booster": booster_path, "trees": trees_path}
+
+def load_model(backend=MODEL_BACKEND, booster_path=BOOSTER_PATH, trees_path=TREES_PATH, pickle_path=PICKLE_PATH):
+    """Model exposing `predict(X)` from the artifact the chosen backend reads."""
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"❌ Unknown model backend: {backend} (choose from {', '.join(MODEL_BACKENDS)})")
+    if backend == "numpy" and os.path.exists(trees_path):
+        return TreeArrayModel.load(trees_path)
+    if backend in ("xgboost", "numpy") and os.path.exists(booster_path):
+        if backend == "numpy":
+            print(f"⚠️ {trees_path} not found — serving with the XGBoost booster instead.")
+        return BoosterModel.load(booster_path)
+
+    if backend == "pickle" and not os.path.exists(pickle_path) and os.path.exists(booster_path):
+        print(f"⚠️ {pickle_path} not found — serving with the XGBoost booster instead.")
+        return BoosterModel.load(booster_path)
+    if backend != "pickle":
+        print(f"⚠️ {booster_path} not found — falling back to the pickled model. Retrain to export it.")
+    import joblib
+    return joblib.load(pickle_path)
+
+def explainable_model(model, booster_path=BOOSTER_PATH):
+    """Something shap.TreeExplainer understands for `model` (the NumPy backend reloads the booster)."""
+    if isinstance(model, BoosterModel):
+        return model.booster
+    if isinstance(model, TreeArrayModel):
+        return BoosterModel.load(booster_path).booster
+    return model
+
+def load_metadata(path=METADATA_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,253 @@
+# ml/model_registry.py
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from ml.feature_spec import check_model_metadata
+from ml.model_artifact import (
+    BOOSTER_PATH, TREES_PATH, PICKLE_PATH, METADATA_PATH, MODEL_BACKEND, load_model, explainable_model
+)
+
+# registry/<version>/{model.ubj, model.trees.npz, meta.json}; ACTIVE and SHADOW name a version each
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "ml/model/registry")
+RELOAD_SECONDS = float(os.getenv("MODEL_RELOAD_SECONDS", 5))  # Poll interval for new versions; 0 disables
+LEGACY_VERSION = "legacy"  # The single model under ml/model/, served when the registry is empty
+BOOSTER_FILE = "model.ubj"
+TREES_FILE = "model.trees.npz"
+PICKLE_FILE = "model.pkl"
+METADATA_FILE = "meta.json"
+
+class ModelEntry:
+    """One loaded model version; its SHAP explainer is built on first use."""
+
+    def __init__(self, version, model, metadata, artifact_hash=""):
+        self.version = version
+        self.model = model
+        self.metadata = metadata
+        # Identifies the exact model bytes, e.g. for caches that outlive a retrain under the same version name
+        self.cache_key = f"{version}:{artifact_hash[:12]}"
+        self._explainer = None
+        self._lock = threading.Lock()
+
+    def explainer(self):
+        with self._lock:
+            if self._explainer is None:
+                import shap
+                self._explainer = shap.TreeExplainer(explainable_model(self.model))
+            return self._explainer
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def new_version():
+    """Time-sortable version name, unique even for versions published in the same second."""
+    return f"{datetime.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:6]}"
+
+def publish_version(artifacts, metadata, version=None, root=REGISTRY_DIR, activate=True, shadow=False):
+    """Copy a trained model's native artifacts into the registry as a new version.
+
+    The version directory is assembled under a temp name and renamed into place,
+    and the ACTIVE/SHADOW pointers are replaced atomically, so a watching API
+    only ever sees complete versions.
+    """
+    version = version or new_version()
+    target = os.path.join(root, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"❌ Model version {version} already exists in {root}")
+    os.makedirs(root, exist_ok=True)
+    # A temp name of its own, so concurrent publishers never share (or delete) one
+    tmp = tempfile.mkdtemp(prefix=f"{version}.", suffix=".tmp", dir=root)
+    os.chmod(tmp, 0o755)  # mkdtemp's 0700 would hide the version from an API running as another user
+    try:
+        shutil.copyfile(artifacts["booster"], os.path.join(tmp, BOOSTER_FILE))
+        shutil.copyfile(artifacts["trees"], os.path.join(tmp, TREES_FILE))
+        if artifacts.get("pickle"):
+            shutil.copyfile(artifacts["pickle"], os.path.join(tmp, PICKLE_FILE))
+        with open(os.path.join(tmp, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump({**metadata, "version": version}, f, indent=2)
+        try:
+            # Renaming onto a directory another publisher already filled fails instead of merging
+            os.rename(tmp, target)
+        except OSError:
+            raise FileExistsError(f"❌ Model version {version} already exists in {root}")
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    if activate:
+        set_pointer("ACTIVE", version, root)
+    if shadow:
+        set_pointer("SHADOW", version, root)
+    return version
+
+def set_pointer(name, version, root=REGISTRY_DIR):
+    """Point ACTIVE or SHADOW at `version` (None clears it)."""
+    path = os.path.join(root, name)
+    if version is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    if not os.path.isdir(os.path.join(root, version)):
+        raise FileNotFoundError(f"❌ Model version {version} not found in {root}")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, path)
+
+def read_pointer(name, root=REGISTRY_DIR):
+    path = os.path.join(root, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+def list_versions(root=REGISTRY_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.endswith(".tmp") and os.path.isfile(os.path.join(root, name, METADATA_FILE))
+    )
+
+class ModelRegistry:
+    """Every published model version, with the active and shadow ones, swappable while serving.
+
+    Request handlers take a snapshot with `get()` and keep using that entry for
+    the whole request, so `refresh()` can swap in a new version at any time
+    without disturbing requests already in flight.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, backend=MODEL_BACKEND):
+        self.root = root
+        self.backend = backend
+        self.entries = {}
+        self.active = None
+        self.shadow = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # One refresh at a time: watcher thread vs. admin calls
+        self._signature = None
+        self._watcher = None
+        self.listeners = []  # Called with the loaded ModelEntry list after every swap
+        self.refresh()
+
+    def _load_entry(self, version):
+        if version == LEGACY_VERSION:
+            paths = {"booster_path": BOOSTER_PATH, "trees_path": TREES_PATH, "pickle_path": PICKLE_PATH}
+            metadata_path = METADATA_PATH
+        else:
+            directory = os.path.join(self.root, version)
+            paths = {
+                "booster_path": os.path.join(directory, BOOSTER_FILE),
+                "trees_path": os.path.join(directory, TREES_FILE),
+                "pickle_path": os.path.join(directory, PICKLE_FILE),
+            }
+            metadata_path = os.path.join(directory, METADATA_FILE)
+
+        metadata = None
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            check_model_metadata(metadata)
+        else:
+            print(f"⚠️ {metadata_path} not found — can't verify the model's feature schema. Retrain to create it.")
+        artifact = next((p for p in paths.values() if os.path.exists(p)), None)
+        return ModelEntry(version, load_model(self.backend, **paths), metadata, file_hash(artifact) if artifact else "")
+
+    def _current_signature(self):
+        return (read_pointer("ACTIVE", self.root), read_pointer("SHADOW", self.root), tuple(list_versions(self.root)))
+
+    def refresh(self):
+        """Load versions that appeared and swap the active/shadow pointers; True if anything changed."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self):
+        signature = self._current_signature()
+        if signature == self._signature:
+            return False
+        active, shadow, versions = signature
+
+        entries = dict(self.entries)
+        if not versions:
+            versions, active = (LEGACY_VERSION,), LEGACY_VERSION
+        active = active or versions[-1]
+        for version in versions:
+            if version not in entries:
+                try:
+                    # Loaded outside the serving lock: requests continue on the old entries meanwhile
+                    entries[version] = self._load_entry(version)
+                except Exception as e:
+                    print(f"⚠️ Skipping model version {version}: {e}")
+        for version in set(entries) - set(versions):
+            del entries[version]
+        if active not in entries:
+            if self.active is None:
+                raise RuntimeError(f"❌ Model version {active} could not be loaded from {self.root}")
+            print(f"⚠️ Active model version {active} failed to load — keeping {self.active}")
+            entries[self.active] = self.entries[self.active]
+            active = self.active
+
+        with self._lock:
+            self.entries = entries
+            self.active = active
+            self.shadow = shadow if shadow in entries and shadow != active else None
+            self._signature = signature
+        print(f"🔄 Serving model {self.active}" + (f" (shadow: {self.shadow})" if self.shadow else ""))
+        for listener in self.listeners:
+            listener(list(entries.values()))
+        return True
+
+    def get(self, version=None):
+        """(entry, shadow entry or None) for a pinned `version`, or for the active one."""
+        with self._lock:
+            if version is not None:
+                if version not in self.entries:
+                    raise KeyError(version)
+                return self.entries[version], None
+            shadow = self.entries.get(self.shadow) if self.shadow else None
+            return self.entries[self.active], shadow
+
+    def activate(self, version):
+        set_pointer("ACTIVE", version, self.root)
+        self.refresh()
+
+    def set_shadow(self, version):
+        set_pointer("SHADOW", version, self.root)
+        self.refresh()
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "shadow": self.shadow,
+                "versions": {
+                    version: (entry.metadata or {}).get("metrics") for version, entry in sorted(self.entries.items())
+                },
+            }
+
+    def watch(self, interval=RELOAD_SECONDS):
+        """Poll the registry in a daemon thread and hot-swap whenever it changes."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"⚠️ Model registry refresh failed: {e}")
+
+        self._watcher = threading.Thread(target=loop, name="model-registry-watch", daemon=True)
+        self._watcher.start()
@@ -1,32 +1,30 @@
 # ml/predictor.py
 
 import os
-import joblib
 import json
 import pandas as pd
-from features import extract_features
+from features import iter_summaries, SUMMARIES_PATH
+from ml.feature_spec import FEATURE_COLUMNS, frame_features, row_matrix
+from ml.model_artifact import load_model
+from utils.io_helpers import batched
 
-MODEL_PATH = "ml/model/settlement_model.pkl"
-model = joblib.load(MODEL_PATH)
+PREDICT_BATCH_ROWS = 5000
 
-def predict_batch(summaries_path="data/processed/summaries.json"):
-    with open(summaries_path, "r", encoding="utf-8") as f:
-        cases = json.load(f)
+model = load_model()  # Backend chosen by MODEL_BACKEND (xgboost, numpy or pickle)
 
-    df = extract_features(cases)
-    X = df.drop("settlement_amount", axis=1, errors="ignore")
-    predictions = model.predict(X)
+def predict_batch(summaries_path=SUMMARIES_PATH, batch_rows=PREDICT_BATCH_ROWS):
+    """Yield each case with its prediction, scoring `batch_rows` cases at a time."""
+    for cases in batched(iter_summaries(summaries_path), batch_rows):
+        X = frame_features(cases)[list(FEATURE_COLUMNS)]
+        predictions = model.predict(X)
 
-    for case, pred in zip(cases, predictions):
-        case["predicted_settlement"] = round(pred, 2)
-
-    return cases
+        for case, pred in zip(cases, predictions):
+            case["predicted_settlement"] = round(float(pred), 2)
+            yield case
 
 def predict_single(summary_data: dict):
-    features_df = extract_features([summary_data])
-    X = features_df.drop("settlement_amount", axis=1, errors="ignore")
-    prediction = model.predict(X)[0]
-    return round(prediction, 2)
+    prediction = model.predict(row_matrix([summary_data]))[0]
+    return round(float(prediction), 2)
 
 if __name__ == "__main__":
     print("🎯 Choose prediction mode:")
@@ -37,11 +35,12 @@ if __name__ == "__main__":
 
     if mode == "1":
         print("\n📁 Loading summaries from file...")
-        results = predict_batch()
-        print(f"\n✅ Batch prediction complete! {len(results)} cases processed.")
-        for case in results:
+        count = 0
+        for case in predict_batch():
             name = case.get("case_name", "unknown")[:40]
             print(f" - {name} → ${case['predicted_settlement']} 💰")
+            count += 1
+        print(f"\n✅ Batch prediction complete! {count} cases processed.")
     else:
         print("\n📋 Paste your summary JSON (use correct keys):")
         user_input = input()
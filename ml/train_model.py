@@ -1,35 +1,225 @@
 # ml/train_model.py
 
 import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import joblib
+import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import KFold, train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 
-from features import load_summaries, extract_features
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml.features import load_features
+from ml.feature_spec import FEATURE_COLUMNS, TARGET_COLUMN, model_metadata
+from ml.model_artifact import PICKLE_PATH as MODEL_PATH, METADATA_PATH, export_model
+from ml.model_registry import publish_version
+from utils.io_helpers import append_jsonl
 
-def train():
-    cases = load_summaries()
-    df = extract_features(cases)
+LEADERBOARD_PATH = "ml/model/leaderboard.jsonl"  # One line per hyperparameter trial, across searches
+CV_FOLDS = 5
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+MAX_BIN = 256  # Fixed so every trial reuses the same quantized matrices
+BASE_PARAMS = {"objective": "reg:squarederror", "eval_metric": "mae", "tree_method": "hist", "max_bin": MAX_BIN}
+# Memory the search's workers may use together; each holds its own copy of the data and all k fold matrices
+SEARCH_MEMORY_GB = float(os.getenv("SEARCH_MEMORY_GB", 8))
 
-    X = df.drop("settlement_amount", axis=1)
-    y = df["settlement_amount"]
+# Worker-process cache: the quantized (train, validation) matrices of every fold, built once per worker
+_folds = None
+
+def sample_params(rng):
+    """One random point of the search space."""
+    return {
+        "max_depth": int(rng.integers(2, 9)),
+        "learning_rate": float(np.exp(rng.uniform(np.log(0.01), np.log(0.3)))),
+        "min_child_weight": float(np.exp(rng.uniform(0, np.log(20)))),
+        "subsample": float(rng.uniform(0.6, 1.0)),
+        "colsample_bytree": float(rng.uniform(0.6, 1.0)),
+        "reg_lambda": float(np.exp(rng.uniform(np.log(0.1), np.log(10)))),
+    }
+
+def cv_splits(n_rows, folds, seed):
+    if folds < 2:
+        raise ValueError(f"❌ Cross-validation needs at least 2 folds, got {folds}")
+    if n_rows < 2:
+        raise ValueError(f"❌ Cross-validation needs at least 2 rows, got {n_rows}")
+    return list(KFold(n_splits=min(folds, n_rows), shuffle=True, random_state=seed).split(np.arange(n_rows)))
+
+def build_folds(X, y, splits, nthread):
+    """QuantileDMatrix per fold; validation matrices share their training fold's bin edges."""
+    global _folds
+    _folds = []
+    for train_idx, valid_idx in splits:
+        dtrain = xgb.QuantileDMatrix(X[train_idx], y[train_idx], max_bin=MAX_BIN, nthread=nthread)
+        dvalid = xgb.QuantileDMatrix(X[valid_idx], y[valid_idx], ref=dtrain, nthread=nthread)
+        _folds.append((dtrain, dvalid))
+
+def search_workers(data_bytes, folds, trials, workers=None, memory_gb=SEARCH_MEMORY_GB):
+    """Worker processes for a search: `workers` if given, else one per core within the memory budget.
+
+    A worker holds the data it was sent plus k fold matrices of up to the
+    same size each, so the estimate is (k + 1) x data per worker.
+    """
+    per_worker = (folds + 1) * data_bytes
+    fits = max(1, int(memory_gb * 1e9 // per_worker)) if per_worker else trials
+    if workers is None:
+        workers = min(os.cpu_count() or 1, fits)
+    elif workers > fits:
+        print(f"⚠️ {workers} workers x ~{per_worker / 1e9:.1f} GB each exceeds SEARCH_MEMORY_GB={memory_gb:g}")
+    return max(1, min(workers, trials))
+
+def run_trial(trial, params, nthread, max_rounds=MAX_ROUNDS, early_stopping=EARLY_STOPPING_ROUNDS):
+    """k-fold CV of one parameter set on the cached fold matrices, early-stopped on each validation fold."""
+    start = time.perf_counter()
+    scores, rounds = [], []
+    for dtrain, dvalid in _folds:
+        booster = xgb.train({**BASE_PARAMS, **params, "nthread": nthread}, dtrain, num_boost_round=max_rounds,
+                            evals=[(dvalid, "valid")], early_stopping_rounds=early_stopping, verbose_eval=False)
+        scores.append(booster.best_score)
+        rounds.append(booster.best_iteration + 1)
+    return {
+        "trial": trial,
+        "params": params,
+        "cv_mae": float(np.mean(scores)),
+        "cv_mae_std": float(np.std(scores)),
+        "rounds": int(round(np.mean(rounds))),
+        "seconds": round(time.perf_counter() - start, 3),
+        "nthread": nthread,
+    }
+
+def search(X, y, trials=20, folds=CV_FOLDS, workers=None, seed=42, leaderboard_path=LEADERBOARD_PATH):
+    """Random hyperparameter search scored by k-fold CV; returns the trials, best first.
+
+    Trials run in `workers` processes with `cpu_count // workers` XGBoost
+    threads each, so the machine is used fully without oversubscribing it.
+    Each worker quantizes the folds once and reuses them for all its trials,
+    so it holds about (folds + 1) x the data: by default there is one worker
+    per core only as far as SEARCH_MEMORY_GB allows. Workers are spawned, not
+    forked, since the pipeline may run this next to threads (torch, FAISS,
+    OpenMP) that a forked child would inherit mid-lock. Every finished trial
+    is appended to the leaderboard.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    splits = cv_splits(len(X), folds, seed)
+    workers = search_workers(X.nbytes + y.nbytes, len(splits), trials, workers)
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    rng = np.random.default_rng(seed)
+    candidates = [sample_params(rng) for _ in range(trials)]
+    search_id = time.strftime("%Y%m%d-%H%M%S")
+
+    print(f"🔎 {trials} trials x {len(splits)}-fold CV on {len(X)} rows: "
+          f"{workers} worker(s) x {nthread} thread(s)")
+    start = time.perf_counter()
+    results = []
+
+    def finished(result):
+        result = {"search_id": search_id, **result}
+        results.append(result)
+        append_jsonl([result], leaderboard_path)
+        print(f"   trial {result['trial']:>3}: CV MAE {result['cv_mae']:,.0f} ± {result['cv_mae_std']:,.0f} "
+              f"({result['rounds']} rounds, {result['seconds']:.1f}s)")
+
+    if workers == 1:
+        build_folds(X, y, splits, nthread)
+        for trial, params in enumerate(candidates):
+            finished(run_trial(trial, params, nthread))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=build_folds, initargs=(X, y, splits, nthread)) as pool:
+            futures = [pool.submit(run_trial, trial, params, nthread) for trial, params in enumerate(candidates)]
+            for future in as_completed(futures):
+                finished(future.result())
+
+    results.sort(key=lambda r: r["cv_mae"])
+    print(f"🏆 Best CV MAE {results[0]['cv_mae']:,.0f} (trial {results[0]['trial']}) "
+          f"after {time.perf_counter() - start:.1f}s; leaderboard in {leaderboard_path}")
+    return results
+
+def train(publish=True, shadow=False, features_path=None, trials=0, folds=CV_FOLDS, workers=None):
+    """Fit, evaluate on a 20% holdout, save and publish the settlement model.
+
+    With `trials`, the hyperparameters and number of trees come from a CV
+    search on the training split instead of the fixed defaults.
+    """
+    df = load_features(features_path)
+
+    X = df[list(FEATURE_COLUMNS)]
+    y = df[TARGET_COLUMN]
 
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
     )
 
-    model = xgb.XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=4)
+    search_metrics = {}
+    if trials:
+        best = search(X_train, y_train, trials, folds, workers)[0]
+        model = xgb.XGBRegressor(n_estimators=best["rounds"], tree_method="hist", max_bin=MAX_BIN,
+                                 n_jobs=os.cpu_count(), **best["params"])
+        search_metrics = {"cv_mae": best["cv_mae"], "cv_folds": folds, "search_trials": trials,
+                          "params": best["params"], "n_estimators": best["rounds"]}
+    else:
+        model = xgb.XGBRegressor(n_estimators=100, learning_rate=0.1, max_depth=4)
     model.fit(X_train, y_train)
 
     y_pred = model.predict(X_test)
+    mae = mean_absolute_error(y_test, y_pred)
+    r2 = r2_score(y_test, y_pred)
     print("✅ Model trained.")
-    print("📊 MAE:", mean_absolute_error(y_test, y_pred))
-    print("📈 R²:", r2_score(y_test, y_pred))
+    print("📊 MAE:", mae)
+    print("📈 R²:", r2)
+
+    metrics = {"mae": float(mae), "r2": float(r2), "n_train": len(X_train), "n_test": len(X_test), **search_metrics}
+    if shadow:
+        # A candidate must not replace the artifacts the live model is served from
+        with tempfile.TemporaryDirectory() as tmp:
+            artifacts = export_model(model.get_booster(), os.path.join(tmp, "model.ubj"),
+                                     os.path.join(tmp, "model.trees.npz"))
+            artifacts["pickle"] = os.path.join(tmp, "model.pkl")
+            joblib.dump(model, artifacts["pickle"])
+            metadata = model_metadata(metrics=metrics, xgboost_version=xgb.__version__)
+            version = publish_version(artifacts, metadata, activate=False, shadow=True)
+        print(f"📦 Published model version {version} as the shadow candidate")
+        return
+
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    joblib.dump(model, MODEL_PATH)
+    # Native booster + flattened trees load without pickle and across xgboost versions
+    artifacts = export_model(model.get_booster())
+    metadata = model_metadata(
+        metrics=metrics,
+        xgboost_version=xgb.__version__,
+        artifacts={"pickle": MODEL_PATH, **artifacts},
+    )
+    with open(METADATA_PATH, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"💾 Model saved to {MODEL_PATH}, {artifacts['booster']} and {artifacts['trees']} "
+          f"(feature schema in {METADATA_PATH})")
 
-    os.makedirs("models", exist_ok=True)
-    joblib.dump(model, "ml/model/settlement_model.pkl")
-    print("💾 Model saved to model/settlement_model.pkl")
+    if publish:
+        # A running API picks the new version up on its next registry poll
+        version = publish_version({**artifacts, "pickle": MODEL_PATH}, metadata)
+        print(f"📦 Published model version {version}")
 
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the settlement model.")
+    parser.add_argument("--no-publish", action="store_true", help="Don't add this model to the serving registry")
+    parser.add_argument("--shadow", action="store_true",
+                        help="Publish as the shadow candidate instead of making it the live version")
+    parser.add_argument("--features", help="Feature Parquet from ml.features.save_features (default: extract from summaries)")
+    parser.add_argument("--search", type=int, default=0, metavar="TRIALS",
+                        help="Pick hyperparameters by a cross-validated random search with this many trials")
+    parser.add_argument("--folds", type=int, default=CV_FOLDS, help="CV folds per search trial")
+    parser.add_argument("--workers", type=int,
+                        help="Search processes (default: one per core, within SEARCH_MEMORY_GB)")
+    args = parser.parse_args()
+    if args.search and args.folds < 2:
+        parser.error("--folds must be at least 2")
+    train(publish=not args.no_publish, shadow=args.shadow, features_path=args.features,
+          trials=args.search, folds=args.folds, workers=args.workers)
@@ -0,0 +1,123 @@
+"""End-to-end pipeline: ingest → filter → label → embed ‖ summarize → features → train → explain.
+
+Each stage is skipped when the content of everything it reads (data files and
+its own source) matches the last successful run, recorded in
+data/pipeline_state.json. The expensive stages are incremental within a run
+too: labeling reuses labels of unchanged cases, the index upserts only new or
+changed cases and summarization resumes, so adding 50 cases sends only those
+50 to the LLM and the embedder. Embedding and summarization run side by side.
+
+    python pipeline.py                       # run whatever is stale
+    python pipeline.py --skip ingest         # work offline from the cases already fetched
+    python pipeline.py --only train explain  # just these stages, on the current artifacts
+    python pipeline.py --force label         # rebuild a stage from scratch
+    python pipeline.py --dry-run             # show what would run
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(ROOT)
+from utils.pipeline import Stage, PipelineState, STATE_PATH, plan, run_pipeline
+from agents import label_cases
+from llm import retriever, summarize
+from ml import features
+from ml import explain as shap_plots
+from ml.model_artifact import PICKLE_PATH, BOOSTER_PATH, TREES_PATH, METADATA_PATH
+
+STREAM_PATH = label_cases.INPUT_PATH
+LEGACY_RAW_PATH = label_cases.LEGACY_INPUT_PATH
+
+def ingest(args):
+    def run(full):
+        # Imported here: data_agent refuses to load without a CourtListener API key
+        from agents import data_agent
+        count = data_agent.fetch_courts(args.court, limit=args.limit, incremental=True,
+                                        max_workers=args.ingest_workers, since_last_run=True)
+        print(f"✅ Appended {count} new cases to {data_agent.STREAM_PATH}")
+    return run
+
+def train(args):
+    def run(full):
+        from ml import train_model
+        train_model.train(publish=not args.no_publish, features_path=features.FEATURES_PATH, trials=args.search)
+    return run
+
+def explain(full):
+    if full and os.path.exists(shap_plots.SHAP_VALUES_PATH):
+        os.remove(shap_plots.SHAP_VALUES_PATH)
+    shap_plots.explain_model(features_path=features.FEATURES_PATH)
+
+def build_stages(args):
+    return [
+        Stage("ingest", ingest(args), outputs=[STREAM_PATH], always=True,
+              params={"courts": args.court, "limit": args.limit}),
+        Stage("filter", lambda full: label_cases.filter_cases(output_path=label_cases.FILTERED_PATH),
+              inputs=[STREAM_PATH, LEGACY_RAW_PATH, "agents/label_cases.py"],
+              outputs=[label_cases.FILTERED_PATH], after=["ingest"]),
+        Stage("label", lambda full: label_cases.enrich_cases(input_path=label_cases.FILTERED_PATH,
+                                                             incremental=not full),
+              inputs=[label_cases.FILTERED_PATH, "agents/label_cases.py"],
+              outputs=[label_cases.OUTPUT_PATH], after=["filter"]),
+        Stage("embed", lambda full: retriever.main(rebuild=full, prune=True, kind=args.index_kind),
+              inputs=[retriever.INPUT_PATH, "llm/retriever.py", "llm/embedding_store.py"],
+              outputs=[retriever.INDEX_PATH], after=["label"],
+              params={"index_kind": args.index_kind, "index_dtype": retriever.INDEX_DTYPE}),
+        # Without --rag, summaries don't read the index, so both stages run at once
+        Stage("summarize", lambda full: summarize.main(use_rag=args.rag, fresh=full),
+              inputs=[summarize.INPUT_PATH, "llm/summarize.py"] + ([retriever.INDEX_PATH] if args.rag else []),
+              outputs=[summarize.OUTPUT_PATH, summarize.STORE_PATH],
+              after=["label", "embed"] if args.rag else ["label"], params={"rag": args.rag}),
+        Stage("features", lambda full: features.save_features(),
+              inputs=[features.SUMMARIES_PATH, features.LEGACY_SUMMARIES_PATH, "ml/features.py", "ml/feature_spec.py"],
+              outputs=[features.FEATURES_PATH], after=["summarize"]),
+        Stage("train", train(args), inputs=[features.FEATURES_PATH, "ml/train_model.py"],
+              outputs=[PICKLE_PATH, BOOSTER_PATH, TREES_PATH, METADATA_PATH], after=["features"],
+              params={"search_trials": args.search}),
+        Stage("explain", explain, inputs=[features.FEATURES_PATH, BOOSTER_PATH, "ml/explain.py"],
+              outputs=[shap_plots.SHAP_VALUES_PATH, shap_plots.PLOTS_DIR], after=["train"]),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stale stages of the LegalClaimGPT pipeline.")
+    parser.add_argument("--only", nargs="+", metavar="STAGE", help="Run just these stages")
+    parser.add_argument("--skip", nargs="+", default=[], metavar="STAGE", help="Leave these stages' outputs as they are")
+    parser.add_argument("--force", nargs="+", default=[], metavar="STAGE",
+                        help="Run these stages even if fresh, rebuilding incremental ones from scratch")
+    parser.add_argument("--dry-run", action="store_true", help="Show which stages would run and exit")
+    parser.add_argument("--workers", type=int, default=2, help="Stages run at once")
+    parser.add_argument("--court", nargs="+", default=["ca9"], help="CourtListener court IDs to ingest")
+    parser.add_argument("--limit", type=int, default=30, help="Maximum new cases per court per run")
+    parser.add_argument("--ingest-workers", type=int, default=4, help="Courts fetched at once")
+    parser.add_argument("--index-kind", choices=retriever.INDEX_KINDS, default=retriever.INDEX_KIND)
+    parser.add_argument("--rag", action="store_true", help="Summarize with retrieved passages (waits for embed)")
+    parser.add_argument("--no-publish", action="store_true", help="Don't add a retrained model to the registry")
+    parser.add_argument("--search", type=int, default=0, metavar="TRIALS",
+                        help="Train with a cross-validated hyperparameter search of this many trials")
+    parser.add_argument("--state", default=STATE_PATH, help="Where artifact hashes are recorded")
+    args = parser.parse_args()
+
+    # Every stage's paths are relative to the repository root
+    os.chdir(ROOT)
+    stages = build_stages(args)
+    names = [stage.name for stage in stages]
+    selected = [name for name in (args.only or names) if name not in args.skip]
+    for name in selected + args.skip + args.force:
+        if name not in names:
+            parser.error(f"unknown stage {name!r} (choose from {', '.join(names)})")
+    state = PipelineState(args.state)
+
+    if args.dry_run:
+        for name, status in plan(stages, state, selected, set(args.force)):
+            print(f"{name:>10}  {status}")
+        return
+
+    results = run_pipeline(stages, state, selected, set(args.force), max_workers=args.workers)
+    print("🏁 " + ", ".join(f"{name}: {status}" for name, status in results.items()))
+    if any(status in ("failed", "blocked") for status in results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
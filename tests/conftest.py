@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import each other from the repository root (e.g. `from utils.io_helpers import ...`)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import api
+
+CASE = {"summary": "Rear-end collision.", "injuries": ["fracture"], "medical_bills": 12000,
+        "lost_wages": 3000, "age": 40, "gender": "Female"}
+
+@pytest.fixture
+def client():
+    return TestClient(api.app)
+
+def ndjson_lines(n, consumed):
+    for i in range(n):
+        consumed.append(i)
+        yield (json.dumps({**CASE, "age": 20 + i % 50}) + "\n").encode()
+
+@pytest.mark.parametrize("path", ["/predict/batch", "/explain/batch"])
+def test_batches_are_parsed_off_the_event_loop(client, monkeypatch, path):
+    threads = {}
+    features_matrix, select_model = api.features_matrix, api.select_model
+
+    def record_features(cases):
+        threads["parse"] = threading.get_ident()
+        return features_matrix(cases)
+
+    def record_select(request):
+        threads["loop"] = threading.get_ident()
+        return select_model(request)
+
+    monkeypatch.setattr(api, "features_matrix", record_features)
+    monkeypatch.setattr(api, "select_model", record_select)
+    response = client.post(path, json=[CASE, {**CASE, "age": 60}])
+    assert response.status_code == 200 and response.json()["count"] == 2
+    assert threads["parse"] != threads["loop"]
+
+class StreamingRequest:
+    """Just enough of a Starlette request to stream an NDJSON body into read_batch chunk by chunk."""
+
+    headers = {"content-type": "application/x-ndjson"}
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+def test_ndjson_batch_is_refused_once_it_passes_the_limit(client, monkeypatch):
+    monkeypatch.setattr(api, "MAX_BATCH", 10)
+    consumed = []
+    with pytest.raises(api.HTTPException) as refused:
+        asyncio.run(api.read_batch(StreamingRequest(ndjson_lines(1000, consumed))))
+    assert refused.value.status_code == 413
+    assert len(consumed) == 11
+
+    # Lines split across chunks are reassembled
+    body = b"".join(ndjson_lines(10, []))
+    X = asyncio.run(api.read_batch(StreamingRequest([body[i:i + 7] for i in range(0, len(body), 7)])))
+    assert X.shape == (10, len(api.FEATURE_COLUMNS))
+
+    response = client.post("/predict/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200 and len(response.json()["predicted_settlements"]) == 10
+
+def test_invalid_batches_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(api, "MAX_BATCH", 3)
+    assert client.post("/predict/batch", json=[CASE] * 4).status_code == 413
+    assert client.post("/predict/batch", json=[{**CASE, "age": "old"}]).status_code == 422
+    assert client.post("/predict/batch", content=b'{"summary": ', headers={"Content-Type": "application/x-ndjson"}).status_code == 422
+    assert client.post("/predict/batch", json=[]).json()["count"] == 0
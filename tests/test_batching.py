@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+from app.batching import MicroBatcher
+
+class Target:
+    def __init__(self, name):
+        self.name = name
+
+def recording_batch(calls):
+    def run_batch(target, items):
+        calls.append((target.name, list(items)))
+        return [f"{target.name}:{item}" for item in items]
+    return run_batch
+
+def test_concurrent_submits_share_one_batch_per_model():
+    calls = []
+    batcher = MicroBatcher(max_batch=16, max_wait_us=50_000, run_batch=recording_batch(calls))
+    a, b = Target("a"), Target("b")
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(a if i % 2 else b, i) for i in range(6)))
+
+    assert asyncio.run(main()) == ["b:0", "a:1", "b:2", "a:3", "b:4", "a:5"]
+    assert sorted(calls) == [("a", [1, 3, 5]), ("b", [0, 2, 4])]
+    assert batcher.stats.batches == 1 and batcher.stats.requests == 6
+
+def test_a_full_batch_runs_without_waiting_and_the_rest_flush_after_max_wait():
+    calls = []
+    batcher = MicroBatcher(max_batch=4, max_wait_us=100_000, run_batch=recording_batch(calls))
+    target = Target("m")
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(batcher.submit(target, i) for i in range(5)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(main())
+    assert results == [f"m:{i}" for i in range(5)]
+    assert calls == [("m", [0, 1, 2, 3]), ("m", [4])]
+    # The lone fifth request waited out max_wait for company, then ran on its own
+    assert 0.09 <= elapsed < 1.0
+
+def test_a_failing_batch_raises_in_every_waiting_caller():
+    def run_batch(target, items):
+        raise RuntimeError("model exploded")
+
+    batcher = MicroBatcher(max_batch=8, max_wait_us=20_000, run_batch=run_batch)
+    target = Target("m")
+
+    async def main():
+        results = await asyncio.gather(*(batcher.submit(target, i) for i in range(3)), return_exceptions=True)
+        # The collector survives and serves the next batch
+        batcher.run_batch = recording_batch([])
+        return results, await batcher.submit(target, 9)
+
+    results, after = asyncio.run(main())
+    assert len(results) == 3 and all(isinstance(r, RuntimeError) and str(r) == "model exploded" for r in results)
+    assert after == "m:9"
@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+os.environ.setdefault("COURTLISTENER_API_KEY", "test")
+from agents import data_agent
+from utils.io_helpers import iter_jsonl
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PI_TEXT = "The plaintiff brought a personal injury action alleging negligence after a car accident. "
+
+def opinion(case_id, date_created):
+    """A record shaped like the real v4 /opinions/ endpoint's: no caseName, court or date_filed."""
+    return {"resource_uri": f"{data_agent.BASE_URL}{case_id}/", "id": case_id,
+            "absolute_url": f"/opinion/{case_id}/doe-v-roe-{case_id}/", "cluster_id": 1000 + case_id,
+            "cluster": f"https://www.courtlistener.com/api/rest/v4/clusters/{1000 + case_id}/",
+            "author_id": None, "joined_by": [], "date_created": date_created, "date_modified": date_created,
+            "author_str": "", "per_curiam": False, "type": "010combined", "sha1": "", "page_count": None,
+            "download_url": None, "local_path": "", "plain_text": PI_TEXT, "html": "", "html_with_citations": "",
+            "extracted_by_ocr": False, "ordering_key": None, "opinions_cited": []}
+
+class FakeResponse:
+    def __init__(self, url, payload):
+        self.url = url
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeCourtListener:
+    """In-process stand-in for the opinions endpoint: date_created filter, ordering and cursor pages."""
+
+    def __init__(self, opinions, courts=None, ignore_court=False):
+        self.opinions = opinions
+        self.courts = courts or {}  # opinion id -> docket court; the record itself doesn't say
+        self.ignore_court = ignore_court
+        self.queries = []
+
+    def get(self, url, params=None, timeout=None):
+        query = {**dict(parse_qsl(urlparse(url).query)), **{k: str(v) for k, v in (params or {}).items()}}
+        self.queries.append(query)
+        since = data_agent.created_at(query.get(data_agent.SINCE_PARAM))
+        court = None if self.ignore_court else query.get(data_agent.COURT_PARAM)
+        rows = sorted((o for o in self.opinions
+                       if (since is None or data_agent.created_at(o["date_created"]) >= since)
+                       and (court is None or self.courts.get(o["id"], "ca9") == court)),
+                      key=lambda o: (data_agent.created_at(o["date_created"]), o["id"]))
+        size, cursor = int(query["page_size"]), int(query.get("cursor", 0))
+        more = (cursor + 1) * size < len(rows)
+        next_url = f"{data_agent.BASE_URL}?{urlencode({**query, 'cursor': cursor + 1})}" if more else None
+        return FakeResponse(f"{data_agent.BASE_URL}?{urlencode(query)}",
+                            {"results": rows[cursor * size:(cursor + 1) * size], "next": next_url})
+
+def ingest(tmp_path, session, **kwargs):
+    return data_agent.ingest_opinions(stream_path=str(tmp_path / "cases.jsonl"),
+                                      checkpoint_path=str(tmp_path / "checkpoints" / "ca9.json"),
+                                      session=session, prefetch=False, **kwargs)
+
+def stream_ids(tmp_path):
+    return [case["case_id"] for case in iter_jsonl(str(tmp_path / "cases.jsonl"))]
+
+def test_since_last_run_picks_up_opinions_added_after_the_last_run(tmp_path):
+    # Opinion 2 sorts first as a string, but opinion 3 was added later (16:30 vs 17:00 UTC)
+    session = FakeCourtListener([opinion(1, "2024-01-01T09:00:00.000000-08:00"),
+                                 opinion(2, "2024-06-01T09:30:00.000000-07:00"),
+                                 opinion(3, "2024-06-01T09:00:00.000000-08:00")])
+    assert ingest(tmp_path, session, since_last_run=True) == 3
+    assert data_agent.SINCE_PARAM not in session.queries[-1]
+    checkpoint = data_agent.load_json(str(tmp_path / "checkpoints" / "ca9.json"))
+    assert checkpoint["last_date_created"] == "2024-06-01T09:00:00.000000-08:00"
+
+    session.opinions.append(opinion(4, "2024-06-02T10:00:00.000000-07:00"))
+    assert ingest(tmp_path, session, since_last_run=True) == 1
+    assert session.queries[-1][data_agent.SINCE_PARAM] == "2024-06-01T09:00:00.000000-08:00"
+    assert session.queries[-1]["order_by"] == data_agent.ORDER_BY
+    assert session.queries[-1][data_agent.COURT_PARAM] == "ca9" and "court" not in session.queries[-1]
+    assert stream_ids(tmp_path) == [1, 2, 3, 4]
+
+def test_crash_before_the_checkpoint_doesnt_duplicate_the_page(tmp_path, monkeypatch):
+    session = FakeCourtListener([opinion(i, f"2024-01-{1 + i:02d}T00:00:00Z") for i in range(6)])
+    append_jsonl = data_agent.append_jsonl
+    calls = []
+
+    def crash_after_the_stream_write(records, path):
+        calls.append(path)
+        if len(calls) == 4:  # Page two: its cases are in the stream, its IDs never reach the seen log
+            raise OSError("disk full")
+        append_jsonl(records, path)
+
+    monkeypatch.setattr(data_agent, "append_jsonl", crash_after_the_stream_write)
+    assert ingest(tmp_path, session, limit=2) == 2
+    assert ingest(tmp_path, session, limit=2) == 0  # Crashed
+    monkeypatch.setattr(data_agent, "append_jsonl", append_jsonl)
+
+    assert ingest(tmp_path, session, limit=100) == 2
+    assert stream_ids(tmp_path) == [0, 1, 2, 3, 4, 5]
+    assert sorted(iter_jsonl(str(tmp_path / "checkpoints" / "ca9.seen.jsonl"))) == [0, 1, 2, 3, 4, 5]
+
+def test_inline_seen_ids_of_old_checkpoints_are_kept(tmp_path):
+    os.makedirs(tmp_path / "checkpoints")
+    data_agent.save_json_atomic({"next_url": None, "seen_ids": [1], "last_date_filed": "2024-01-01"},
+                                str(tmp_path / "checkpoints" / "ca9.json"))
+    session = FakeCourtListener([opinion(1, "2024-01-01T00:00:00Z"), opinion(2, "2024-01-02T00:00:00Z")])
+    assert ingest(tmp_path, session) == 1
+    assert ingest(tmp_path, session) == 0
+    assert stream_ids(tmp_path) == [2]
+
+def test_stopping_early_does_not_wait_for_the_prefetched_page(tmp_path):
+    release = threading.Event()
+    requested = threading.Event()
+
+    class SlowSecondPage(FakeCourtListener):
+        def get(self, url, params=None, timeout=None):
+            if "cursor=" in url:
+                requested.set()
+                release.wait(10)
+            return super().get(url, params, timeout)
+
+    session = SlowSecondPage([opinion(i, "2024-01-01T00:00:00Z") for i in range(4)])
+    start = time.perf_counter()
+    saved = data_agent.ingest_opinions(limit=2, stream_path=str(tmp_path / "cases.jsonl"),
+                                       checkpoint_path=str(tmp_path / "checkpoints" / "ca9.json"),
+                                       session=session, prefetch=True)
+    elapsed = time.perf_counter() - start
+    release.set()
+    assert saved == 2
+    assert requested.wait(1) and elapsed < 5
+
+def test_mock_courtlistener_ids_are_stable_across_processes():
+    code = ("from benchmarks.mock_courtlistener import MockCourtListener; "
+            "print([r['id'] for r in MockCourtListener().page('ca9', 0, 3, 'http://x')['results']])")
+    runs = [subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                           env={**os.environ, "PYTHONHASHSEED": seed}, check=True).stdout for seed in ("1", "2")]
+    assert runs[0] == runs[1]
+
+def test_courts_sharing_a_stream_write_each_case_once(tmp_path, monkeypatch):
+    opinions = [opinion(i, f"2024-01-{1 + i:02d}T00:00:00Z") for i in range(4)]
+    courts = {0: "ca9", 1: "ca9", 2: "cal", 3: "cal"}
+    monkeypatch.setattr(data_agent, "CHECKPOINT_PATH", str(tmp_path / "checkpoints" / "{court}.json"))
+    stream_path = str(tmp_path / "cases.jsonl")
+
+    session = FakeCourtListener(opinions, courts)
+    monkeypatch.setattr(data_agent, "make_session", lambda pool_size=None: session)
+    assert data_agent.fetch_courts(["ca9", "cal"], incremental=True, prefetch=False, stream_path=stream_path) == 4
+    assert sorted(q[data_agent.COURT_PARAM] for q in session.queries) == ["ca9", "cal"]
+    assert sorted(stream_ids(tmp_path)) == [0, 1, 2, 3]
+
+    # A server that ignores the court filter hands both courts every opinion, plus a new one
+    opinions.append(opinion(4, "2024-01-05T00:00:00Z"))
+    session = FakeCourtListener(opinions, courts, ignore_court=True)
+    assert data_agent.fetch_courts(["ca9", "cal"], incremental=True, prefetch=False, stream_path=stream_path) == 1
+    assert sorted(stream_ids(tmp_path)) == [0, 1, 2, 3, 4]
+    assert [c["case_id"] for c in data_agent.fetch_courts(["ca9", "cal"], prefetch=False)] == [0, 1, 2, 3, 4]
@@ -0,0 +1,125 @@
+import os
+import pickle
+
+import faiss
+import numpy as np
+import pytest
+
+from llm import retriever
+from llm.embedding_store import EmbeddingSpool, read_manifest
+
+def fixture_index(n, dtype, first_id=0, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype("float32")
+    ids = np.arange(first_id, first_id + n, dtype="int64")
+    metadata = retriever.empty_metadata("flat", dtype)
+    for passage_id in ids.tolist():
+        case_id = f"case-{passage_id}"
+        metadata["cases"][case_id] = {"hash": "", "ids": [passage_id]}
+        metadata["passages"][passage_id] = {"case_id": case_id, "case_name": case_id, "chunk_id": 0, "start": 0, "end": 1}
+    metadata["next_id"] = first_id + n
+    index = retriever.make_index("flat", vectors, dtype)
+    index.add_with_ids(vectors, ids)
+    return index, metadata, vectors
+
+def save(tmp_path, index, metadata, vectors):
+    spool = EmbeddingSpool(str(tmp_path))
+    spool.append(np.asarray(list(metadata["passages"]), dtype="int64"), vectors)
+    try:
+        return retriever.save_index(index, metadata, str(tmp_path / "index"), spool)
+    finally:
+        spool.discard()
+
+@pytest.mark.parametrize("dtype, code_size", [("float32", 128), ("float16", 64), ("int8", 32)])
+def test_open_index_serves_the_configured_dtype(tmp_path, dtype, code_size):
+    index, metadata, vectors = fixture_index(500, dtype)
+    manifest = save(tmp_path, index, metadata, vectors)
+    assert manifest["dtypes"] == ["float32"] and manifest["index_dtype"] == dtype
+
+    served, served_metadata = retriever.open_index(str(tmp_path / "index"))
+    assert faiss.downcast_index(served.index).code_size == code_size  # Bytes per stored vector
+    assert served_metadata["index_dtype"] == dtype
+    assert not isinstance(served_metadata["passages"], dict)  # Served from the store, not the pickle
+    _, found = served.search(vectors[:20], 1)
+    assert (found[:, 0] == np.arange(20)).mean() >= 0.95
+
+def test_store_from_an_interrupted_save_isnt_trusted(tmp_path):
+    path = str(tmp_path / "index")
+    save(tmp_path, *fixture_index(50, "float32"))
+
+    # Same passage count, different IDs: saved up to the pickle, then the process died before the store
+    index, metadata, _ = fixture_index(50, "float32", first_id=1000, seed=1)
+    faiss.write_index(index, os.path.join(path, "index.faiss"))
+    with open(os.path.join(path, "index.pkl"), "wb") as f:
+        pickle.dump(metadata, f)
+    assert read_manifest(os.path.join(path, retriever.STORE_DIR))["index_ntotal"] == index.ntotal
+
+    served, served_metadata = retriever.open_index(path)
+    assert isinstance(served_metadata["passages"], dict) and min(served_metadata["passages"]) == 1000
+    _, found = served.search(np.zeros((1, 32), dtype="float32"), 3)
+    assert all(passage_id in served_metadata["passages"] for passage_id in found[0])
+
+def test_index_file_with_another_mtime_falls_back_to_the_pickle(tmp_path):
+    save(tmp_path, *fixture_index(50, "float32"))
+    index_file = str(tmp_path / "index" / "index.faiss")
+    os.utime(index_file, ns=(0, 0))
+    _, served_metadata = retriever.open_index(str(tmp_path / "index"))
+    assert isinstance(served_metadata["passages"], dict)
+
+def update(tmp_path, index, metadata, added, removed):
+    """An incremental save like retriever.main's: the spool holds only the passages added this run."""
+    store = retriever.open_store(str(tmp_path / "index"))
+    retriever.delete_cases(index, metadata, removed)
+    new_ids = np.arange(metadata["next_id"], metadata["next_id"] + len(added), dtype="int64")
+    for passage_id in new_ids.tolist():
+        metadata["cases"][f"case-{passage_id}"] = {"hash": "", "ids": [passage_id]}
+        metadata["passages"][passage_id] = {"case_id": f"case-{passage_id}", "chunk_id": 0, "start": 0, "end": 1}
+    metadata["next_id"] += len(added)
+    index.add_with_ids(added, new_ids)
+    spool = EmbeddingSpool(str(tmp_path))
+    spool.append(new_ids, added)
+    try:
+        return retriever.save_index(index, metadata, str(tmp_path / "index"), spool, store=store)
+    finally:
+        spool.discard()
+
+def test_incremental_saves_append_only_the_new_rows(tmp_path):
+    index, metadata, vectors = fixture_index(50, "float32")
+    save(tmp_path, index, metadata, vectors)
+    matrix = tmp_path / "index" / retriever.STORE_DIR / "embeddings.float32.npy"
+    inode = os.stat(matrix).st_ino
+
+    added = np.random.default_rng(2).normal(size=(10, 32)).astype("float32")
+    manifest = update(tmp_path, index, metadata, added, ["case-0", "case-1"])
+    assert os.stat(matrix).st_ino == inode  # Extended in place, not rewritten
+    assert manifest["count"] == 60 and np.load(matrix).shape == (60, 32)
+
+    store = retriever.open_store(str(tmp_path / "index"))
+    assert len(store) == 58
+    ids, rows = zip(*store.live_rows(chunk_rows=7))
+    assert np.concatenate(ids).tolist() == list(range(2, 60))
+    assert np.array_equal(np.concatenate(rows), np.vstack([vectors[2:], added]))
+    _, found = store.search(vectors[:2], 1)
+    assert 0 not in found and 1 not in found
+    rebuilt = retriever.index_from_store(store, "flat", dtype="float32")
+    assert rebuilt.ntotal == 58
+    _, served_metadata = retriever.open_index(str(tmp_path / "index"))
+    assert not isinstance(served_metadata["passages"], dict) and len(served_metadata["passages"]) == 58
+
+    # Once dead rows pass MAX_DEAD_FRACTION, the store is rewritten with only the live ones
+    manifest = update(tmp_path, index, metadata, added[:1], [f"case-{i}" for i in range(2, 30)])
+    assert manifest["count"] == 31 and os.stat(matrix).st_ino != inode
+    store = retriever.open_store(str(tmp_path / "index"))
+    assert np.array_equal(np.concatenate([rows for _, rows in store.live_rows()]),
+                          np.vstack([vectors[30:], added, added[:1]]))
+
+@pytest.mark.parametrize("kind, dtype", [("ivf_flat", "float32"), ("ivf_pq", "float16"), ("flat", "int8")])
+def test_trained_layouts_with_no_passages_fall_back_to_flat(kind, dtype):
+    class Embedder:
+        def get_sentence_embedding_dimension(self):
+            return 32
+
+    index, metadata = retriever.build_index([], Embedder(), kind, dtype=dtype)
+    assert index.is_trained and index.ntotal == 0
+    assert (metadata["index_kind"], metadata["index_dtype"]) == ("flat", "float32")
+    index.add_with_ids(np.ones((2, 32), dtype="float32"), np.array([0, 1]))
+    assert index.search(np.ones((1, 32), dtype="float32"), 2)[1].tolist() == [[0, 1]]
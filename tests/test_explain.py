@@ -0,0 +1,26 @@
+import json
+
+import numpy as np
+
+from ml import explain
+from ml.feature_spec import FEATURE_COLUMNS
+
+def booster_threads():
+    config = json.loads(explain._explainer.model.original_model.save_config())
+    return int(config["learner"]["generic_param"]["nthread"])
+
+def test_explainer_booster_gets_its_share_of_the_cores(monkeypatch):
+    explain._load_explainer(1)
+    assert booster_threads() == 1
+
+    monkeypatch.setattr(explain.os, "cpu_count", lambda: 8)
+    X = np.random.default_rng(0).uniform(0, 50_000, size=(10, len(FEATURE_COLUMNS))).astype(np.float32)
+    values, _ = explain.compute_shap_values(X, workers=1, chunk_rows=5)
+    assert booster_threads() == 8 and values.shape == X.shape
+
+def test_worker_pool_matches_the_single_process_values():
+    X = np.random.default_rng(1).uniform(0, 50_000, size=(40, len(FEATURE_COLUMNS))).astype(np.float32)
+    single, base = explain.compute_shap_values(X, workers=1, chunk_rows=10)
+    pooled, pooled_base = explain.compute_shap_values(X, workers=2, chunk_rows=10)
+    np.testing.assert_allclose(pooled, single, rtol=1e-5)
+    assert pooled_base == base
@@ -0,0 +1,17 @@
+import pyarrow as pa
+
+from ml.feature_spec import FEATURE_COLUMNS, frame_features, row_features
+
+def test_long_bare_injury_strings_count_without_overflow():
+    long_text = "soft tissue damage to the lower back; " * 1000
+    cases = [{"injuries": long_text}, {"injuries": ["whiplash", "spinal fracture"]}, {"injuries": None}]
+    expected = [row_features(case)[0] for case in cases]
+    assert expected[0] > 32767
+
+    assert frame_features(cases)["num_injuries"].tolist() == expected
+    table = pa.table({"injuries": pa.array([long_text, "burn"])})
+    assert frame_features(table)["num_injuries"].tolist() == [len(long_text), 4]
+    # Mixed types take the row-by-row path
+    mixed = [{"injuries": long_text}, {"injuries": ["burn", 3]}]
+    assert frame_features(mixed)["num_injuries"].tolist() == [len(long_text), 2]
+    assert list(frame_features(cases).columns) == list(FEATURE_COLUMNS)
@@ -0,0 +1,31 @@
+import gzip
+
+import pytest
+
+from utils.io_helpers import append_jsonl, iter_jsonl, write_cases
+
+MAGIC = {".gz": b"\x1f\x8b", ".zst": b"\x28\xb5\x2f\xfd"}
+
+@pytest.mark.parametrize("ext", [".gz", ".zst"])
+def test_compressed_jsonl_round_trips_across_appends(tmp_path, ext):
+    if ext == ".zst":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / f"cases.jsonl{ext}")
+    first = [{"case_id": i, "full_text": "Plaintiff's café injury — " * i} for i in range(3)]
+    second = [{"case_id": 3, "injuries": ["whiplash"]}]
+
+    append_jsonl(first, path)
+    append_jsonl(second, path)  # A second gzip member / zstd frame
+    with open(path, "rb") as f:
+        assert f.read(4).startswith(MAGIC[ext])
+    assert list(iter_jsonl(path)) == first + second
+
+    assert write_cases(iter(second), path) == 1
+    assert list(iter_jsonl(path)) == second
+    assert not list(tmp_path.glob("*.tmp*"))
+
+def test_gzip_jsonl_reads_files_written_by_other_tools(tmp_path):
+    path = str(tmp_path / "cases.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write('{"case_id": 1}\n\n{"case_id": 2}')
+    assert list(iter_jsonl(path)) == [{"case_id": 1}, {"case_id": 2}]
@@ -0,0 +1,53 @@
+import os
+
+os.environ.setdefault("COURTLISTENER_API_KEY", "test")
+
+from agents import data_agent, label_cases
+from utils.keyword_matcher import KeywordMatcher, RelevanceFilter
+
+TEXTS = [
+    "",
+    "The court held that the appellant's claim fails.",
+    "Plaintiff suffered a BRAIN INJURY caused by the defendant's NEGLIGENCE.",
+    "Negligence and medical malpractice claims; damages awarded for wrongful death.",
+    "Personal injury claim, but this appeal concerns child custody.",
+    "A slip and fall, injury and damages; appeal deniedamages.",
+    "injuryinjuryinjury negligencenegligence",
+    "Injury. " * 50 + "Divorce",
+]
+
+# The filters as they were before the shared matcher
+def original_is_relevant_text(text):
+    text = text.lower()
+    pos = sum(kw in text for kw in label_cases.RELEVANT_KEYWORDS)
+    neg = any(kw in text for kw in label_cases.IRRELEVANT_KEYWORDS)
+    return pos >= 2 and not neg
+
+def original_is_likely_personal_injury(text):
+    if not text:
+        return False
+    text = text.lower()
+    return (sum(kw in text for kw in data_agent.PI_KEYWORDS) >= 2
+            and not any(kw in text for kw in data_agent.PI_EXCLUSION_KEYWORDS))
+
+def test_relevance_filters_match_the_original_checks():
+    for text in TEXTS:
+        assert label_cases.is_relevant_text(text) == original_is_relevant_text(text), text
+        assert data_agent.is_likely_personal_injury(text) == original_is_likely_personal_injury(text), text
+    # The fixed inputs exercise both outcomes
+    assert {label_cases.is_relevant_text(text) for text in TEXTS} == {True, False}
+
+def test_hit_counts_match_str_count_for_nested_and_straddling_keywords():
+    keywords = ["injury", "brain injury", "in", "jury", "appeal denied", "damages", "ages", "deniedam"]
+    matcher = KeywordMatcher(keywords + ["INJURY", ""])
+    assert matcher.keywords == ("injury", "brain injury", "in", "jury", "appeal denied", "damages", "ages", "deniedam")
+    for text in TEXTS + ["aaaa", "brain injuryinjury", "appeal deniedamages appeal denied damages"]:
+        text = text.lower()
+        expected = {kw: text.count(kw) for kw in matcher.keywords if kw in text}
+        assert matcher.hit_counts(text) == expected, text
+
+def test_relevance_filter_hit_counts_split_include_and_exclude():
+    check = RelevanceFilter(["injury", "negligence"], ["custody", "injury law"], min_hits=2)
+    counts = check.hit_counts("Injury, injury law and NEGLIGENCE; no custody. Injury.")
+    assert counts == {"include": {"injury": 3, "negligence": 1}, "exclude": {"custody": 1, "injury law": 1}}
+    assert check.hit_counts("") == {"include": {}, "exclude": {}}
@@ -0,0 +1,46 @@
+import json
+import threading
+
+from utils.llm_cache import LLMCache
+
+def test_replies_that_fail_validation_are_not_cached(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite"))
+    replies = iter(["Sorry, I can't help with that.", '{"injuries": ["whiplash"]}'])
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return next(replies)
+
+    def parses(reply):
+        try:
+            return isinstance(json.loads(reply), dict)
+        except ValueError:
+            return False
+
+    assert cache.get_or_compute("k", compute, validate=parses) == "Sorry, I can't help with that."
+    assert cache.get("k") is None
+    assert cache.get_or_compute("k", compute, validate=parses) == '{"injuries": ["whiplash"]}'
+    assert cache.get_or_compute("k", compute, validate=parses) == '{"injuries": ["whiplash"]}'
+    assert len(calls) == 2
+
+def test_cached_reply_that_fails_validation_is_recomputed(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite"))
+    cache.put("k", "garbage")
+    assert cache.get_or_compute("k", lambda: '{"ok": true}', validate=lambda reply: reply.startswith("{")) == '{"ok": true}'
+    assert cache.get("k") == '{"ok": true}'
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_bypass_counts_every_concurrent_miss(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite"), bypass=True)
+
+    def lookups():
+        for _ in range(2000):
+            cache.get("k")
+
+    threads = [threading.Thread(target=lookups) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["misses"] == 8000
@@ -0,0 +1,45 @@
+import threading
+import time
+
+import pytest
+
+from utils.llm_engine import map_ordered
+
+def test_results_come_back_in_input_order_when_later_items_finish_first():
+    finished = []
+    lock = threading.Lock()
+
+    def slow_for_early_items(i):
+        time.sleep((8 - i) * 0.01)
+        with lock:
+            finished.append(i)
+        return i * i
+
+    assert list(map_ordered(slow_for_early_items, range(8), concurrency=8)) == [(i, i * i) for i in range(8)]
+    assert finished[0] > finished[-1]  # The last item really did finish first
+
+def test_input_is_pulled_only_a_bounded_window_ahead():
+    pulled = []
+
+    def items():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    results = map_ordered(lambda i: i, items(), concurrency=2)
+    assert next(results) == (0, 0)
+    assert len(pulled) <= 4
+    assert [i for i, _ in results] == list(range(1, 100))
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_an_exception_in_one_item_propagates_after_the_earlier_results(concurrency):
+    def fn(i):
+        if i == 3:
+            raise ValueError("bad item 3")
+        return i
+
+    seen = []
+    with pytest.raises(ValueError, match="bad item 3"):
+        for item, result in map_ordered(fn, range(10), concurrency=concurrency):
+            seen.append(result)
+    assert seen == [0, 1, 2]
@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+import xgboost as xgb
+
+from ml.model_artifact import TreeArrayModel
+
+def test_tree_arrays_match_the_booster_with_missing_values(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 5)).astype(np.float32)
+    y = 3 * X[:, 0] - 2 * X[:, 1] + X[:, 2] * X[:, 3] + rng.normal(scale=0.1, size=400)
+    # Missing feature 0 looks like a large value, missing feature 1 like a small one,
+    # so training sends missing rows right on some splits and left on others
+    X[rng.random(400) < 0.2, 0] = np.nan
+    y[np.isnan(X[:, 0])] += 5
+    X[rng.random(400) < 0.2, 1] = np.nan
+    y[np.isnan(X[:, 1])] += 5
+    booster = xgb.train({"objective": "reg:squarederror", "max_depth": 4, "eta": 0.3, "base_score": 1.5},
+                        xgb.DMatrix(X, label=y), num_boost_round=20)
+
+    model = TreeArrayModel.from_booster_json(json.loads(booster.save_raw("json")))
+    assert model.default_left[model.left != np.arange(len(model.left))].any()
+    assert not model.default_left[model.left != np.arange(len(model.left))].all()
+
+    X_test = rng.normal(size=(200, 5)).astype(np.float32)
+    X_test[rng.random((200, 5)) < 0.3] = np.nan
+    X_test[0] = np.nan
+    expected = booster.predict(xgb.DMatrix(X_test))
+    np.testing.assert_allclose(model.predict(X_test), expected, rtol=1e-5, atol=1e-5)
+
+    model.save(tmp_path / "trees.npz")
+    loaded = TreeArrayModel.load(tmp_path / "trees.npz")
+    np.testing.assert_allclose(loaded.predict(X_test), expected, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(loaded.predict(X_test[3]), expected[3:4], rtol=1e-5, atol=1e-5)
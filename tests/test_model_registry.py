@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from ml.feature_spec import FEATURE_COLUMNS, model_metadata
+from ml.model_artifact import BoosterModel, export_model
+from ml.model_registry import ModelRegistry, list_versions, publish_version
+
+def fit_tiny_model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(64, len(FEATURE_COLUMNS))).astype(np.float32)
+    model = xgb.XGBRegressor(n_estimators=5, max_depth=2)
+    model.fit(X, X[:, 2] * 3)
+    return model, X
+
+def publish_tiny(tmp_path, root, version, with_pickle=True):
+    model, X = fit_tiny_model()
+    artifacts = export_model(model.get_booster(), str(tmp_path / f"{version}.ubj"), str(tmp_path / f"{version}.npz"))
+    if with_pickle:
+        artifacts["pickle"] = str(tmp_path / f"{version}.pkl")
+        joblib.dump(model, artifacts["pickle"])
+    publish_version(artifacts, model_metadata(), version=version, root=root)
+    return model, X
+
+def test_pickle_backend_serves_published_versions(tmp_path):
+    root = str(tmp_path / "registry")
+    model, X = publish_tiny(tmp_path, root, "v1")
+    registry = ModelRegistry(root, backend="pickle")
+    entry, _ = registry.get()
+    assert entry.version == "v1"
+    assert isinstance(entry.model, xgb.XGBRegressor)
+    np.testing.assert_allclose(entry.model.predict(X[:4]), model.predict(X[:4]))
+
+def test_pickle_backend_falls_back_to_the_booster(tmp_path):
+    root = str(tmp_path / "registry")
+    model, X = publish_tiny(tmp_path, root, "v1", with_pickle=False)
+    entry, _ = ModelRegistry(root, backend="pickle").get()
+    assert isinstance(entry.model, BoosterModel)
+    np.testing.assert_allclose(entry.model.predict(X[:4]), model.predict(X[:4]), rtol=1e-5)
+
+def test_concurrent_refreshes_load_each_version_once(tmp_path, monkeypatch):
+    root = str(tmp_path / "registry")
+    publish_tiny(tmp_path, root, "v1")
+    registry = ModelRegistry(root, backend="xgboost")
+    publish_tiny(tmp_path, root, "v2")
+
+    loads = []
+    load_entry = registry._load_entry
+
+    def slow_load(version):
+        loads.append(version)
+        time.sleep(0.2)
+        return load_entry(version)
+
+    monkeypatch.setattr(registry, "_load_entry", slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.refresh())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["v2"]
+    assert sorted(results) == [False, False, False, True]
+    assert registry.get()[0].version == "v2"
+
+def test_admin_endpoints_refuse_without_a_configured_token(monkeypatch):
+    from fastapi import HTTPException
+    from app import api
+
+    monkeypatch.setattr(api, "ADMIN_TOKEN", None)
+    with pytest.raises(HTTPException) as refused:
+        api.check_admin("anything")
+    assert refused.value.status_code == 403
+
+    monkeypatch.setattr(api, "ADMIN_TOKEN", "s3cret")
+    with pytest.raises(HTTPException):
+        api.check_admin("wrong")
+    with pytest.raises(HTTPException):
+        api.check_admin(None)
+    api.check_admin("s3cret")
+
+def test_versions_published_in_the_same_second_get_distinct_names(tmp_path):
+    root = str(tmp_path / "registry")
+    model, _ = fit_tiny_model()
+    artifacts = export_model(model.get_booster(), str(tmp_path / "m.ubj"), str(tmp_path / "m.npz"))
+    versions = [publish_version(artifacts, model_metadata(), root=root) for _ in range(3)]
+    assert len(set(versions)) == 3 and list_versions(root) == versions
+
+    with pytest.raises(FileExistsError):
+        publish_version(artifacts, model_metadata(), version=versions[0], root=root)
+    assert sorted(os.listdir(root)) == sorted(versions + ["ACTIVE"])
@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+
+from app.prediction_cache import PredictionCache
+
+def keys(n, model="m1"):
+    X = np.arange(n * 2, dtype=np.float32).reshape(n, 2)
+    return PredictionCache.make_keys("predict", model, X)
+
+def test_batches_use_one_store_transaction_and_share_entries_across_workers(tmp_path):
+    store = str(tmp_path / "predictions.sqlite")
+    writer, reader = PredictionCache(store_path=store), PredictionCache(store_path=store)
+    statements = []
+    writer.store.set_trace_callback(statements.append)
+
+    batch = keys(2000)
+    writer.put_many([(key, float(i)) for i, key in enumerate(batch)])
+    assert sum(s.startswith("INSERT") for s in statements) == 2000
+    assert sum(s == "COMMIT" for s in statements) == 1
+
+    reader.store.set_trace_callback(statements.append)
+    statements.clear()
+    values = reader.get_many(batch[:1500] + keys(3, model="m2"))
+    assert values == [float(i) for i in range(1500)] + [None] * 3
+    assert sum(s.startswith("SELECT") for s in statements) == 4  # 1503 keys, 500 per query
+    assert reader.stats()["store_hits"] == 1500 and reader.stats()["misses"] == 3
+
+def test_large_batches_dont_evict_the_in_memory_entries():
+    cache = PredictionCache(max_entries=100, batch_rows=50)
+    single = keys(1, model="single")[0]
+    cache.put(single, 1.0)
+
+    cache.put_many([(key, 2.0) for key in keys(500)])
+    assert cache.get_many(keys(500)) == [None] * 500
+    assert cache.get(single) == 1.0 and cache.stats()["evictions"] == 0
+
+    cache.put_many([(key, 3.0) for key in keys(20)])
+    assert cache.get_many(keys(20)) == [3.0] * 20
+
+def test_store_purges_expired_rows_and_keeps_at_most_store_rows(tmp_path):
+    cache = PredictionCache(store_path=str(tmp_path / "predictions.sqlite"), store_rows=5, purge_seconds=0)
+    count = lambda: cache.store.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    cache.store.execute("INSERT INTO predictions VALUES (x'00', 'm0', '0', 0)")  # Long expired
+    for i, key in enumerate(keys(8)):
+        cache.put(key, float(i))
+    assert count() == 5
+    # The soonest-expiring (oldest) rows went first
+    assert PredictionCache(store_path=str(tmp_path / "predictions.sqlite"), max_entries=10).get_many(keys(8)) == \
+        [None] * 3 + [3.0, 4.0, 5.0, 6.0, 7.0]
+
+def test_single_predictions_query_the_store_off_the_event_loop(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import api
+    from tests.test_batch_api import CASE
+
+    cache = PredictionCache(store_path=str(tmp_path / "predictions.sqlite"))
+    loops = []
+    get_many, put_many = cache.get_many, cache.put_many
+
+    def record(fn):
+        def call(*args):
+            try:
+                asyncio.get_running_loop()
+                loops.append(True)
+            except RuntimeError:
+                loops.append(False)
+            return fn(*args)
+        return call
+
+    monkeypatch.setattr(cache, "get_many", record(get_many))
+    monkeypatch.setattr(cache, "put_many", record(put_many))
+    monkeypatch.setattr(api, "prediction_cache", cache)
+    client = TestClient(api.app)
+    first = client.post("/predict", json=CASE).json()
+    assert client.post("/predict", json=CASE).json() == first
+    assert loops == [False, False, False]  # Lookup + insert, then a hit
@@ -0,0 +1,30 @@
+import time
+
+from utils.rate_limit import RateLimiter
+
+def test_daily_request_limit_is_not_taken_as_per_minute():
+    limiter = RateLimiter(rpm=30, tpm=6000)
+    # Groq: the request headers count per day, the token headers per minute
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "14400", "x-ratelimit-remaining-requests": "14370",
+        "x-ratelimit-reset-requests": "2m59.56s",
+        "x-ratelimit-limit-tokens": "18000", "x-ratelimit-remaining-tokens": "15000",
+        "x-ratelimit-reset-tokens": "10s",
+    })
+    assert 9.9 < limiter.requests.rate * 60 < 10.1
+    assert limiter.tokens.rate * 60 == 18000
+
+def test_per_minute_limits_are_adopted_and_an_empty_budget_pauses_until_reset():
+    limiter = RateLimiter(rpm=30, tpm=6000)
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "1m0s",
+    })
+    assert limiter.requests.rate * 60 == 60
+    assert limiter.requests.tokens <= 0
+    assert 59 < limiter.pause_until - time.monotonic() <= 60
+
+def test_headers_without_usage_leave_the_configured_rate_alone():
+    limiter = RateLimiter(rpm=30, tpm=6000)
+    limiter.update_from_headers({"x-ratelimit-limit-requests": "14400", "x-ratelimit-remaining-requests": "14400"})
+    assert limiter.requests.rate * 60 == 30
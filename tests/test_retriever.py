@@ -0,0 +1,93 @@
+import hashlib
+
+import faiss
+import numpy as np
+
+from llm import retriever
+
+class FakeEmbedder:
+    """Stands in for the sentence transformer: a fixed random vector per passage text."""
+
+    def __init__(self, dim=48):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        seeds = [int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little") for text in texts]
+        return np.array([np.random.default_rng(seed).normal(size=self.dim) for seed in seeds], dtype="float32")
+
+def case(case_id, text):
+    return {"case_id": case_id, "case_name": f"Case {case_id}", "full_text": text}
+
+def test_too_few_passages_for_pq_record_ivf_flat_and_relayout_once_there_are_enough():
+    cases = [case(i, f"passage number {i} about a slip and fall") for i in range(50)]
+    index, metadata = retriever.build_index(cases, FakeEmbedder(), "ivf_pq", dtype="float32")
+    assert (metadata["index_kind"], metadata["index_dtype"]) == ("ivf_flat", "float32")
+    assert faiss.downcast_index(faiss.try_extract_index_ivf(index)).__class__.__name__ == "IndexIVFFlat"
+    assert not retriever.needs_relayout(index, metadata, "ivf_pq", "float32")
+
+    # Enough passages to train the PQ codebooks: the recorded fallback no longer matches
+    for passage_id in range(2 ** retriever.PQ_BITS * 39):
+        metadata["passages"].setdefault(passage_id, {"case_id": passage_id})
+    assert retriever.needs_relayout(index, metadata, "ivf_pq", "float32")
+
+def test_ivf_lists_are_retrained_once_the_corpus_outgrows_them():
+    vectors = np.random.default_rng(0).normal(size=(400, 16)).astype("float32")
+    index = retriever.make_index("ivf_flat", vectors, "float32")
+    index.add_with_ids(vectors, np.arange(400, dtype="int64"))
+    assert faiss.try_extract_index_ivf(index).nlist == 400 // 39
+    assert not retriever.ivf_outgrown(index, 400)
+    assert retriever.ivf_outgrown(index, 4000)
+    assert not retriever.ivf_outgrown(retriever.make_index("flat", vectors), 4000)
+
+    # Sized for the whole corpus, not just the training sample
+    assert retriever.index_description("ivf_flat", 50_000, 16) == "IVF894,Flat"
+    assert retriever.index_description("ivf_flat", 1_000_000, 16, n_train=50_000) == "IVF1282,Flat"
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+def test_chunks_cover_the_text_with_the_configured_overlap():
+    text = "  " + words(95).replace(" w5 ", "\n\tw5  ") + " "
+    spans = [m.span() for m in retriever.WORD_RE.finditer(text)]
+    chunks = list(retriever.chunk_text(text, chunk_words=20, overlap=5))
+
+    word_at = {offset: i for i, span in enumerate(spans) for offset in span}
+    starts = [word_at[start] for start, _ in chunks]
+    ends = [word_at[end] for _, end in chunks]
+    assert starts == [0, 15, 30, 45, 60, 75]
+    assert ends == [19, 34, 49, 64, 79, 94]  # Each window shares 5 words with the next, the last ends the text
+    assert text[chunks[1][0]:chunks[1][1]].split() == text.split()[15:35]
+
+    assert list(retriever.chunk_text(words(7), chunk_words=20, overlap=5)) == [(0, len(words(7)))]
+    assert list(retriever.chunk_text(" \n ")) == []
+
+def indexed_ids(index):
+    return set(faiss.vector_to_array(index.id_map).tolist())
+
+def test_changed_cases_replace_their_passages_and_removed_cases_leave_the_index():
+    embedder = FakeEmbedder()
+    cases = [case(i, words(300, f"c{i}w")) for i in range(3)]
+    index, metadata = retriever.build_index(cases, embedder, "flat", dtype="float32")
+    old_ids = {i: list(metadata["cases"][i]["ids"]) for i in range(3)}
+    assert indexed_ids(index) == set(metadata["passages"]) and index.ntotal == 6
+
+    edited = case(1, words(500, "edited"))
+    changed, emptied = retriever.diff_cases(metadata, [cases[0], edited, cases[2]])
+    assert [c["case_id"] for c in changed] == [1] and emptied == []
+    retriever.upsert_cases(index, metadata, changed, embedder)
+
+    new_ids = metadata["cases"][1]["ids"]
+    assert not set(new_ids) & set(old_ids[1]) and len(new_ids) == 4
+    assert indexed_ids(index) == set(metadata["passages"]) == set(old_ids[0] + old_ids[2] + new_ids)
+    query = embedder.encode([edited["full_text"][slice(*next(retriever.chunk_text(edited["full_text"])))]])
+    _, found = index.search(query, 1)
+    assert metadata["passages"][int(found[0, 0])]["case_id"] == 1
+
+    # Losing its text or being deleted outright drops every passage of a case
+    _, emptied = retriever.diff_cases(metadata, [case(0, "")])
+    assert retriever.delete_cases(index, metadata, emptied + [2, 99]) == 4
+    assert indexed_ids(index) == set(metadata["passages"]) == set(new_ids)
+    assert list(metadata["cases"]) == [1] and index.ntotal == 4
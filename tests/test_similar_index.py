@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+
+from llm import retriever
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+FIXTURE = '''
+import numpy as np
+from llm import retriever
+
+def build(path, n_cases, seed, passages_per_case=2, dim=16):
+    rng = np.random.default_rng(seed)
+    metadata = retriever.empty_metadata("flat")
+    for case in range(n_cases):
+        ids = list(range(case * passages_per_case, (case + 1) * passages_per_case))
+        metadata["cases"][f"case-{case}"] = {"hash": "", "ids": ids}
+        for chunk_id, passage_id in enumerate(ids):
+            metadata["passages"][passage_id] = {
+                "case_id": f"case-{case}", "case_name": f"Case {case}", "source_url": "",
+                "jurisdiction": "cal", "date_filed": "2020-01-01", "chunk_id": chunk_id, "start": 0, "end": 10,
+            }
+    metadata["next_id"] = n_cases * passages_per_case
+    vectors = rng.normal(size=(metadata["next_id"], dim)).astype("float32")
+    index = retriever.make_index("flat", vectors)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    retriever.save_index(index, metadata, path)
+    return vectors
+'''
+
+def run_script(body, tmp_path):
+    script = FIXTURE + textwrap.dedent(body)
+    result = subprocess.run([sys.executable, "-c", script, str(tmp_path)], cwd=ROOT,
+                            capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT})
+    assert result.returncode == 0, f"exit {result.returncode}\n{result.stdout}\n{result.stderr}"
+    return result.stdout
+
+def test_rebuilding_the_index_under_a_mapped_reader(tmp_path):
+    # A SIGBUS would kill the interpreter, so the reader runs in its own process
+    out = run_script('''
+        import sys, os
+        path = os.path.join(sys.argv[1], "index")
+        vectors = build(path, 2000, seed=0)
+        index, metadata = retriever.open_index(path)
+        before = index.search(vectors[:5], 3)[1]
+        build(path, 10, seed=1)  # Much smaller file: an in-place rewrite would truncate the mapping
+        after = index.search(vectors[:5], 3)[1]
+        assert (before == after).all()
+        assert metadata["passages"].get(int(before[0][0]))["case_id"].startswith("case-")
+        fresh, _ = retriever.open_index(path)
+        assert fresh.ntotal == 20
+        print("ok")
+    ''', tmp_path)
+    assert out.strip().endswith("ok")
+
+class FakeEmbedder:
+    def get_sentence_embedding_dimension(self):
+        return 16
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        return np.ones((len(texts), 16), dtype="float32")
+
+def test_api_picks_up_an_index_built_after_startup(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import api
+    fixture = {}
+    exec(FIXTURE, fixture)
+    path = str(tmp_path / "index")
+    monkeypatch.setattr(retriever, "load_embedder", lambda: FakeEmbedder())
+    with api.similar_lock:
+        monkeypatch.setattr(api, "SIMILAR_INDEX_PATH", path)
+        monkeypatch.setattr(api, "similar_index", None)
+        monkeypatch.setattr(api, "similar_error", None)
+        monkeypatch.setattr(api, "similar_stamp", None)
+    client = TestClient(api.app)
+
+    response = client.post("/similar", json={"text": "rear-end collision", "k": 2})
+    assert response.status_code == 503
+
+    fixture["build"](path, 10, seed=0)
+    response = client.post("/similar", json={"text": "rear-end collision", "k": 2})
+    assert response.status_code == 200 and response.json()["count"] == 2
+    first = api.similar_index
+    assert first.index.ntotal == 20
+
+    fixture["build"](path, 3, seed=1)
+    assert api.load_similar_index() is not first
+    assert api.similar_index.index.ntotal == 6 and api.similar_index.embedder is first.embedder
+    assert api.load_similar_index() is api.similar_index  # Unchanged files aren't reopened
+    assert first.search([("x", 2, None)])[0]  # The swapped-out index still answers in-flight batches
+
+def test_filters_work_on_real_shaped_opinion_records(tmp_path):
+    os.environ.setdefault("COURTLISTENER_API_KEY", "test")
+    from agents import data_agent
+    from app.similar import SimilarCaseIndex, case_filter
+
+    text = "The plaintiff brought a personal injury action alleging negligence after a car accident. "
+    # Fields of a v4 /opinions/ record: no court, caseName or date_filed
+    records = {court: [{"id": case_id, "absolute_url": f"/opinion/{case_id}/", "cluster_id": 1000 + case_id,
+                        "date_created": created, "date_modified": created, "type": "010combined",
+                        "plain_text": text * 3}
+                       for case_id, created in cases]
+               for court, cases in {"cal": [(1, "2019-06-30T23:30:00-07:00"), (2, "2022-03-01T09:00:00-08:00")],
+                                    "ny": [(3, "2022-05-01T12:00:00-04:00")]}.items()}
+    cases = [case for court, page in records.items() for case in data_agent.filter_page(page, court)]
+    assert [(case["jurisdiction"], retriever.case_date(case)) for case in cases] == [
+        ("cal", "2019-06-30"), ("cal", "2022-03-01"), ("ny", "2022-05-01")]
+
+    path = str(tmp_path / "index")
+    retriever.save_index(*retriever.build_index(cases, FakeEmbedder(), "flat"), path)
+    similar = SimilarCaseIndex(path, embedder=FakeEmbedder())
+
+    def found(*filters):
+        return sorted(case["case_id"] for case in similar.search([("car crash", 5, case_filter(*filters))])[0])
+
+    assert found() == [1, 2, 3]
+    assert found("CAL") == [1, 2]
+    assert found(None, "2020-01-01") == [2, 3]
+    assert found("cal", "2019-06-30", "2019-06-30") == [1]
+    assert found("tex") == []
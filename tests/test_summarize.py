@@ -0,0 +1,106 @@
+import json
+
+import numpy as np
+
+from llm import retriever, summarize
+from utils.io_helpers import iter_jsonl
+
+def write_cases(path, cases):
+    with open(path, "w", encoding="utf-8") as f:
+        for case in cases:
+            f.write(json.dumps(case) + "\n")
+
+def run(tmp_path, monkeypatch, cases):
+    input_path, output_path = tmp_path / "cases.jsonl", tmp_path / "summaries.jsonl"
+    write_cases(input_path, cases)
+    monkeypatch.setattr(summarize, "INPUT_PATH", str(input_path))
+    monkeypatch.setattr(summarize, "OUTPUT_PATH", str(output_path))
+    sent = []
+
+    def fake_summarize(case, rag=None):
+        sent.append(case["case_id"])
+        return f"{case['case_id']} settled for {case['settlement_amount']}"
+
+    monkeypatch.setattr(summarize, "summarize", fake_summarize)
+    summarize.main(concurrency=2, write_store=False)
+    return sent, {row["case_id"]: row for row in iter_jsonl(str(output_path))}
+
+def test_resume_redoes_relabeled_cases_and_drops_removed_ones(tmp_path, monkeypatch):
+    cases = [{"case_id": f"c{i}", "full_text": f"Opinion {i}", "settlement_amount": 1000 * i} for i in range(4)]
+    sent, rows = run(tmp_path, monkeypatch, cases)
+    assert sorted(sent) == ["c0", "c1", "c2", "c3"] and len(rows) == 4
+
+    sent, rows = run(tmp_path, monkeypatch, cases)
+    assert sent == []
+
+    # The label stage relabels c1 (same text, new labels) and drops c3
+    cases[1] = {**cases[1], "settlement_amount": 99_999}
+    sent, rows = run(tmp_path, monkeypatch, cases[:3])
+    assert sent == ["c1"]
+    assert sorted(rows) == ["c0", "c1", "c2"]
+    assert rows["c1"]["settlement_amount"] == 99_999 and "99999" in rows["c1"]["summary"]
+    assert sum(1 for _ in iter_jsonl(str(tmp_path / "summaries.jsonl"))) == 3
+
+class FakeEmbedder:
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        single = isinstance(texts, str)
+        vectors = np.array([[len(text) % (i + 2) for i in range(8)] for text in ([texts] if single else texts)],
+                           dtype="float32")
+        return vectors[0] if single else vectors
+
+def test_rag_prompt_falls_back_when_the_case_changed_since_indexing(monkeypatch):
+    case = {"case_id": "c1", "case_name": "Doe v. Roe", "full_text": " ".join(f"word{i}" for i in range(600))}
+    embedder = FakeEmbedder()
+    index, metadata = retriever.build_index([case], embedder, kind="flat")
+    monkeypatch.setattr(summarize, "load_faiss_index", lambda: (index, metadata))
+    monkeypatch.setattr(retriever, "load_embedder", lambda: embedder)
+    prompts = []
+    monkeypatch.setattr(summarize, "summarize_case",
+                        lambda text, template=summarize.SUMMARY_PROMPT, max_chars=3000: prompts.append((text, template)))
+    rag = summarize.RagContext()
+
+    assert rag.build(case).split()[0] in case["full_text"].split()
+    summarize.summarize(case, rag)
+    assert prompts[-1][1] == summarize.RAG_PROMPT
+
+    edited = {**case, "full_text": "Settled after a short trial. " + case["full_text"]}
+    assert rag.build(edited) is None and rag.stale == 1
+    summarize.summarize(edited, rag)
+    assert prompts[-1] == (edited["full_text"], summarize.SUMMARY_PROMPT)
+
+def rag_context(monkeypatch, cases, **kwargs):
+    embedder = FakeEmbedder()
+    index, metadata = retriever.build_index(cases, embedder, kind="flat")
+    monkeypatch.setattr(summarize, "load_faiss_index", lambda: (index, metadata))
+    monkeypatch.setattr(retriever, "load_embedder", lambda: embedder)
+    return summarize.RagContext(**kwargs)
+
+def test_precedent_excerpts_are_read_from_the_input_only_for_the_hits(tmp_path, monkeypatch):
+    cases = [{"case_id": f"c{i}", "case_name": f"Case {i}", "full_text": f"Case {i} opinion text " * (i + 5)}
+             for i in range(3)]
+    input_path = tmp_path / "cases.jsonl"
+    write_cases(input_path, cases)
+    rag = rag_context(monkeypatch, cases, input_path=str(input_path), precedents=2)
+    assert rag.texts.texts is None and sorted(rag.texts.offsets) == ["c0", "c1", "c2"]
+
+    prompt = rag.build(cases[0])
+    precedents = prompt.split("SIMILAR PRECEDENTS")[1]
+    assert "- Case 1: Case 1 opinion text" in precedents and "- Case 2: Case 2 opinion text" in precedents
+    assert "Case 0" not in precedents
+    assert rag.texts.get("c2") == cases[2]["full_text"] and rag.texts.get("missing") == ""
+
+def test_no_retrieved_passages_fall_back_to_the_plain_prompt(monkeypatch):
+    case = {"case_id": "c1", "case_name": "Doe v. Roe", "full_text": "Plaintiff slipped on a wet floor."}
+    rag = rag_context(monkeypatch, [case])
+    monkeypatch.setattr(retriever, "search_case_passages", lambda *args, **kwargs: [])
+    assert rag.build(case) is None
+
+def test_stale_cases_are_counted_across_worker_threads(monkeypatch):
+    case = {"case_id": "c1", "case_name": "Doe v. Roe", "full_text": "Plaintiff slipped on a wet floor."}
+    rag = rag_context(monkeypatch, [case])
+    edited = {**case, "full_text": "Plaintiff fell down the stairs."}
+    results = list(summarize.map_ordered(rag.build, [edited] * 400, concurrency=8))
+    assert all(prompt is None for _, prompt in results) and rag.stale == 400
@@ -0,0 +1,40 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from ml import train_model
+
+def test_cv_needs_two_folds_and_rows():
+    with pytest.raises(ValueError, match="2 folds"):
+        train_model.cv_splits(100, 1, 0)
+    with pytest.raises(ValueError, match="2 rows"):
+        train_model.cv_splits(1, 5, 0)
+    assert len(train_model.cv_splits(3, 5, 0)) == 3
+
+def test_default_workers_stay_within_the_memory_budget(monkeypatch):
+    monkeypatch.setattr(train_model.os, "cpu_count", lambda: 32)
+    assert train_model.search_workers(1e6, 5, trials=100, memory_gb=8) == 32
+    # 6 x 200 MB per worker: 6 fit in 8 GB
+    assert train_model.search_workers(200e6, 5, trials=100, memory_gb=8) == 6
+    assert train_model.search_workers(20e9, 5, trials=100, memory_gb=8) == 1
+    assert train_model.search_workers(200e6, 5, trials=100, workers=16, memory_gb=8) == 16
+    assert train_model.search_workers(1e6, 5, trials=3, memory_gb=8) == 3
+
+def test_search_workers_are_spawned(tmp_path, monkeypatch):
+    contexts = []
+
+    class RecordingPool(train_model.ProcessPoolExecutor):
+        def __init__(self, *args, mp_context=None, **kwargs):
+            contexts.append(mp_context.get_start_method() if mp_context else multiprocessing.get_start_method())
+            super().__init__(*args, mp_context=mp_context, **kwargs)
+
+    monkeypatch.setattr(train_model, "ProcessPoolExecutor", RecordingPool)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, len(train_model.FEATURE_COLUMNS)))
+    y = 1000 * X[:, 0] + rng.normal(size=200)
+    results = train_model.search(X, y, trials=2, folds=2, workers=2,
+                                 leaderboard_path=str(tmp_path / "leaderboard.jsonl"))
+    assert contexts == ["spawn"]
+    assert sorted(r["trial"] for r in results) == [0, 1]
+    assert results[0]["cv_mae"] <= results[1]["cv_mae"]
@@ -1,6 +1,20 @@
 import os
+import io
+import glob
+import gzip
 import json
+import shutil
+from itertools import islice
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Large free-text columns live in their own files so numeric reads never touch them
+CASE_TEXT_COLUMNS = ("full_text", "summary")
+CASE_KEY = "case_id"
+STORE_BATCH_ROWS = 10_000
+FSYNC_EVERY = 100  # Records written between fsyncs by append_cases
 
 def load_json(path):
     """Load a JSON file (list of dicts)."""
@@ -27,3 +41,288 @@ def save_csv(df, path):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     df.to_csv(path, index=False)
     print(f"✅ Saved CSV to {path}")
+
+def append_jsonl(records, path):
+    """Append dicts to a JSON Lines file, one per line, flushing to disk."""
+    append_cases(records, path, fsync_every=None)
+
+def iter_jsonl(path):
+    """Yield dicts from a JSON Lines file without loading it whole."""
+    return iter_cases(path)
+
+def _open_text(path, mode):
+    """Text handle for `path`, (de)compressing by extension: .gz (gzip) or .zst (zstandard)."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("❌ .zst files need the zstandard package: pip install zstandard")
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        else:
+            # Each append adds a new frame; readers decode across frames
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def iter_cases(path):
+    """Yield case dicts one at a time from .jsonl / .jsonl.gz / .jsonl.zst.
+
+    A legacy .json list is still accepted, but has to be parsed whole.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ File not found: {path}")
+    if path.endswith(".json"):
+        yield from load_json(path)
+        return
+    with _open_text(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def append_cases(cases, path, fsync_every=FSYNC_EVERY):
+    """Append any iterable of dicts as JSON Lines (compressed by extension); returns the count.
+
+    The file is flushed and fsynced every `fsync_every` records and at the end,
+    so a crash loses at most one batch.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+    with _open_text(path, "a") as f:
+        for case in cases:
+            f.write(json.dumps(case, ensure_ascii=False) + "\n")
+            count += 1
+            if fsync_every and count % fsync_every == 0:
+                _sync(f)
+        _sync(f)
+    return count
+
+def write_cases(cases, path, fsync_every=FSYNC_EVERY):
+    """Stream an iterable of dicts to a fresh JSON Lines file, replacing `path` only once complete."""
+    base, ext = os.path.splitext(path)
+    if ext in (".gz", ".zst"):
+        tmp_path = f"{base}.tmp{ext}"
+    else:
+        tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    count = append_cases(cases, tmp_path, fsync_every)
+    os.replace(tmp_path, path)
+    return count
+
+def _sync(f):
+    # flush() pushes the text buffer through any compressor; fileno() is the underlying file
+    f.flush()
+    os.fsync(f.fileno())
+
+def existing_path(path, *fallbacks):
+    """`path` if it exists, else the first fallback that does (else `path`, for the error message)."""
+    for candidate in (path,) + fallbacks:
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+def batched(iterable, size):
+    """Yield lists of up to `size` items from any iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def save_json_atomic(data, path):
+    """Write JSON via a temp file + rename so a crash never leaves a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _coerce(value, arrow_type, column):
+    """`value` as `arrow_type` the way the feature code reads it (float(x), str(x)); raises if it can't be."""
+    if value is None:
+        return None
+    if pa.types.is_floating(arrow_type):
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"❌ {column}={value!r} is not a number") from None
+    if pa.types.is_list(arrow_type):
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"❌ {column}={value!r} is not a list")
+        return [_coerce(item, arrow_type.value_type, column) for item in value]
+    if pa.types.is_string(arrow_type):
+        if isinstance(value, (list, tuple, dict)):
+            raise ValueError(f"❌ {column}={value!r} is not a scalar")
+        return str(value)
+    return value
+
+def _batch_table(records, columns, schema=None):
+    """Arrow table for a chunk of dicts.
+
+    Columns named in `schema` are coerced to its types and a value that doesn't
+    fit raises ValueError; other columns Arrow can't type consistently are
+    stored as JSON text.
+    """
+    arrays = {}
+    for column in columns:
+        values = [record.get(column) for record in records]
+        if schema is not None and column in schema.names:
+            arrow_type = schema.field(column).type
+            coerced = []
+            for record, value in zip(records, values):
+                try:
+                    coerced.append(_coerce(value, arrow_type, column))
+                except ValueError as e:
+                    raise ValueError(f"{e} in case {record.get(CASE_KEY)}") from None
+            arrays[column] = pa.array(coerced, arrow_type)
+            continue
+        try:
+            arrays[column] = pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+            arrays[column] = pa.array(
+                [None if v is None else json.dumps(v, ensure_ascii=False) for v in values], pa.string()
+            )
+    return pa.table(arrays)
+
+def _write_store_chunk(records, root, chunk, partition_by, schema=None):
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    if schema is not None:
+        # Typed columns are written even when a chunk lacks them, so every chunk has the same types
+        keys += [name for name in schema.names if name not in keys]
+    meta = _batch_table(records, [c for c in keys if c not in CASE_TEXT_COLUMNS] + [
+        c for c in partition_by if c not in keys
+    ], schema)
+    for column in partition_by:
+        # Directory names are strings anyway; a fixed type keeps every chunk's partitions compatible
+        meta = meta.set_column(meta.schema.get_field_index(column), column, meta.column(column).cast(pa.string()))
+    ds.write_dataset(
+        meta, os.path.join(root, "meta"), format="parquet", partitioning=_store_partitioning(partition_by),
+        basename_template=f"part-{chunk:05d}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+    )
+    text_columns = [c for c in CASE_TEXT_COLUMNS if c in keys]
+    if text_columns:
+        os.makedirs(os.path.join(root, "text"), exist_ok=True)
+        pq.write_table(_batch_table(records, [CASE_KEY] + text_columns),
+                       os.path.join(root, "text", f"part-{chunk:05d}.parquet"))
+
+def _store_partitioning(partition_by):
+    if not partition_by:
+        return None
+    return ds.partitioning(pa.schema([(c, pa.string()) for c in partition_by]), flavor="hive")
+
+def write_case_store(cases, root, partition_by=("jurisdiction",), batch_rows=STORE_BATCH_ROWS, schema=None):
+    """Write any iterable of case dicts as a partitioned Parquet store.
+
+    Layout: `root/meta/<column>=<value>/part-*.parquet` holds every non-text
+    column, `root/text/part-*.parquet` holds case_id plus CASE_TEXT_COLUMNS.
+    Columns in `schema` (a pyarrow.Schema) get exactly its types, and a value
+    that can't be coerced raises ValueError before anything is replaced.
+    Cases are written `batch_rows` at a time into a directory next to `root`;
+    the old store is then renamed aside and the new one renamed into place,
+    so readers see either store complete (or, for that instant, none).
+    """
+    partition_by = tuple(partition_by or ())
+    tmp_root = f"{root}.tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    os.makedirs(tmp_root)
+    chunk, buffer, total = 0, [], 0
+    for case in cases:
+        buffer.append(case)
+        if len(buffer) >= batch_rows:
+            _write_store_chunk(buffer, tmp_root, chunk, partition_by, schema)
+            chunk, total, buffer = chunk + 1, total + len(buffer), []
+    if buffer:
+        _write_store_chunk(buffer, tmp_root, chunk, partition_by, schema)
+        total += len(buffer)
+    with open(os.path.join(tmp_root, "_store.json"), "w", encoding="utf-8") as f:
+        json.dump({"partition_by": list(partition_by), "rows": total}, f)
+    old_root = f"{root}.old"
+    shutil.rmtree(old_root, ignore_errors=True)
+    if os.path.exists(root):
+        os.replace(root, old_root)
+    os.replace(tmp_root, root)
+    shutil.rmtree(old_root, ignore_errors=True)
+    print(f"✅ Saved {total} cases to case store {root}")
+    return total
+
+def is_case_store(path):
+    return os.path.isfile(os.path.join(path, "_store.json"))
+
+def _store_dataset(root, part):
+    if not is_case_store(root):
+        raise FileNotFoundError(f"❌ Case store not found: {root}")
+    with open(os.path.join(root, "_store.json"), "r", encoding="utf-8") as f:
+        partition_by = json.load(f)["partition_by"] if part == "meta" else []
+    base_dir = os.path.join(root, part)
+    files = sorted(glob.glob(os.path.join(base_dir, "**", "*.parquet"), recursive=True))
+    # Chunks infer their own types (a column may be all-null in one chunk), so unify them up front
+    schemas = [pq.read_schema(f) for f in files]
+    schemas.append(pa.schema([(c, pa.string()) for c in partition_by]))
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    return ds.dataset(files, schema=schema, format="parquet",
+                      partitioning=_store_partitioning(partition_by), partition_base_dir=base_dir)
+
+def case_store_columns(root):
+    """Column names available in a case store (scalar and text)."""
+    names = list(_store_dataset(root, "meta").schema.names)
+    if os.path.isdir(os.path.join(root, "text")):
+        names += [c for c in _store_dataset(root, "text").schema.names if c not in names]
+    return names
+
+def iter_case_batches(root, columns=None, filter=None, batch_rows=STORE_BATCH_ROWS, with_text=False):
+    """Yield pyarrow RecordBatches from a case store.
+
+    `columns` projects (only those column chunks are read from disk) and
+    `filter` is a pyarrow.dataset expression, e.g. `ds.field("jurisdiction") == "cal"`,
+    pushed down to partition pruning and Parquet row-group statistics. Text
+    columns are only read, and joined on case_id, when `with_text=True`.
+    """
+    meta = _store_dataset(root, "meta")
+    text_columns = []
+    if with_text:
+        text = _store_dataset(root, "text")
+        text_columns = [c for c in text.schema.names if c != CASE_KEY and (columns is None or c in columns)]
+    meta_columns = None
+    if columns is not None:
+        meta_columns = [c for c in columns if c in meta.schema.names]
+        if text_columns and CASE_KEY not in meta_columns:
+            meta_columns.append(CASE_KEY)
+    scanner = meta.scanner(columns=meta_columns, filter=filter, batch_size=batch_rows)
+    for batch in scanner.to_batches():
+        if not batch.num_rows:
+            continue
+        if text_columns:
+            texts = text.to_table(
+                columns=[CASE_KEY] + text_columns,
+                filter=ds.field(CASE_KEY).isin(batch.column(CASE_KEY)),
+            )
+            joined = pa.Table.from_batches([batch]).join(texts, CASE_KEY, join_type="left outer")
+            for out in joined.to_batches():
+                yield out
+        else:
+            yield batch
+
+def read_case_store(root, columns=None, filter=None, with_text=False):
+    """Whole (projected, filtered) case store as one pyarrow Table."""
+    if not with_text:
+        meta = _store_dataset(root, "meta")
+        if columns is not None:
+            columns = [c for c in columns if c in meta.schema.names]
+        return meta.to_table(columns=columns, filter=filter)
+    batches = list(iter_case_batches(root, columns, filter, with_text=True))
+    if not batches:
+        return pa.table({})
+    return pa.Table.from_batches(batches)
@@ -0,0 +1,120 @@
+import re
+
+def _trie_pattern(words):
+    """Regex matching any of `words`, factored into a prefix trie so each position is tried in one walk.
+
+    Optional tails are greedy, so the longest word starting at a position wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 and "" not in node else "(?:%s)" % "|".join(branches)
+        return body + "?" if "" in node else body
+
+    return emit(trie)
+
+class KeywordMatcher:
+    """Precompiled, case-insensitive keyword set shared by the relevance filters.
+
+    Methods take text that is already lowercased so one `lower()` serves every
+    list checked against the same opinion. Yes/no checks stay on CPython's
+    substring search with early exits: for a few dozen keywords it beats any
+    single pass, even a C Aho-Corasick automaton (see
+    benchmarks/bench_keyword_matcher.py). Counting every hit is done in one
+    scan of a trie-shaped regex instead (`iter_hits`).
+    """
+
+    def __init__(self, keywords):
+        self.keywords = tuple(dict.fromkeys(kw.lower() for kw in keywords if kw))
+        # Shorter keywords are cheaper and usually more frequent, so thresholds are reached sooner
+        self._by_length = tuple(sorted(self.keywords, key=len))
+        # A keyword that contains another one can never be the only hit, so `any` may skip it
+        self._minimal = tuple(
+            kw for kw in self._by_length
+            if not any(other != kw and other in kw for other in self.keywords)
+        )
+        self._pattern = re.compile("(%s)" % _trie_pattern(self.keywords)) if self.keywords else None
+        # A match consumes the longest keyword at its position. Per keyword, (offset, other, check) for
+        # every keyword such a match hides: inside it, or starting inside it and running past its end
+        # (only a real hit if the text continues that way, e.g. "appeal denied" + "damages")
+        self._hidden = {}
+        for kw in self.keywords:
+            hidden = []
+            for other in self.keywords:
+                for offset in range(len(kw)):
+                    if kw.startswith(other, offset):
+                        hidden.append((offset, other, False))
+                    elif offset and len(other) > len(kw) - offset and other.startswith(kw[offset:]):
+                        hidden.append((offset, other, True))
+            self._hidden[kw] = tuple(sorted(hidden))
+
+    def any_present(self, text):
+        for kw in self._minimal:
+            if kw in text:
+                return True
+        return False
+
+    def count_present(self, text, stop_at=None):
+        """Number of distinct keywords found, stopping early once `stop_at` is reached."""
+        found = 0
+        for kw in self._by_length:
+            if kw in text:
+                found += 1
+                if stop_at is not None and found >= stop_at:
+                    break
+        return found
+
+    def iter_hits(self, text):
+        """(position, keyword) for every occurrence of every keyword, in order of position, in one scan."""
+        if self._pattern is None:
+            return
+        for match in self._pattern.finditer(text):
+            start = match.start()
+            for offset, kw, check in self._hidden[match.group(1)]:
+                if not check or text.startswith(kw, start + offset):
+                    yield start + offset, kw
+
+    def hit_counts(self, text):
+        """Occurrences of each keyword in `text` (only keywords that occur), counted like str.count."""
+        counts = {}
+        ends = {}
+        for position, kw in self.iter_hits(text):
+            # Occurrences of one keyword don't overlap each other
+            if position >= ends.get(kw, 0):
+                counts[kw] = counts.get(kw, 0) + 1
+                ends[kw] = position + len(kw)
+        return counts
+
+class RelevanceFilter:
+    """`min_hits` distinct include keywords and no exclude keyword, lowercasing the text once."""
+
+    def __init__(self, include, exclude, min_hits=1):
+        self.include = KeywordMatcher(include)
+        self.exclude = KeywordMatcher(exclude)
+        self.min_hits = min_hits
+        # Both lists in one matcher, so hit_counts scans the text once
+        self._all = KeywordMatcher(self.include.keywords + self.exclude.keywords)
+
+    def __call__(self, text):
+        if not text:
+            return False
+        text = text.lower()
+        return (
+            self.include.count_present(text, stop_at=self.min_hits) >= self.min_hits
+            and not self.exclude.any_present(text)
+        )
+
+    def hit_counts(self, text):
+        counts = self._all.hit_counts(text.lower())
+        return {
+            name: {kw: counts[kw] for kw in matcher.keywords if kw in counts}
+            for name, matcher in (("include", self.include), ("exclude", self.exclude))
+        }
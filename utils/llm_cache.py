@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_PATH = os.path.join(ROOT, "data", "cache", "llm_cache.sqlite")
+MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", 256))
+
+class LLMCache:
+    """Persistent, content-addressed store of LLM replies with LRU eviction.
+
+    Entries are keyed by a hash of everything that determines the prompt, so the
+    labeling and summarization stages share one file and never pay twice for
+    the same text. `bypass=True` skips lookups but still records fresh replies.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=int(MAX_MB * 1024 * 1024), bypass=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS replies ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS replies_last_used ON replies(last_used)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, template, text, temperature):
+        payload = json.dumps([model, template, text, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            if self.bypass:
+                self.misses += 1
+                return None
+            row = self.conn.execute("SELECT value FROM replies WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE replies SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM replies WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO replies (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def get_or_compute(self, key, compute, validate=None):
+        """Return the cached reply for `key`, calling `compute()` and storing its result on a miss.
+
+        Replies `validate` rejects (e.g. ones that don't parse) are returned but
+        not stored, so the next call asks again; a cached one it rejects counts
+        as a miss.
+        """
+        value = self.get(key)
+        if value is not None and validate is not None and not validate(value):
+            with self.lock:
+                self.hits -= 1
+                self.misses += 1
+            value = None
+        if value is None:
+            value = compute()
+            if validate is None or validate(value):
+                self.put(key, value)
+        return value
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM replies ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute("DELETE FROM replies WHERE key = ?", (key,))
+                self.total_bytes -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self.total_bytes,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return f"💾 LLM cache: {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.0%} hit rate)"
+
+def open_default_cache(bypass=None):
+    """Cache at data/cache/ shared by every stage; LLM_CACHE_BYPASS=1 forces fresh calls."""
+    if bypass is None:
+        bypass = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+    return LLMCache(bypass=bypass)
@@ -0,0 +1,77 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from openai import OpenAI, RateLimitError
+
+from utils.rate_limit import RateLimiter, backoff_delay, parse_retry_after
+
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+COMPLETION_TOKENS_ESTIMATE = 300  # Budget reserved for the reply on top of the prompt
+MAX_RETRIES = 6
+
+def make_client(base_url=None, api_key=None, timeout=60.0):
+    """OpenAI-compatible client; point LLM_BASE_URL at a local fake server for testing."""
+    return OpenAI(
+        base_url=base_url or os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL),
+        api_key=api_key or os.getenv("GROQ_API_KEY") or "not-set",
+        timeout=timeout,
+        max_retries=0,  # Retries are ours so they go through the shared limiter
+    )
+
+def make_limiter():
+    """Limiter seeded from LLM_RPM / LLM_TPM and refined from the provider's headers."""
+    return RateLimiter(
+        rpm=float(os.getenv("LLM_RPM", 30)),
+        tpm=float(os.getenv("LLM_TPM", 6000)),
+    )
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def chat_completion(client, limiter, prompt, model, temperature, max_retries=MAX_RETRIES):
+    """Send one chat request through the limiter, backing off with jitter on 429s."""
+    needed = estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE
+
+    for attempt in range(max_retries + 1):
+        limiter.acquire(needed)
+        try:
+            raw = client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature
+            )
+        except RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            delay = max(parse_retry_after(e.response.headers) or 0.0, backoff_delay(attempt))
+            limiter.pause(delay)
+            time.sleep(delay)
+            continue
+
+        limiter.update_from_headers(raw.headers)
+        response = raw.parse()
+        return response.choices[0].message.content.strip()
+
+def map_ordered(fn, items, concurrency=8):
+    """Yield (item, fn(item)) in input order while keeping up to `concurrency` calls in flight.
+
+    At most 2 x concurrency results are buffered, so a slow head-of-line call never
+    lets the backlog grow without bound.
+    """
+    if concurrency <= 1:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        window = deque()
+        for item in items:
+            window.append((item, pool.submit(fn, item)))
+            if len(window) >= 2 * concurrency:
+                head, future = window.popleft()
+                yield head, future.result()
+        while window:
+            head, future = window.popleft()
+            yield head, future.result()
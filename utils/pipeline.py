@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils.io_helpers import save_json_atomic
+
+STATE_PATH = "data/pipeline_state.json"
+HASH_BLOCK = 1 << 20
+
+class Stage:
+    """One pipeline step: the artifacts it reads and writes, and how to (re)build them.
+
+    `run(full)` does the work; `full` is True when the stage was forced, and
+    incremental stages then rebuild from scratch. `inputs` are files or
+    directories whose content decides whether the stage is stale, `params`
+    any settings that should too. `after` names the stages that must finish
+    first. `always` stages (e.g. pulling from an external source) run on every
+    invocation, and their dependents are then skipped if the outputs came out
+    unchanged.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), after=(), params=None, always=False):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.after = tuple(after)
+        self.params = params or {}
+        self.always = always
+
+class PipelineState:
+    """Content hashes of every artifact a stage last ran against, kept in one JSON file.
+
+    File hashes are memoized by (size, mtime), so an unchanged multi-GB input
+    is not re-read on every invocation.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        state = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        self.stages = state.get("stages", {})
+        self.files = state.get("files", {})
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            known = self.files.get(path)
+        if known and known[0] == stamp:
+            return known[1]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                digest.update(block)
+        with self._lock:
+            self.files[path] = [stamp, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def content_hash(self, path):
+        """sha256 of a file, of a directory's files and relative names, or None if `path` is missing."""
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        if not os.path.isdir(path):
+            return None
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode("utf-8"))
+                digest.update(self.file_hash(file_path).encode("ascii"))
+        return digest.hexdigest()
+
+    def fingerprint(self, stage):
+        payload = {
+            "inputs": {path: self.content_hash(path) for path in stage.inputs},
+            "params": stage.params,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def is_fresh(self, stage, fingerprint=None):
+        """True when the stage last ran on these exact inputs and its outputs are still what it wrote."""
+        record = self.stages.get(stage.name)
+        if stage.always or record is None:
+            return False
+        if record["fingerprint"] != (fingerprint or self.fingerprint(stage)):
+            return False
+        return all(self.content_hash(path) == digest for path, digest in record["outputs"].items())
+
+    def record(self, stage, fingerprint, seconds):
+        outputs = {path: self.content_hash(path) for path in stage.outputs}
+        with self._lock:
+            self.stages[stage.name] = {
+                "fingerprint": fingerprint,
+                "outputs": outputs,
+                "seconds": round(seconds, 2),
+                "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self.save()
+
+    def save(self):
+        # Drop memoized hashes of files that no longer exist (e.g. replaced temp files)
+        self.files = {path: value for path, value in self.files.items() if os.path.exists(path)}
+        save_json_atomic({"stages": self.stages, "files": self.files}, self.path)
+
+def check_stages(stages):
+    """Stages in dependency order; raises ValueError on unknown names or cycles."""
+    by_name = {stage.name: stage for stage in stages}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name not in by_name:
+            raise ValueError(f"❌ Unknown pipeline stage: {name}")
+        if name in visiting:
+            raise ValueError(f"❌ Pipeline stages form a cycle through {name}")
+        visiting.add(name)
+        for dependency in by_name[name].after:
+            visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name)
+    return ordered
+
+def plan(stages, state, selected=None, force=()):
+    """(stage name, status) in dependency order, as run_pipeline would start them.
+
+    Status is "run", "fresh", "not selected", or "after upstream" when only an
+    upstream stage that will run can tell whether this one is stale.
+    """
+    selected = set([stage.name for stage in stages] if selected is None else selected)
+    will_run = set()
+    statuses = []
+    for stage in check_stages(stages):
+        if stage.name not in selected:
+            status = "not selected"
+        elif stage.name in force or not state.is_fresh(stage):
+            status = "run"
+        elif will_run & set(stage.after):
+            status = "after upstream"
+        else:
+            status = "fresh"
+        if status in ("run", "after upstream"):
+            will_run.add(stage.name)
+        statuses.append((stage.name, status))
+    return statuses
+
+def run_pipeline(stages, state=None, selected=None, force=(), max_workers=2):
+    """Run the stale stages of a DAG, independent ones in parallel threads.
+
+    A stage starts once everything it comes after has finished or been
+    skipped; its staleness is decided then, against the inputs as they are at
+    that moment. Stages outside `selected` are treated as done and their
+    current outputs used as-is. A failed stage stops only its dependents.
+    Returns {stage name: "ran" | "fresh" | "failed" | "blocked" | "not selected"}.
+    """
+    state = state or PipelineState()
+    ordered = check_stages(stages)
+    selected = set([stage.name for stage in ordered] if selected is None else selected)
+    results = {stage.name: "not selected" for stage in ordered if stage.name not in selected}
+    pending = [stage for stage in ordered if stage.name in selected]
+
+    def execute(stage):
+        fingerprint = state.fingerprint(stage)
+        if stage.name not in force and state.is_fresh(stage, fingerprint):
+            print(f"⏩ [{stage.name}] inputs unchanged, skipping")
+            return "fresh"
+        print(f"▶️ [{stage.name}] running...")
+        start = time.perf_counter()
+        stage.run(stage.name in force)
+        seconds = time.perf_counter() - start
+        # Fingerprint the inputs as they were when the stage started, so edits made meanwhile are picked up next time
+        state.record(stage, fingerprint, seconds)
+        print(f"✅ [{stage.name}] done in {seconds:.1f}s")
+        return "ran"
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for stage in list(pending):
+                upstream = [results.get(name) for name in stage.after]
+                if any(status in ("failed", "blocked") for status in upstream):
+                    print(f"⛔ [{stage.name}] blocked by a failed upstream stage")
+                    results[stage.name] = "blocked"
+                    pending.remove(stage)
+                elif all(status is not None for status in upstream):
+                    running[pool.submit(execute, stage)] = stage
+                    pending.remove(stage)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    print(f"❌ [{stage.name}] failed: {e}")
+                    results[stage.name] = "failed"
+    return results
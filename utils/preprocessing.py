@@ -1,30 +1,16 @@
-import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from ml.feature_spec import FEATURE_COLUMNS, TARGET_COLUMN, frame_features
 
 def preprocess_features(cases: list) -> tuple:
     """
-    Takes in a list of case dicts with fields like summary_text, injury_types, etc.
-    Returns (X, y) for model input.
+    Takes in a list of case dicts with fields like injuries, medical_bills, etc.
+    Returns (X, y) for model input, using the same feature spec as training and serving.
     """
-    df = pd.DataFrame(cases)
-
-    # Drop incomplete rows
-    df = df[df["summary_text"].notnull() & df["settlement_amount"].notnull()]
-
-    # Embed summaries (placeholder: you already embedded during training)
-    summaries = df["summary_text"].tolist()
-
-    # Encode injury_types (multi-label)
-    mlb = MultiLabelBinarizer()
-    injury_features = mlb.fit_transform(df["injury_types"].apply(lambda x: x if isinstance(x, list) else []))
-
-    # Stack all numeric + injury features
-    X = pd.DataFrame(injury_features, columns=mlb.classes_)
-    X["medical_bills"] = df["medical_bills"]
-    X["lost_wages"] = df["lost_wages"]
-    X["plaintiff_age"] = df["plaintiff_age"]
-    X["plaintiff_gender"] = df["plaintiff_gender"].map({"Male": 0, "Female": 1, None: -1})
-
-    y = df["settlement_amount"]
+    df = frame_features(cases, include_target=True)
+    X = df[list(FEATURE_COLUMNS)]
+    y = df[TARGET_COLUMN]
 
     return X, y
@@ -0,0 +1,128 @@
+import random
+import re
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, per_minute):
+        """Adopt a new per-minute budget (e.g. one advertised by the provider)."""
+        with self.lock:
+            self._refill()
+            self.rate = per_minute / 60.0
+            self.capacity = per_minute
+            self.tokens = min(self.tokens, self.capacity)
+
+    def drain_to(self, remaining):
+        """Never believe we have more budget left than the provider says we do."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, float(remaining))
+
+    def reserve(self, amount):
+        """Take `amount` tokens now and return how long the caller must wait before using them.
+
+        Reservations may push the bucket negative, so concurrent callers queue up
+        behind each other instead of all waking at the same instant.
+        """
+        with self.lock:
+            self._refill()
+            amount = min(amount, self.capacity)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """Requests-per-minute + tokens-per-minute limiter shared by every worker thread."""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        with self.lock:
+            wait = max(wait, self.pause_until - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold back every worker, e.g. after the provider answered 429."""
+        with self.lock:
+            self.pause_until = max(self.pause_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        """Sync budgets with the `x-ratelimit-*` headers OpenAI-compatible APIs return.
+
+        The limit headers don't say their window (Groq's request limit is per
+        day, OpenAI's per minute), so the refill rate is derived from how much
+        of the limit is used and how long the matching reset header says it
+        takes to come back.
+        """
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = _header_number(headers, f"x-ratelimit-limit-{kind}")
+            remaining = _header_number(headers, f"x-ratelimit-remaining-{kind}")
+            reset = _header_seconds(headers, f"x-ratelimit-reset-{kind}")
+            if remaining is None:
+                continue
+            if limit and reset and remaining < limit:
+                per_minute = (limit - remaining) / reset * 60
+                # Small, rounded reset times make the estimate noisy; only follow real changes
+                if abs(per_minute - bucket.capacity) > 0.05 * bucket.capacity:
+                    bucket.set_rate(min(per_minute, limit))
+            bucket.drain_to(remaining)
+            if remaining < 1 and reset:
+                self.pause(reset)
+
+
+def _header_number(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _header_seconds(headers, name):
+    """Seconds in a duration header such as "2m59.56s", "7.66s" or "120ms", or None."""
+    value = headers.get(name)
+    if value is None:
+        return None
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value.strip())
+    if not parts or "".join(number + unit for number, unit in parts) != value.strip():
+        return _header_number(headers, name)
+    scale = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers):
+    """Seconds to wait according to a `retry-after` header, or None."""
+    if headers is None:
+        return None
+    value = _header_number(headers, "retry-after")
+    return max(value, 0.0) if value is not None else None
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter so retrying workers don't stampede together."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))